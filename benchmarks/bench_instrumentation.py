@@ -0,0 +1,46 @@
+'''
+Benchmark of the overhead of the instrumentation hooks: XML_converter.load and get_pandas_dataset on synthetic
+invoices without metrics, with the timing metrics and with the traced peak memory. The slowest invoices of the
+instrumented run are printed from the per-file summary.
+
+    Usage:
+    ------
+        python benchmarks/bench_instrumentation.py
+'''
+
+from io import BytesIO
+from time import perf_counter
+from ges_xml_converter.instrumentation import Metrics
+from ges_xml_converter.xml_parser import XML_converter
+from bench_prune_equivalent_nodes import generate_invoice
+
+
+def run(instream, metrics) -> float:
+    start = perf_counter()
+    converter = XML_converter(instream, metrics=metrics)
+    converter.load()
+    converter.get_pandas_dataset()
+    return perf_counter() - start
+
+
+if __name__ == "__main__":
+
+    # Mostly small invoices with a few large ones, as in a real batch
+    instream = {
+        "invoice{:05d}.xml".format(i): BytesIO(generate_invoice(2000 if i % 500 == 0 else 10)) for i in range(2000)
+    }
+
+    print("{:>20} {:>10} {:>10}".format("metrics", "time [s]", "overhead"))
+
+    baseline = min([run(instream, None) for _ in range(3)])
+    print("{:>20} {:>10.3f} {:>10}".format("disabled", baseline, "-"))
+
+    for name, trace_memory in [("timing", False), ("timing + memory", True)]:
+        metrics = Metrics(trace_memory=trace_memory)
+        elapsed = min([run(instream, metrics) for _ in range(3)])
+        print("{:>20} {:>10.3f} {:>9.1f}%".format(name, elapsed, 100*(elapsed/baseline - 1)))
+
+    metrics = Metrics(trace_memory=True)
+    run(instream, metrics)
+    print()
+    print(metrics.file_summary().head(5))
@@ -0,0 +1,37 @@
+'''
+Benchmark of the wide output (XML_converter.load + get_pandas_dataset) against the normalized output
+(XML_converter.load_normalized) on synthetic invoices with an increasing number of 'DettaglioLinee' rows.
+The wide timing includes the splitting of the joined cells required to obtain the line items.
+
+    Usage:
+    ------
+        python benchmarks/bench_load_normalized.py
+'''
+
+from io import BytesIO
+from pandas import DataFrame
+from time import perf_counter
+from ges_xml_converter.xml_parser import XML_converter
+from bench_prune_equivalent_nodes import generate_invoice
+
+
+if __name__ == "__main__":
+
+    print("{:>8} {:>8} {:>12} {:>16}".format("files", "lines", "wide [s]", "normalized [s]"))
+
+    for nfiles, nlines in [(100, 10), (100, 100), (10, 1000), (1, 50000)]:
+
+        data = generate_invoice(nlines)
+        parser = XML_converter({"invoice{}.xml".format(i): BytesIO(data) for i in range(nfiles)})
+
+        start = perf_counter()
+        parser.load()
+        df = parser.get_pandas_dataset()
+        items = DataFrame({column: df[column].str.split("|").explode() for column in df.columns if "DettaglioLinee" in str(column)})
+        wide_time = perf_counter() - start
+
+        start = perf_counter()
+        parser.load_normalized()
+        normalized_time = perf_counter() - start
+
+        print("{:>8} {:>8} {:>12.4f} {:>16.4f}".format(nfiles, nlines, wide_time, normalized_time))
@@ -0,0 +1,121 @@
+'''
+Benchmark of the built-in ASN.1 reader against the previous pyOpenSSL unwrapping on signed invoices with an
+increasing number of 'DettaglioLinee' rows, encoded both as DER and as BER with the content split in 1 kB chunks
+(constructed OCTET STRING). The peak memory is the one allocated by Python (tracemalloc), the allocations of the
+OpenSSL library are not tracked.
+
+The previous implementation relies on pyOpenSSL interfaces and cryptography bindings that are not available with
+the package requirements (cryptography >= 42), the comparison runs in the environment pinned by
+'benchmarks/requirements_p7m_backends.txt'. In other environments the 'openssl' rows are reported as 'n/a'.
+
+    Usage:
+    ------
+        python -m venv bench-p7m
+        bench-p7m/bin/pip install -r benchmarks/requirements_p7m_backends.txt
+        PYTHONPATH=src bench-p7m/bin/python benchmarks/bench_p7m_backends.py
+'''
+
+import datetime
+import tracemalloc
+from time import perf_counter
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.serialization import pkcs7
+from ges_xml_converter.asn1_reader import read_header, skip_element, iter_octet_string, extract_signed_content
+from bench_prune_equivalent_nodes import generate_invoice
+
+
+def extract_signed_content_openssl(der_data: bytes) -> bytes:
+    '''
+    The unwrapping of the previous p7m_to_xml, through the private pyOpenSSL interfaces.
+    '''
+    from OpenSSL import crypto
+    from OpenSSL._util import (ffi as _ffi, lib as _lib,)
+
+    p7m = crypto.load_pkcs7_data(crypto.FILETYPE_ASN1, der_data)
+
+    bio_out = crypto._new_mem_buf()
+    res = _lib.PKCS7_verify(p7m._pkcs7, _ffi.NULL, _ffi.NULL, _ffi.NULL, bio_out, _lib.PKCS7_NOVERIFY | _lib.PKCS7_NOSIGS)
+
+    if res != 1:
+        raise RuntimeError
+
+    return crypto._bio_to_string(bio_out)
+
+
+BACKENDS = {
+    "asn1": extract_signed_content,
+    "openssl": extract_signed_content_openssl,
+}
+
+
+def sign(content: bytes) -> bytes:
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "Supplier")])
+    start = datetime.datetime(2022, 1, 1)
+    certificate = (
+        x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key()).serial_number(1)
+        .not_valid_before(start).not_valid_after(start + datetime.timedelta(days=3650)).sign(key, hashes.SHA256())
+    )
+    builder = pkcs7.PKCS7SignatureBuilder().set_data(content).add_signer(certificate, key, hashes.SHA256())
+    return builder.sign(serialization.Encoding.DER, [pkcs7.PKCS7Options.Binary])
+
+
+def to_chunked_ber(der_data: bytes, chunk_size: int = 1024) -> bytes:
+    '''
+    Re-encodes a DER signed file with indefinite lengths and the eContent split in a constructed OCTET STRING.
+    '''
+    data = memoryview(der_data)
+
+    _, oid, _ = read_header(data, 0)
+    _, signed, _ = read_header(data, skip_element(data, oid))
+    _, signed, end = read_header(data, signed)
+    encap = skip_element(data, skip_element(data, signed))
+    _, econtent, encap_end = read_header(data, encap)
+    _, content, _ = read_header(data, skip_element(data, econtent))
+    content = b"".join(iter_octet_string(data, content))
+
+    chunks = [content[i:i+chunk_size] for i in range(0, len(content), chunk_size)]
+    octets = b"".join([bytes([0x04, 0x82]) + len(chunk).to_bytes(2, "big") + chunk for chunk in chunks])
+
+    return b"".join([
+        b"\x30\x80", data[oid:skip_element(data, oid)], b"\xa0\x80\x30\x80", data[signed:encap],
+        b"\x30\x80", data[econtent:skip_element(data, econtent)], b"\xa0\x80\x24\x80", octets, b"\x00\x00"*3,
+        data[encap_end:end], b"\x00\x00"*3,
+    ])
+
+
+def measure(function, data: bytes, repeat: int):
+    start = perf_counter()
+    for _ in range(repeat):
+        function(data)
+    elapsed = (perf_counter() - start)/repeat
+
+    tracemalloc.start()
+    function(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+if __name__ == "__main__":
+
+    print("{:>8} {:>10} {:>8} {:>10} {:>12} {:>12}".format("lines", "size [kB]", "format", "backend", "time [ms]", "peak [kB]"))
+
+    for nlines in [10, 1000, 10000, 50000]:
+
+        content = generate_invoice(nlines)
+        der_data = sign(content)
+        repeat = max(1, 2000//nlines)
+
+        for fmt, data in [("der", der_data), ("ber", to_chunked_ber(der_data))]:
+            for name, function in BACKENDS.items():
+                try:
+                    assert function(data) == content
+                except Exception:
+                    print("{:>8} {:>10} {:>8} {:>10} {:>12} {:>12}".format(nlines, len(data)//1024, fmt, name, "n/a", "n/a"))
+                    continue
+                elapsed, peak = measure(function, data, repeat)
+                print("{:>8} {:>10} {:>8} {:>10} {:>12.3f} {:>12}".format(nlines, len(data)//1024, fmt, name, 1000*elapsed, peak//1024))
@@ -0,0 +1,77 @@
+'''
+Benchmark of the asyncio ingestion pipeline (pipeline.run_pipeline) against the phased flow of the example
+script (p7m conversion of all the files, then parsing of all the files) on a temporary folder of synthetic
+invoices, half of them signed. Both flows use the same fixed schema and write the batches to a .csv file. The
+peak memory is the one allocated by Python (tracemalloc) in a separate run.
+
+    Usage:
+    ------
+        python benchmarks/bench_pipeline.py
+'''
+
+import tracemalloc
+from collections import ChainMap
+from os.path import join
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from ges_xml_converter.bytesIO_utils import path_to_lazy_BytesIO
+from ges_xml_converter.export import write_csv
+from ges_xml_converter.p7m_converter import group_convert_p7m_to_xml
+from ges_xml_converter.pipeline import run_pipeline
+from ges_xml_converter.xml_parser import XML_converter
+from bench_prune_equivalent_nodes import generate_invoice
+from bench_p7m_backends import sign
+
+
+def phased(path: str, schema, destination: str, workers: int) -> None:
+    p7m_streams = group_convert_p7m_to_xml(path_to_lazy_BytesIO(path, extension=".xml.p7m"), workers=workers)
+    parser = XML_converter(ChainMap(p7m_streams, path_to_lazy_BytesIO(path, extension=".xml")))
+    write_csv(parser.iter_pandas_datasets(batch_size=100, schema=schema, workers=workers), destination)
+
+
+def pipelined(path: str, schema, destination: str, workers: int) -> None:
+    batches = []
+    run_pipeline(path_to_lazy_BytesIO(path, extension=(".xml", ".xml.p7m")), batches.append, batch_size=100, schema=schema, workers=workers)
+    write_csv(batches, destination)
+
+
+def pipelined_streaming(path: str, schema, destination: str, workers: int) -> None:
+    with open(destination, "wb") as handle:
+        header = [True]
+
+        def sink(batch):
+            batch.to_csv(handle, header=header[0], mode="ab")
+            header[0] = False
+
+        run_pipeline(path_to_lazy_BytesIO(path, extension=(".xml", ".xml.p7m")), sink, batch_size=100, schema=schema, workers=workers)
+
+
+if __name__ == "__main__":
+
+    print("{:>8} {:>8} {:>8} {:>22} {:>10} {:>12}".format("files", "lines", "workers", "flow", "time [s]", "peak [MB]"))
+
+    for nfiles, nlines in [(1000, 10), (100, 1000)]:
+        with TemporaryDirectory() as path:
+
+            data = generate_invoice(nlines)
+            signed = sign(data)
+            for i in range(nfiles):
+                with open(join(path, "invoice{:05d}.xml".format(i) + (".p7m" if i % 2 == 0 else "")), "wb") as file:
+                    file.write(signed if i % 2 == 0 else data)
+
+            schema = XML_converter(path_to_lazy_BytesIO(path, extension=".xml")).scan_schema()
+
+            for workers in [1, 4]:
+                for name, flow in [("phased", phased), ("pipeline", pipelined), ("pipeline (stream sink)", pipelined_streaming)]:
+                    destination = join(path, "output.csv")
+
+                    start = perf_counter()
+                    flow(path, schema, destination, workers)
+                    elapsed = perf_counter() - start
+
+                    tracemalloc.start()
+                    flow(path, schema, destination, workers)
+                    _, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+
+                    print("{:>8} {:>8} {:>8} {:>22} {:>10.3f} {:>12.1f}".format(nfiles, nlines, workers, name, elapsed, peak/2**20))
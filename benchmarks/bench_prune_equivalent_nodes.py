@@ -0,0 +1,51 @@
+'''
+Benchmark of XML_converter.prune_equivalent_nodes and XML_converter.load on synthetic invoices
+with an increasing number of 'DettaglioLinee' rows. The time per line should stay roughly constant.
+
+    Usage:
+    ------
+        python benchmarks/bench_prune_equivalent_nodes.py
+'''
+
+from io import BytesIO
+from time import perf_counter
+from lxml import objectify
+from ges_xml_converter.xml_parser import XML_converter
+
+
+def generate_invoice(nlines: int) -> bytes:
+    body = "".join(
+        [
+            "<DettaglioLinee><NumeroLinea>{0}</NumeroLinea><Descrizione>Item {0}</Descrizione>"
+            "<Quantita>1.00</Quantita><PrezzoUnitario>{0}.00</PrezzoUnitario><PrezzoTotale>{0}.00</PrezzoTotale>"
+            "<AliquotaIVA>22.00</AliquotaIVA></DettaglioLinee>".format(i) for i in range(nlines)
+        ]
+    )
+    xml = (
+        "<FatturaElettronica><FatturaElettronicaHeader><DatiTrasmissione><ProgressivoInvio>1</ProgressivoInvio>"
+        "</DatiTrasmissione></FatturaElettronicaHeader><FatturaElettronicaBody><DatiBeniServizi>{}"
+        "</DatiBeniServizi></FatturaElettronicaBody></FatturaElettronica>"
+    ).format(body)
+    return xml.encode('utf-8')
+
+
+if __name__ == "__main__":
+
+    print("{:>8} {:>12} {:>12} {:>14}".format("lines", "prune [s]", "load [s]", "load/line [us]"))
+
+    for nlines in [10, 100, 1000, 10000, 50000]:
+
+        parser = XML_converter({"invoice.xml": BytesIO(generate_invoice(nlines))})
+
+        strings = parser.traverse_node(objectify.parse(parser.instream["invoice.xml"]).getroot().getchildren())
+
+        start = perf_counter()
+        parser.prune_equivalent_nodes(strings)
+        prune_time = perf_counter() - start
+
+        parser.instream["invoice.xml"].seek(0)
+        start = perf_counter()
+        parser.load()
+        load_time = perf_counter() - start
+
+        print("{:>8} {:>12.4f} {:>12.4f} {:>14.2f}".format(nlines, prune_time, load_time, 1e6*load_time/nlines))
@@ -1,10 +1,12 @@
 import sys
+from collections.abc import Mapping
 from os.path import join, abspath, isdir
 from pandas import ExcelWriter
 from ges_xml_converter.xml_parser import XML_converter
 from ges_xml_converter.p7m_converter import group_convert_p7m_to_xml
-from ges_xml_converter.bytesIO_utils import path_to_BytesIO
+from ges_xml_converter.bytesIO_utils import path_to_lazy_BytesIO
 from ges_xml_converter.invoices_modifier import modify_header
+from ges_xml_converter.export import export
 
 # Rudimental autocomplete on tab functions
 import glob, readline
@@ -17,6 +19,28 @@ readline.parse_and_bind('tab: complete')
 readline.set_completer(complete)
 
 
+# Union of two stream mappings, the first taking precedence, that reads a stream only when its key is requested
+# (the ChainMap of Python < 3.9 reads all the values of the mappings when iterated)
+class MergedStreams(Mapping):
+    def __init__(self, first, second):
+        self.first = first
+        self.second = second
+
+    def __getitem__(self, key):
+        if key in self.first:
+            return self.first[key]
+        return self.second[key]
+
+    def __iter__(self):
+        yield from self.first
+        for key in self.second:
+            if key not in self.first:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
 
 if __name__ == "__main__":
 
@@ -27,26 +51,43 @@ if __name__ == "__main__":
 
     path = abspath(path)
 
+    # Output format selected by the extension: .xlsx, .csv, .csv.gz, .parquet or .arrow
+    output = sys.argv[2] if len(sys.argv) > 2 else "parsed_xml_data.xlsx"
+
     if isdir(path) == False:
         raise ValueError
     
     print("Converting .xml.p7m files to .xml")
-    p7m_streams = path_to_BytesIO(path, extension=".xml.p7m")
+    p7m_streams = path_to_lazy_BytesIO(path, extension=".xml.p7m")
     p7m_conv_streams = group_convert_p7m_to_xml(p7m_streams, verbose=True)
 
     print("Parsing .xml files")
-    xml_streams = path_to_BytesIO(path, extension=(".xml", ".XML"))
-    
-
-    for key, stream in p7m_conv_streams.items():
-        xml_streams[key] = stream
+    xml_streams = path_to_lazy_BytesIO(path, extension=(".xml", ".XML"))
     
-    parser = XML_converter(xml_streams, separator='#@#', concat_symbol='|')
-    parser.load(starting_with="FatturaElettronica")
+    parser = XML_converter(MergedStreams(p7m_conv_streams, xml_streams), separator='#@#', concat_symbol='|')
     parser.inflate_tree(filler="-")
-    df = parser.get_pandas_dataset(offset=1)
 
-    df, new_labels = modify_header(df)
+    new_labels = {}
+    output_file = join(path, output)
+
+    if output.endswith(".xlsx"):
+        parser.load(starting_with="FatturaElettronica")
+        df, new_labels = modify_header(parser.get_pandas_dataset(offset=1))
+
+        print("Exporting .xlsx file")
+        with ExcelWriter(output_file) as ew:
+            df.to_excel(ew)
+
+    else:
+        # The invoices are parsed and written in batches, without building the whole dataframe
+        def simplified_batches():
+            for batch in parser.iter_pandas_datasets(batch_size=1000, offset=1, starting_with="FatturaElettronica"):
+                batch, batch_labels = modify_header(batch)
+                new_labels.update(batch_labels)
+                yield batch
+
+        print("Exporting {} file".format(output))
+        export(simplified_batches(), output_file)
 
     if new_labels != {}:
         print("\nWARNING: new labels must be added to the lookup table")
@@ -54,10 +95,4 @@ if __name__ == "__main__":
             print("\t{} -> {}".format(key, element))
         print('\n')
 
-    print("Exporting .xlsx file")
-    excel_file = join(path, "parsed_xml_data.xlsx")
-    ew = ExcelWriter(excel_file)
-    df.to_excel(ew)
-    ew.save()
-
-    print(" --> Data written to .xlsx file: {}\n".format(excel_file))
\ No newline at end of file
+    print(" --> Data written to file: {}\n".format(output_file))
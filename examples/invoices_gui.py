@@ -1,13 +1,24 @@
 from io import BytesIO
+from os.path import join
+from tempfile import gettempdir
 from pandas import ExcelWriter
 from ges_xml_converter.xml_parser import XML_converter, SeparatorError
 from ges_xml_converter.p7m_converter import group_convert_p7m_to_xml
 from ges_xml_converter.invoices_modifier import modify_header, get_default_lookup_table, convert_to_lookup_table
+from ges_xml_converter.parse_cache import ParseCache
+from ges_xml_converter.export import write_csv, write_parquet
 
 import streamlit as st
 
 st.session_state["p7m_exceptions"] = [[], []]
 
+# Parsing cache shared by all the users and reruns of the app, created once per server process
+@st.cache_resource
+def get_parse_cache():
+    return ParseCache(join(gettempdir(), "ges_xml_converter_cache"))
+
+cache = get_parse_cache()
+
 def p7m_exception_handler(exception, filename):
     st.session_state["p7m_exceptions"][0].append(filename)
     st.session_state["p7m_exceptions"][1].append(exception)
@@ -16,7 +27,7 @@ st.write("""
 # GES invoices parser
 
 This app is designed to parse multiple italian electronic invoices in `.xml` and `.xml.p7m` formats. The outut 
-of the program is a `.xlsx` report in tabular form containing all the head and body fields.
+of the program is a `.xlsx`, `.csv` or `.parquet` report in tabular form containing all the head and body fields.
 """)
 
 with st.sidebar:
@@ -46,6 +57,9 @@ with st.sidebar:
     concat = st.text_input("Separator used for concatenating equivalent field", value="|")
     filler = st.text_input("Symbol used for filling empty header fields", value="-", disabled=simplify_flag)
 
+    st.write("#### Report options:")
+    report_format = st.selectbox("Format of the report", options=["xlsx", "csv", "parquet"])
+
     with st.expander("Advanced options"):
         separator = st.text_input("Separator used during XML recursion", value="#@#")
 
@@ -77,21 +91,24 @@ if custom_lookup_flag == False or custom_lookup != None:
             
             if p7m_dict != {}:
 
-                buffer = group_convert_p7m_to_xml(p7m_dict, exception_handler=p7m_exception_handler)
+                buffer = group_convert_p7m_to_xml(p7m_dict, exception_handler=p7m_exception_handler, cache=cache)
 
                 for key, stream in buffer.items():
                     xml_dict[key] = stream 
             
             try:
-                parser = XML_converter(xml_dict, separator=separator, concat_symbol=concat)
+                parser = XML_converter(xml_dict, separator=separator, concat_symbol=concat, validate=True)
 
             except SeparatorError as e:
-                st.error("""ERROR: the recursion separator '`{}`' has been detected in one or more `.xml`
+                msg = """ERROR: the recursion separator '`{}`' has been detected in one or more `.xml`
                     files and therefore it cannot be used. \n\nPlease change the separator in the advanced
-                    options section""".format(separator))
+                    options section\n\n""".format(separator)
+                for filename, offsets in e.occurrences.items():
+                    msg += '\t  "{}" : byte offsets {}\n'.format(filename, ", ".join([str(x) for x in offsets]))
+                st.error(msg)
 
             else:
-                parser.load(starting_with="FatturaElettronica")
+                parser.load(starting_with="FatturaElettronica", cache=cache)
                 parser.inflate_tree(filler=filler)
                 df = parser.get_pandas_dataset(offset=offset)
 
@@ -117,14 +134,20 @@ if custom_lookup_flag == False or custom_lookup != None:
                         st.warning(msg) 
 
                 output = BytesIO()
-                writer = ExcelWriter(output)
-                df.to_excel(writer)
-                writer.save()
+                if report_format == "csv":
+                    write_csv(df, output)
+                elif report_format == "parquet":
+                    write_parquet(df, output)
+                else:
+                    with ExcelWriter(output) as writer:
+                        df.to_excel(writer)
                 processed_data = output.getvalue()
             
                 st.write("""
                 ## Report download
-                Press the download button to download the report in `.xlsx` format
-                """)
+                Press the download button to download the report in `.{}` format
+                """.format(report_format))
                 
-                st.download_button("Download the report", data=processed_data, file_name='parsed_data.xlsx')
+                st.download_button(
+                    "Download the report", data=processed_data, file_name='parsed_data.{}'.format(report_format)
+                )
@@ -0,0 +1,306 @@
+from typing import Iterator, List, Optional, Tuple, Union
+
+# DER content of the PKCS#7 signedData object identifier (1.2.840.113549.1.7.2)
+SIGNED_DATA_OID = b"\x2a\x86\x48\x86\xf7\x0d\x01\x07\x02"
+
+# Tags of the ASN.1 elements visited while looking for the signed content
+SEQUENCE, SET, INTEGER, OID, OCTET_STRING, CONSTRUCTED_OCTET_STRING, CONTEXT_0 = 0x30, 0x31, 0x02, 0x06, 0x04, 0x24, 0xa0
+
+# Element header: (tag, offset of the content, offset of the end of the content or None if of indefinite length)
+Header = Tuple[int, int, Optional[int]]
+
+
+def read_header(data: memoryview, offset: int) -> Header:
+    '''
+    Reads the identifier and the length octets of the BER/DER element starting at the given offset. Only the first
+    octet of the high tag numbers is returned since they are not used by the PKCS#7 structures.
+
+        Parameters:
+        -----------
+            data (memoryview): The encoded data
+            offset (int): The offset of the element
+
+        Returns:
+        --------
+            header (Header): The tag, the offset of the content and the offset of its end (None if the element has
+                indefinite length and is terminated by an end-of-contents element)
+    '''
+
+    size = len(data)
+    if offset + 2 > size:
+        raise ValueError
+
+    tag = data[offset]
+    offset += 1
+    if tag & 0x1f == 0x1f:
+        while offset < size and data[offset] & 0x80:
+            offset += 1
+        offset += 1
+
+    if offset >= size:
+        raise ValueError
+
+    length = data[offset]
+    offset += 1
+
+    if length == 0x80:
+        if tag & 0x20 == 0:
+            raise ValueError
+        return tag, offset, None
+
+    if length & 0x80:
+        nbytes = length & 0x7f
+        if offset + nbytes > size:
+            raise ValueError
+        length = int.from_bytes(data[offset:offset + nbytes], "big")
+        offset += nbytes
+
+    if offset + length > size:
+        raise ValueError
+
+    return tag, offset, offset + length
+
+
+def _is_end_of_contents(data: memoryview, offset: int, end: Optional[int]) -> bool:
+    '''
+    Checks if the children of an element are over: at its end if of definite length or at the end-of-contents
+    element otherwise.
+    '''
+    if end != None:
+        return offset >= end
+    if offset + 2 > len(data):
+        raise ValueError
+    return data[offset] == 0 and data[offset + 1] == 0
+
+
+def skip_element(data: memoryview, offset: int) -> int:
+    '''
+    Returns the offset following the element starting at the given offset. The elements of indefinite length are
+    skipped by walking their children.
+
+        Parameters:
+        -----------
+            data (memoryview): The encoded data
+            offset (int): The offset of the element
+
+        Returns:
+        --------
+            offset (int): The offset of the next element
+    '''
+
+    _, offset, end = read_header(data, offset)
+    if end != None:
+        return end
+
+    while _is_end_of_contents(data, offset, None) == False:
+        offset = skip_element(data, offset)
+    return offset + 2
+
+
+def iter_children(data: memoryview, offset: int) -> Iterator[int]:
+    '''
+    Yields the offsets of the children of the constructed element starting at the given offset.
+
+        Parameters:
+        -----------
+            data (memoryview): The encoded data
+            offset (int): The offset of the constructed element
+
+        Returns:
+        --------
+            offsets (Iterator[int]): The offsets of the children
+    '''
+    _, offset, end = read_header(data, offset)
+    while _is_end_of_contents(data, offset, end) == False:
+        yield offset
+        offset = skip_element(data, offset)
+
+
+def get_element(data: memoryview, offset: int) -> memoryview:
+    '''
+    Returns a view of the whole encoding (header included) of the element starting at the given offset.
+    '''
+    return data[offset:skip_element(data, offset)]
+
+
+def get_content(data: memoryview, offset: int) -> memoryview:
+    '''
+    Returns a view of the content of the primitive element starting at the given offset.
+    '''
+    _, start, end = read_header(data, offset)
+    if end == None:
+        raise ValueError
+    return data[start:end]
+
+
+def decode_oid(content: Union[bytes, memoryview]) -> str:
+    '''
+    Decodes the content of an OBJECT IDENTIFIER element to its dotted representation (e.g. '1.2.840.113549.1.7.2').
+
+        Parameters:
+        -----------
+            content (Union[bytes, memoryview]): The content of the OBJECT IDENTIFIER element
+
+        Returns:
+        --------
+            oid (str): The dotted object identifier
+    '''
+    arcs, value = [], 0
+    for byte in bytes(content):
+        value = (value << 7) | (byte & 0x7f)
+        if byte & 0x80 == 0:
+            arcs.append(value)
+            value = 0
+
+    if arcs == [] or value != 0:
+        raise ValueError
+
+    first = min(arcs[0]//40, 2)
+    return ".".join([str(x) for x in [first, arcs[0] - 40*first] + arcs[1:]])
+
+
+def _enter(data: memoryview, offset: int, tag: int) -> Header:
+    '''
+    Reads the header of an element checking its tag.
+    '''
+    header = read_header(data, offset)
+    if header[0] != tag:
+        raise ValueError
+    return header
+
+
+def iter_octet_string(data: memoryview, offset: int) -> Iterator[memoryview]:
+    '''
+    Yields the chunks of the OCTET STRING starting at the given offset, without copies. A primitive OCTET STRING
+    has a single chunk while a constructed one (BER) is made of nested OCTET STRING segments, of definite or
+    indefinite length.
+
+        Parameters:
+        -----------
+            data (memoryview): The encoded data
+            offset (int): The offset of the OCTET STRING
+
+        Returns:
+        --------
+            chunks (Iterator[memoryview]): The chunks of the OCTET STRING content
+    '''
+
+    tag, offset, end = read_header(data, offset)
+
+    if tag == OCTET_STRING:
+        yield data[offset:end]
+
+    elif tag == CONSTRUCTED_OCTET_STRING:
+        while _is_end_of_contents(data, offset, end) == False:
+            tag, start, stop = read_header(data, offset)
+            if tag == OCTET_STRING and stop != None:
+                yield data[start:stop]
+                offset = stop
+            else:
+                yield from iter_octet_string(data, offset)
+                offset = skip_element(data, offset)
+
+    else:
+        raise ValueError
+
+
+def _locate_signed_data(data: memoryview) -> Tuple[int, int, int]:
+    '''
+    Walks the ContentInfo and SignedData headers of a signed file returning the offset of the SignedData content,
+    the offset of the EncapsulatedContentInfo and the offset of the element following it.
+    '''
+
+    _, offset, _ = _enter(data, 0, SEQUENCE)
+    _, start, end = _enter(data, offset, OID)
+    if data[start:end] != SIGNED_DATA_OID:
+        raise ValueError
+    offset = skip_element(data, offset)
+
+    _, offset, _ = _enter(data, offset, CONTEXT_0)
+    _, signed, _ = _enter(data, offset, SEQUENCE)
+
+    _enter(data, signed, INTEGER)
+    offset = skip_element(data, signed)
+    _enter(data, offset, SET)
+    encap = skip_element(data, offset)
+
+    _enter(data, encap, SEQUENCE)
+    return signed, encap, skip_element(data, encap)
+
+
+def iter_signed_content(der_data: Union[bytes, memoryview]) -> Iterator[memoryview]:
+    '''
+    Walks a PKCS#7/CMS signed file (ContentInfo -> SignedData -> EncapsulatedContentInfo) and yields the chunks of
+    the signed content (eContent) as views of the input data. The certificates and the signatures following the
+    content are neither parsed nor verified. Both DER and BER encoding (indefinite lengths and constructed OCTET
+    STRING) are supported.
+
+        Parameters:
+        -----------
+            der_data (Union[bytes, memoryview]): The DER/BER encoded signed file
+
+        Returns:
+        --------
+            chunks (Iterator[memoryview]): The chunks of the signed content
+    '''
+
+    data = memoryview(der_data)
+    _, encap, _ = _locate_signed_data(data)
+
+    _, offset, end = read_header(data, encap)
+    _enter(data, offset, OID)
+    offset = skip_element(data, offset)
+
+    # Detached signature, the content is not included in the file
+    if _is_end_of_contents(data, offset, end) == True:
+        raise ValueError
+
+    _, offset, _ = _enter(data, offset, CONTEXT_0)
+    yield from iter_octet_string(data, offset)
+
+
+def split_signed_data(der_data: Union[bytes, memoryview]) -> Tuple[List[memoryview], List[memoryview]]:
+    '''
+    Returns the certificates and the SignerInfo elements of a PKCS#7/CMS signed file, as views of the whole
+    encoding of each element. The certificate revocation lists are skipped.
+
+        Parameters:
+        -----------
+            der_data (Union[bytes, memoryview]): The DER/BER encoded signed file
+
+        Returns:
+        --------
+            certificates (List[memoryview]): The encoded certificates
+            signer_infos (List[memoryview]): The encoded SignerInfo elements
+    '''
+
+    data = memoryview(der_data)
+    _, _, offset = _locate_signed_data(data)
+
+    certificates: List[memoryview] = []
+    if offset < len(data) and data[offset] == CONTEXT_0:
+        certificates = [get_element(data, child) for child in iter_children(data, offset)]
+        offset = skip_element(data, offset)
+
+    if offset < len(data) and data[offset] == CONTEXT_0 + 1:
+        offset = skip_element(data, offset)
+
+    _enter(data, offset, SET)
+    signer_infos = [get_element(data, child) for child in iter_children(data, offset)]
+
+    return certificates, signer_infos
+
+
+def extract_signed_content(der_data: bytes) -> bytes:
+    '''
+    Extracts the signed content of a PKCS#7/CMS signed file (see 'iter_signed_content'), copying it only once.
+
+        Parameters:
+        -----------
+            der_data (bytes): The DER/BER encoded signed file
+
+        Returns:
+        --------
+            content (bytes): The signed content
+    '''
+    return b"".join(iter_signed_content(der_data))
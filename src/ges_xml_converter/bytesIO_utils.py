@@ -1,27 +1,118 @@
+import tarfile
+import threading
 from io import BytesIO
-from os import listdir
-from os.path import isdir, isfile, abspath, join, basename, normpath
-from typing import Dict, Tuple, Union
+from os import listdir, scandir
+from os.path import isdir, isfile, abspath, join, basename, normpath, relpath
+from pathlib import PurePath, PurePosixPath
+from tarfile import TarInfo
+from zipfile import ZipFile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+from ges_xml_converter.instrumentation import Metrics, measure
 
 
-def path_to_BytesIO(source: str, extension: Union[Tuple[str], str] = "") -> Dict[str, BytesIO]:
+# Suffixes of the archives whose members can be streamed by 'FileStreamMapping'
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+# Location of a file stored in an archive: the path to the archive and the name of the member
+ArchiveMember = Tuple[str, str]
+
+
+class FileStreamMapping(Mapping[str, BytesIO]):
     '''
-    This function converts a path to a file o a path to a folder containing more than one file,
-    in a dictionary of BytesIO data ordered by a key equal to the filename.
+    Read-only dictionary-like object mapping a filename to the BytesIO stream of the file content. The files are
+    read only when the corresponding key is accessed and the mapping does not keep any reference to the returned
+    streams, so that only the files currently in use are stored in memory. Can be used in place of the dictionary
+    returned by 'path_to_BytesIO'. Members of .zip and .tar archives are streamed directly from the archive, the
+    last opened archive is kept open until a member of another archive is requested or 'close' is called. The
+    archive is shared by the threads reading from the mapping, its members are read one at a time.
 
-        Parameters:
-        -----------
-        source (str): String containing the path to the file or the folder
-        extension(str): Extension of the file to be processes (default: "")
+        Conctructor parameters
+        ----------------------
+            filepaths (Mapping[str, Union[str, ArchiveMember]]): Dictionary containing the path of each file, or the
+                (archive path, member name) tuple of each archive member, ordered by filename
+            metrics (Optional[Metrics]): Collector of the reading time of each file (stage 'read'), disabled if
+                None (default: None)
+    '''
 
-        Returns:
-        --------
-            dataset (Dict[BytesIO]): Dictionary of BytesIO of the selected files ordered by filename
+    def __init__(self, filepaths: Mapping[str, Union[str, ArchiveMember]], metrics: Optional[Metrics] = None) -> None:
+        self.filepaths = filepaths
+        self.metrics = metrics
+        self._archive_path: Optional[str] = None
+        self._archive: Any = None
+        self._tar_members: Dict[str, TarInfo] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, filename: str) -> BytesIO:
+
+        location = self.filepaths[filename]
+
+        with measure(self.metrics, "read", filename) as record:
+            if isinstance(location, tuple):
+                archive_path, member = location
+                data = self._read_member(archive_path, member)
+            else:
+                with open(location, 'rb') as file:
+                    data = file.read()
+            record.nbytes = len(data)
+
+        return BytesIO(data)
+
+    def _read_member(self, archive_path: str, member: str) -> bytes:
+
+        with self._lock:
+            if archive_path != self._archive_path:
+                self._close_archive()
+                if archive_path.endswith(".zip"):
+                    self._archive = ZipFile(archive_path)
+                else:
+                    self._archive = tarfile.open(archive_path)
+                    self._tar_members = {info.name: info for info in self._archive.getmembers()}
+                self._archive_path = archive_path
+
+            if type(self._archive) == ZipFile:
+                data: bytes = self._archive.read(member)
+            else:
+                data = self._archive.extractfile(self._tar_members[member]).read()
+
+        return data
+
+    def _close_archive(self) -> None:
+        if self._archive != None:
+            self._archive.close()
+        self._archive_path, self._archive, self._tar_members = None, None, {}
+
+    def close(self) -> None:
+        '''
+        Closes the archive kept open by the mapping, if any.
+        '''
+        with self._lock:
+            self._close_archive()
+
+    def __enter__(self) -> "FileStreamMapping":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def __contains__(self, filename: object) -> bool:
+        return filename in self.filepaths
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.filepaths)
+
+    def __len__(self) -> int:
+        return len(self.filepaths)
+
+
+def _collect_filepaths(source: str, extension: Union[Tuple[str, ...], str] = "") -> Dict[str, str]:
+    '''
+    Collects the path of the selected files ordered by filename, see 'path_to_BytesIO' for the parameters.
     '''
     if source == "" or source == None:
         raise ValueError
 
-    dataset = {}
+    filepaths = {}
     path = abspath(source)
 
     if isdir(path):
@@ -30,19 +121,178 @@ def path_to_BytesIO(source: str, extension: Union[Tuple[str], str] = "") -> Dict
                 if filename.endswith(extension) == False:
                     continue
 
-            filepath = join(path, filename)
-            with open(filepath, 'rb') as file:
-                dataset[filename] = BytesIO(file.read())
+            filepaths[filename] = join(path, filename)
 
     elif isfile(path):
         filename = basename(normpath(path))
         if extension != "":
             if path.endswith(extension) == False:
                 raise ValueError
-        with open(path, 'rb') as file:
-            dataset[filename] = BytesIO(file.read())
+        filepaths[filename] = path
 
     else:
         raise ValueError
     
-    return dataset
\ No newline at end of file
+    return filepaths
+
+
+def path_to_BytesIO(source: str, extension: Union[Tuple[str, ...], str] = "", metrics: Optional[Metrics] = None) -> Dict[str, BytesIO]:
+    '''
+    This function converts a path to a file o a path to a folder containing more than one file,
+    in a dictionary of BytesIO data ordered by a key equal to the filename.
+
+        Parameters:
+        -----------
+        source (str): String containing the path to the file or the folder
+        extension(str): Extension of the file to be processes (default: "")
+        metrics (Optional[Metrics]): Collector of the reading time of each file (stage 'read') (default: None)
+
+        Returns:
+        --------
+            dataset (Dict[BytesIO]): Dictionary of BytesIO of the selected files ordered by filename
+    '''
+    dataset = {}
+
+    for filename, filepath in _collect_filepaths(source, extension).items():
+        with measure(metrics, "read", filename) as record:
+            with open(filepath, 'rb') as file:
+                data = file.read()
+            record.nbytes = len(data)
+        dataset[filename] = BytesIO(data)
+    
+    return dataset
+
+
+def path_to_lazy_BytesIO(source: str, extension: Union[Tuple[str, ...], str] = "", metrics: Optional[Metrics] = None) -> FileStreamMapping:
+    '''
+    Lazy version of 'path_to_BytesIO': the files are listed immediately but their content is read only when
+    the corresponding BytesIO stream is requested.
+
+        Parameters:
+        -----------
+        source (str): String containing the path to the file or the folder
+        extension(str): Extension of the file to be processes (default: "")
+        metrics (Optional[Metrics]): Collector of the reading time of each file (stage 'read') (default: None)
+
+        Returns:
+        --------
+            dataset (FileStreamMapping): Mapping of the BytesIO of the selected files ordered by filename
+    '''
+    return FileStreamMapping(_collect_filepaths(source, extension), metrics)
+
+
+def _match_globs(path: str, include: Optional[Sequence[str]], exclude: Optional[Sequence[str]]) -> bool:
+    '''
+    Checks a relative posix path against the include and exclude glob patterns (see 'pathlib.PurePosixPath.match').
+    '''
+    purepath = PurePosixPath(path)
+
+    if include != None and not any([purepath.match(pattern) for pattern in include]):
+        return False
+
+    if exclude != None and any([purepath.match(pattern) for pattern in exclude]):
+        return False
+
+    return True
+
+
+def _list_archive(archive_path: str) -> List[str]:
+    '''
+    Lists the name of the regular files stored in a .zip or .tar archive.
+    '''
+    if archive_path.endswith(".zip"):
+        with ZipFile(archive_path) as archive:
+            return [info.filename for info in archive.infolist() if info.is_dir() == False]
+
+    with tarfile.open(archive_path) as archive:
+        return [info.name for info in archive.getmembers() if info.isfile()]
+
+
+def _scan_directory(path: str) -> Tuple[List[str], List[str]]:
+    '''
+    Lists the regular files and the subfolders contained in a folder. Symbolic links to folders are not followed,
+    so that link loops and linked copies of a folder are not walked.
+    '''
+    files, folders = [], []
+    with scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                folders.append(entry.path)
+            elif entry.is_file():
+                files.append(entry.path)
+    return files, folders
+
+
+def walk_to_lazy_BytesIO(
+    source: str,
+    include: Optional[Sequence[str]] = None,
+    exclude: Optional[Sequence[str]] = None,
+    archives: bool = True,
+    max_workers: int = 4,
+    metrics: Optional[Metrics] = None,
+) -> FileStreamMapping:
+    '''
+    This function recursively walks a folder, and the .zip/.tar archives it contains, building a lazy mapping of the
+    selected files. The folders are scanned by a bounded pool of threads, symbolic links to folders are skipped. The
+    keys of the mapping are the posix paths relative to the source folder, the members of an archive are keyed as
+    '<archive path>/<member name>' and kept in archive order, so that compressed archives are read sequentially. The
+    include and exclude glob patterns are matched against the keys (e.g. '*.xml', '2022/*/*.xml.p7m'), the exclude
+    patterns are also matched against the archive paths.
+
+        Parameters:
+        -----------
+        source (str): String containing the path to the folder or to a single archive
+        include (Optional[Sequence[str]]): Glob patterns of the files to be selected, all if None (default: None)
+        exclude (Optional[Sequence[str]]): Glob patterns of the files to be discarded (default: None)
+        archives (bool): If set to True the members of the archives are listed instead of the archives (default: True)
+        max_workers (int): Maximum number of folders scanned concurrently (default: 4)
+        metrics (Optional[Metrics]): Collector of the reading time of each file (stage 'read') (default: None)
+
+        Returns:
+        --------
+            dataset (FileStreamMapping): Mapping of the BytesIO of the selected files ordered by relative path, the
+                members of an archive in archive order
+    '''
+    if source == "" or source == None:
+        raise ValueError
+
+    if type(max_workers) != int or max_workers < 1:
+        raise ValueError
+
+    root = abspath(source)
+    filepaths: Dict[str, Union[str, ArchiveMember]] = {}
+    # Sorting key of each file: the relative path of the file or of its archive, with the position in the archive
+    positions: Dict[str, Tuple[str, int]] = {}
+
+    def add_file(filepath: str, relative: str) -> None:
+        if archives == True and filepath.endswith(ARCHIVE_SUFFIXES):
+            if exclude != None and _match_globs(relative, None, exclude) == False:
+                return
+            for idx, member in enumerate(_list_archive(filepath)):
+                key = "{}/{}".format(relative, member)
+                if _match_globs(key, include, exclude):
+                    filepaths[key] = (filepath, member)
+                    positions[key] = (relative, idx)
+        elif _match_globs(relative, include, exclude):
+            filepaths[relative] = filepath
+            positions[relative] = (relative, 0)
+
+    if isfile(root):
+        add_file(root, basename(root))
+
+    elif isdir(root):
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {executor.submit(_scan_directory, root)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    files, folders = future.result()
+                    for folder in folders:
+                        pending.add(executor.submit(_scan_directory, folder))
+                    for filepath in files:
+                        add_file(filepath, PurePath(relpath(filepath, root)).as_posix())
+
+    else:
+        raise ValueError
+
+    return FileStreamMapping({key: filepaths[key] for key in sorted(filepaths, key=positions.__getitem__)}, metrics)
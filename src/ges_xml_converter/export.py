@@ -0,0 +1,247 @@
+import gzip
+from io import TextIOWrapper
+from typing import Any, BinaryIO, Iterable, Iterator, List, Optional, TextIO, Union
+from pandas import DataFrame, Index, MultiIndex
+
+# A single dataframe or an iterable of dataframe batches sharing the same columns
+Batches = Union[DataFrame, Iterable[DataFrame]]
+
+# A file path or a binary file object
+Destination = Union[str, BinaryIO]
+
+
+def flatten_columns(columns: Index, separator: str = "|") -> List[str]:
+    '''
+    Converts the columns of a dataframe into flat strings, joining the levels of a MultiIndex with a separator.
+
+        Parameters:
+        -----------
+            columns (Index): The columns of the dataframe
+            separator (str): Symbol used to join the levels of a MultiIndex (default: '|')
+
+        Returns:
+        --------
+            names (List[str]): The flat column names
+    '''
+    if isinstance(columns, MultiIndex):
+        return [separator.join([str(x) for x in signature]) for signature in columns]
+    return [str(x) for x in columns]
+
+
+def _iter_batches(batches: Batches) -> Iterator[DataFrame]:
+    '''
+    Iterates over the batches, conforming each one to the columns of the first. Missing columns are filled with
+    NaN while unknown columns raise a ValueError, since they cannot be added to the already written schema.
+    '''
+    if isinstance(batches, DataFrame):
+        batches = [batches]
+
+    reference: Optional[Index] = None
+    for batch in batches:
+        if reference is None:
+            reference = batch.columns
+        elif not batch.columns.equals(reference):
+            if not set(batch.columns).issubset(set(reference)):
+                raise ValueError
+            batch = batch.reindex(columns=reference)
+        yield batch
+
+
+def write_csv(
+    batches: Batches, destination: Destination, index_label: str = "file", separator: str = "|", **kwargs: Any
+) -> int:
+    '''
+    Writes the dataframe batches to a single .csv file, one batch at a time. The header is written with the first
+    batch and the file is compressed with gzip if its name ends with '.gz'.
+
+        Parameters:
+        -----------
+            batches (Batches): The dataframe or the iterable of dataframe batches to write
+            destination (Destination): The path of the file or a binary file object
+            index_label (str): Name of the column containing the dataframe index (default: 'file')
+            separator (str): Symbol used to join the levels of MultiIndex columns (default: '|')
+            **kwargs: Additional arguments of 'DataFrame.to_csv'
+
+        Returns:
+        --------
+            nrows (int): The number of written rows
+    '''
+
+    handle: TextIO
+    if isinstance(destination, str):
+        if destination.endswith(".gz"):
+            handle = gzip.open(destination, "wt", encoding="utf-8", newline="")
+        else:
+            handle = open(destination, "w", encoding="utf-8", newline="")
+    else:
+        handle = TextIOWrapper(destination, encoding="utf-8", newline="")
+
+    nrows = 0
+    try:
+        for batch in _iter_batches(batches):
+            header: Union[bool, List[str]] = flatten_columns(batch.columns, separator) if nrows == 0 else False
+            batch.to_csv(handle, header=header, index_label=index_label, **kwargs)
+            nrows += len(batch)
+    finally:
+        if isinstance(destination, str):
+            handle.close()
+        else:
+            handle.flush()
+            handle.detach()
+
+    return nrows
+
+
+def _import_pyarrow() -> Any:
+    '''
+    Imports the optional pyarrow dependency required by the Parquet and Arrow writers.
+    '''
+    try:
+        import pyarrow
+    except ImportError as exception:
+        raise ImportError("pyarrow is required to export Parquet and Arrow files") from exception
+    return pyarrow
+
+
+def _to_arrow_table(pa: Any, batch: DataFrame, schema: Any, dictionary: bool, index_label: str, separator: str) -> Any:
+    '''
+    Converts a dataframe batch into an Arrow table, column by column. If no schema is given the string columns are
+    dictionary encoded (if requested) and the empty columns are stored as strings, otherwise the batch is converted
+    to the given schema.
+    '''
+
+    names = [index_label] + flatten_columns(batch.columns, separator)
+    columns = [batch.index] + [batch.iloc[:, i] for i in range(batch.shape[1])]
+
+    arrays = []
+    for i, column in enumerate(columns):
+        array = pa.array(column, from_pandas=True)
+
+        if schema != None:
+            field_type = schema.field(i).type
+            if pa.types.is_dictionary(field_type):
+                array = array.cast(field_type.value_type).dictionary_encode()
+            if array.type != field_type:
+                array = array.cast(field_type)
+
+        else:
+            if pa.types.is_null(array.type):
+                array = array.cast(pa.string())
+            if dictionary == True and (pa.types.is_string(array.type) or pa.types.is_large_string(array.type)):
+                array = array.dictionary_encode()
+
+        arrays.append(array)
+
+    if schema != None:
+        return pa.Table.from_arrays(arrays, schema=schema)
+    return pa.Table.from_arrays(arrays, names=names)
+
+
+def write_parquet(
+    batches: Batches,
+    destination: Destination,
+    dictionary: bool = True,
+    index_label: str = "file",
+    separator: str = "|",
+    compression: str = "snappy",
+) -> int:
+    '''
+    Writes the dataframe batches to a Parquet file, one row group per batch. The schema is fixed by the first batch.
+    Requires pyarrow.
+
+        Parameters:
+        -----------
+            batches (Batches): The dataframe or the iterable of dataframe batches to write
+            destination (Destination): The path of the file or a binary file object
+            dictionary (bool): If True the string columns are dictionary encoded (default: True)
+            index_label (str): Name of the column containing the dataframe index (default: 'file')
+            separator (str): Symbol used to join the levels of MultiIndex columns (default: '|')
+            compression (str): Compression codec of the Parquet file (default: 'snappy')
+
+        Returns:
+        --------
+            nrows (int): The number of written rows
+    '''
+
+    pa = _import_pyarrow()
+    import pyarrow.parquet as pq
+
+    writer, schema, nrows = None, None, 0
+    try:
+        for batch in _iter_batches(batches):
+            table = _to_arrow_table(pa, batch, schema, dictionary, index_label, separator)
+            if writer == None:
+                schema = table.schema
+                writer = pq.ParquetWriter(destination, schema, compression=compression)
+            writer.write_table(table)
+            nrows += len(batch)
+    finally:
+        if writer != None:
+            writer.close()
+
+    return nrows
+
+
+def write_arrow(
+    batches: Batches, destination: Destination, dictionary: bool = True, index_label: str = "file", separator: str = "|"
+) -> int:
+    '''
+    Writes the dataframe batches to an Arrow IPC (Feather v2) file, one record batch per dataframe batch. The schema
+    is fixed by the first batch. Requires pyarrow.
+
+        Parameters:
+        -----------
+            batches (Batches): The dataframe or the iterable of dataframe batches to write
+            destination (Destination): The path of the file or a binary file object
+            dictionary (bool): If True the string columns are dictionary encoded (default: True)
+            index_label (str): Name of the column containing the dataframe index (default: 'file')
+            separator (str): Symbol used to join the levels of MultiIndex columns (default: '|')
+
+        Returns:
+        --------
+            nrows (int): The number of written rows
+    '''
+
+    pa = _import_pyarrow()
+
+    writer, schema, nrows = None, None, 0
+    try:
+        for batch in _iter_batches(batches):
+            table = _to_arrow_table(pa, batch, schema, dictionary, index_label, separator)
+            if writer == None:
+                schema = table.schema
+                writer = pa.ipc.new_file(destination, schema)
+            writer.write_table(table)
+            nrows += len(batch)
+    finally:
+        if writer != None:
+            writer.close()
+
+    return nrows
+
+
+def export(batches: Batches, destination: str, **kwargs: Any) -> int:
+    '''
+    Writes the dataframe batches choosing the format from the extension of the destination file: '.csv' or
+    '.csv.gz' for CSV, '.parquet' for Parquet and '.arrow' or '.feather' for Arrow IPC.
+
+        Parameters:
+        -----------
+            batches (Batches): The dataframe or the iterable of dataframe batches to write
+            destination (str): The path of the file
+            **kwargs: Additional arguments of the selected writer
+
+        Returns:
+        --------
+            nrows (int): The number of written rows
+    '''
+
+    name = destination.lower()
+    if name.endswith(".csv") or name.endswith(".csv.gz"):
+        return write_csv(batches, destination, **kwargs)
+    elif name.endswith(".parquet"):
+        return write_parquet(batches, destination, **kwargs)
+    elif name.endswith(".arrow") or name.endswith(".feather"):
+        return write_arrow(batches, destination, **kwargs)
+    else:
+        raise ValueError
@@ -0,0 +1,220 @@
+from decimal import Decimal, InvalidOperation
+from math import nan
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+from pandas import DataFrame, Series, to_datetime, to_numeric
+from ges_xml_converter.invoices_modifier import DEFAULT_LOOKUP_TABLE
+
+# Types supported by the conversion stage
+FIELD_TYPES = ("str", "float", "decimal", "int", "date", "datetime")
+
+# Types of the FatturaPA fields, as (exact tags, tag prefixes), checked in order
+FIELD_TYPE_RULES: Tuple[Tuple[str, Tuple[str, ...], Tuple[str, ...]], ...] = (
+    ("datetime", (), ("DataOra",)),
+    ("date", ("Data", "RiferimentoData"), ("Data",)),
+    ("int", ("NumeroLinea", "RiferimentoNumeroLinea", "GiorniTerminiPagamento", "NumeroColli"), ()),
+    (
+        "float",
+        (
+            "Quantita", "Imposta", "Arrotondamento", "Percentuale", "SpeseAccessorie", "AlCassa", "PesoLordo",
+            "PesoNetto", "CapitaleSociale", "ScontoPagamentoAnticipato", "PenalitaPagamentiRitardati",
+        ),
+        ("Importo", "Prezzo", "Aliquota", "Imponibile"),
+    ),
+)
+
+
+def get_field_type(tag: str) -> str:
+    '''
+    This function returns the type of a FatturaPA field from its tag name (e.g. 'ImportoTotaleDocumento' -> 'float',
+    'DataScadenzaPagamento' -> 'date'). Fields not matching any rule are strings.
+
+        Parameters:
+        -----------
+            tag (str): The tag of the field
+
+        Returns:
+        --------
+            type (str): The type of the field, one of FIELD_TYPES
+    '''
+
+    for field_type, names, prefixes in FIELD_TYPE_RULES:
+        if tag in names or tag.startswith(prefixes):
+            return field_type
+    return "str"
+
+
+def get_lookup_table_types(lookup_table: Dict[str, str] = {}) -> Dict[str, str]:
+    '''
+    This function derives the types of the labels of a lookup table from the tag names of the associated branches.
+    Labels associated to string fields are not included.
+
+        Parameters:
+        -----------
+            lookup_table (Dict[str, str]): The lookup table, the DEFAULT_LOOKUP_TABLE if empty (default: {})
+
+        Returns:
+        --------
+            types (Dict[str, str]): The type of each non-string label
+    '''
+
+    if lookup_table == {}:
+        lookup_table = DEFAULT_LOOKUP_TABLE
+
+    types = {}
+    for key, label in lookup_table.items():
+        field_type = get_field_type(key.split("|")[-1])
+        if field_type != "str":
+            types[label] = field_type
+    return types
+
+
+def infer_column_types(columns: Iterable[Hashable], filler: Optional[str] = None, lookup_table: Dict[str, str] = {}) -> Dict[Hashable, str]:
+    '''
+    This function infers the types of the columns of a dataframe generated by the XML_converter class. The columns of
+    a simplified header (see 'invoices_modifier.modify_header') are typed by label, the MultiIndex columns by the
+    last tag of their signature. String columns are not included.
+
+        Parameters:
+        -----------
+            columns (Iterable[Hashable]): The columns of the dataframe
+            filler (Optional[str]): Element used to fill the gap between node fields, if any (default: None)
+            lookup_table (Dict[str, str]): The lookup table of the simplified header, the DEFAULT_LOOKUP_TABLE if
+                empty (default: {})
+
+        Returns:
+        --------
+            types (Dict[Hashable, str]): The type of each non-string column
+    '''
+
+    label_types = get_lookup_table_types(lookup_table)
+
+    types: Dict[Hashable, str] = {}
+    for column in columns:
+        if type(column) == tuple:
+            tags = [tag for level in column for tag in str(level).split(" - ") if tag not in ("", filler)]
+            field_type = get_field_type(tags[-1]) if tags != [] else "str"
+        else:
+            field_type = label_types.get(str(column), "str")
+        if field_type != "str":
+            types[column] = field_type
+    return types
+
+
+def _to_decimal(value: Any) -> Any:
+    try:
+        return Decimal(value)
+    except (InvalidOperation, TypeError, ValueError):
+        return nan
+
+
+def convert_values(values: Series, field_type: str) -> Series:
+    '''
+    This function converts, in a vectorized way, a series of strings to the given type. Values that cannot be
+    converted, like the 'None' text of empty fields, become missing values.
+
+        Parameters:
+        -----------
+            values (Series): The series of strings
+            field_type (str): The target type, one of FIELD_TYPES
+
+        Returns:
+        --------
+            values (Series): The converted series: float64, Int64 (float64 if not integral), datetime64 or Decimal
+                objects
+    '''
+
+    if field_type not in FIELD_TYPES:
+        raise ValueError
+
+    if field_type == "str":
+        return values
+
+    if field_type == "float":
+        return to_numeric(values, errors="coerce").astype("float64")
+
+    if field_type == "int":
+        numbers = to_numeric(values, errors="coerce").astype("float64")
+        if (numbers.dropna() % 1 == 0).all():
+            return numbers.astype("Int64")
+        return numbers
+
+    if field_type == "decimal":
+        return values.map(_to_decimal)
+
+    if field_type == "date":
+        return to_datetime(values.astype("string").str.slice(0, 10), format="%Y-%m-%d", errors="coerce")
+
+    return to_datetime(values, errors="coerce", utc=True)
+
+
+def convert_types(
+    df: DataFrame,
+    types: Optional[Dict[Hashable, str]] = None,
+    concat_symbol: str = "|",
+    filler: Optional[str] = None,
+    split_strings: bool = False,
+) -> DataFrame:
+    '''
+    This function converts the string columns of a dataframe generated by the XML_converter class to typed columns.
+    Cells containing the values of equivalent branches, joined by the 'concat_symbol', are converted to lists of
+    typed values: if a column contains at least one multi-valued cell all its non missing cells become lists (see
+    'explode_fields' to obtain one row per value). The columns not included in the types are not modified.
+
+        Parameters:
+        -----------
+            df (DataFrame): Pandas dataframe generated by the XML_converter class
+            types (Optional[Dict[Hashable, str]]): The type of each column to convert, inferred from the FatturaPA
+                field names if None (see 'infer_column_types') (default: None)
+            concat_symbol (str): Symbol used to concatenate the values of equivalent branches (default: '|')
+            filler (Optional[str]): Element used to fill the gap between node fields, used to infer the types
+                (default: None)
+            split_strings (bool): If True the multi-valued cells of the string columns are converted to lists
+                too (default: False)
+
+        Returns:
+        --------
+            df (DataFrame): A new dataframe with the converted columns
+    '''
+
+    if types == None:
+        types = infer_column_types(df.columns, filler=filler)
+
+    if split_strings == True:
+        types = {**{column: "str" for column in df.columns}, **types}
+
+    result = df.copy(deep=False)
+
+    for column, field_type in types.items():
+        if column not in df.columns:
+            continue
+
+        values = df[column].reset_index(drop=True)
+        strings = values.astype("string")
+
+        if strings.str.contains(concat_symbol, regex=False).fillna(False).any():
+            flat = strings.str.split(concat_symbol, regex=False).explode()
+            converted = convert_values(flat, field_type)
+            lists = converted.groupby(level=0, sort=False).agg(list).mask(values.isna())
+            result[column] = lists.to_numpy(dtype=object)
+        elif field_type != "str":
+            result[column] = convert_values(values, field_type).to_numpy()
+
+    return result
+
+
+def explode_fields(df: DataFrame, columns: Iterable[Hashable]) -> DataFrame:
+    '''
+    This function converts a group of list columns, generated by 'convert_types', into one row per value. The lists of
+    each row must have the same length in all the columns, as for the fields of the same repeated block (e.g. the
+    'DettaglioLinee' fields present in all lines). The other columns are repeated on each row.
+
+        Parameters:
+        -----------
+            df (DataFrame): Pandas dataframe with list columns
+            columns (Iterable[Hashable]): The list columns to explode together
+
+        Returns:
+        --------
+            df (DataFrame): The exploded dataframe, indexed by the entry names
+    '''
+    return df.explode(list(columns))
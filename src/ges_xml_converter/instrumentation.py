@@ -0,0 +1,248 @@
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, Tuple
+from pandas import DataFrame
+from ges_xml_converter.export import export
+
+# Reset of the traced peak, available from Python 3.9: without it the peak of a stage includes the previous stages
+_reset_peak: Callable[[], None] = getattr(tracemalloc, "reset_peak", lambda: None)
+
+
+class StageRecord():
+    '''
+    Measurement of a processing stage, for a single file or for a whole dataset.
+
+        Attributes:
+        -----------
+            stage (str): The name of the stage (e.g. 'read', 'p7m_to_xml', 'parse')
+            filename (Optional[str]): The processed file, None if the stage processes a whole dataset
+            seconds (float): The wall time of the stage
+            nbytes (int): The number of processed bytes, 0 if not relevant
+            peak (Optional[int]): The peak of the memory allocated by the stage in bytes, None if not traced
+            depth (int): The nesting level of the stage, nested stages are included in the time of the parent
+    '''
+
+    __slots__ = ("stage", "filename", "seconds", "nbytes", "peak", "depth")
+
+    def __init__(
+        self, stage: str, filename: Optional[str] = None, seconds: float = 0., nbytes: int = 0,
+        peak: Optional[int] = None, depth: int = 0,
+    ) -> None:
+        self.stage = stage
+        self.filename = filename
+        self.seconds = seconds
+        self.nbytes = nbytes
+        self.peak = peak
+        self.depth = depth
+
+    def __repr__(self) -> str:
+        return "StageRecord(stage={!r}, filename={!r}, seconds={:.6f}, nbytes={}, peak={})".format(
+            self.stage, self.filename, self.seconds, self.nbytes, self.peak
+        )
+
+
+# Record returned when the instrumentation is disabled, its attributes can be set and are discarded
+_DISCARDED = StageRecord("")
+
+
+class Metrics():
+    '''
+    Collector of the wall time, processed bytes and (optionally) peak memory allocation of the processing stages,
+    per file and per dataset. A Metrics object can be passed to the readers, the p7m conversion, the XML_converter
+    class and the pipeline to record their stages. The stages can be nested: a stage without a filename inherits
+    the one of the enclosing stage. The peak allocation is traced with tracemalloc, that slows down the
+    allocations, and is process-wide: it is meaningful only for stages running one at a time in the caller process.
+
+        Conctructor parameters
+        ----------------------
+            trace_memory (bool): If True the peak memory allocation of each stage is traced (default: False)
+
+        Attributes:
+        -----------
+            records (List[StageRecord]): The measurements, in order of completion
+    '''
+
+    def __init__(self, trace_memory: bool = False) -> None:
+        self.trace_memory = trace_memory
+        self.records: List[StageRecord] = []
+        self._local = threading.local()
+
+    def _stack(self) -> List[List[Any]]:
+        stack: Optional[List[List[Any]]] = getattr(self._local, "stack", None)
+        if stack == None:
+            stack = []
+            self._local.stack = stack
+        return stack
+
+    @contextmanager
+    def measure(self, stage: str, filename: Optional[str] = None, nbytes: int = 0) -> Iterator[StageRecord]:
+        '''
+        Context manager measuring the enclosed code as a stage. The record is yielded so that the number of
+        processed bytes can be set when known.
+
+            Parameters:
+            -----------
+                stage (str): The name of the stage
+                filename (Optional[str]): The processed file, inherited from the enclosing stage if None
+                    (default: None)
+                nbytes (int): The number of processed bytes (default: 0)
+
+            Yields:
+            -------
+                record (StageRecord): The record of the stage, stored when the stage is completed
+        '''
+
+        stack = self._stack()
+        if filename == None and stack != []:
+            filename = stack[-1][0].filename
+
+        record = StageRecord(stage, filename, nbytes=nbytes, depth=len(stack))
+
+        # Each frame stores the record, the allocated memory at the start and the highest peak of the nested stages
+        frame: List[Any] = [record, 0, 0]
+        tracing = self.trace_memory == True and tracemalloc.is_tracing() == False and stack == []
+        if self.trace_memory == True:
+            if tracing == True:
+                tracemalloc.start()
+            frame[1], peak = tracemalloc.get_traced_memory()
+            if stack != []:
+                stack[-1][2] = max(stack[-1][2], peak)
+            _reset_peak()
+
+        stack.append(frame)
+        start = perf_counter()
+        try:
+            yield record
+        finally:
+            record.seconds = perf_counter() - start
+            stack.pop()
+
+            if self.trace_memory == True:
+                _, peak = tracemalloc.get_traced_memory()
+                peak = max(peak, frame[2])
+                record.peak = peak - frame[1]
+                if stack != []:
+                    stack[-1][2] = max(stack[-1][2], peak)
+                if tracing == True:
+                    tracemalloc.stop()
+
+            self.records.append(record)
+
+    def record(self, stage: str, filename: Optional[str], seconds: float, nbytes: int = 0, peak: Optional[int] = None) -> None:
+        '''
+        Stores a stage measured elsewhere, e.g. by a worker process (see 'timed_call').
+
+            Parameters:
+            -----------
+                stage (str): The name of the stage
+                filename (Optional[str]): The processed file, None if the stage processes a whole dataset
+                seconds (float): The wall time of the stage
+                nbytes (int): The number of processed bytes (default: 0)
+                peak (Optional[int]): The peak memory allocation of the stage, if traced (default: None)
+        '''
+        self.records.append(StageRecord(stage, filename, seconds, nbytes, peak))
+
+    def clear(self) -> None:
+        '''
+        Removes all the records.
+        '''
+        self.records = []
+
+    def summary(self) -> DataFrame:
+        '''
+        Summarizes the records by stage.
+
+            Returns:
+            --------
+                summary (DataFrame): The number of calls, the total wall time, the processed bytes and the highest
+                    peak allocation of each stage, in order of first occurrence
+        '''
+        stages: Dict[str, List[Any]] = {}
+        for record in self.records:
+            stats = stages.setdefault(record.stage, [0, 0., 0, None])
+            stats[0] += 1
+            stats[1] += record.seconds
+            stats[2] += record.nbytes
+            if record.peak != None:
+                stats[3] = record.peak if stats[3] == None else max(stats[3], record.peak)
+
+        summary = DataFrame.from_dict(stages, orient="index", columns=["calls", "seconds", "bytes", "peak"])
+        summary.index.name = "stage"
+        return summary
+
+    def file_summary(self) -> DataFrame:
+        '''
+        Summarizes the records of each file, sorted by decreasing total time so that the pathological files come
+        first. The records of the stages processing a whole dataset are not included.
+
+            Returns:
+            --------
+                summary (DataFrame): For each file, the wall time of each stage (nested stages are also included in
+                    the time of the parent), the total time of the top-level stages, the largest number of bytes
+                    processed by a stage and the highest peak allocation
+        '''
+        files: Dict[str, Dict[str, Any]] = {}
+        stages: Dict[str, None] = {}
+        for record in self.records:
+            if record.filename == None:
+                continue
+            stages[record.stage] = None
+            stats = files.setdefault(record.filename, {"seconds": 0., "bytes": 0, "peak": None})
+            stats[record.stage] = stats.get(record.stage, 0.) + record.seconds
+            if record.depth == 0:
+                stats["seconds"] += record.seconds
+            stats["bytes"] = max(stats["bytes"], record.nbytes)
+            if record.peak != None:
+                stats["peak"] = record.peak if stats["peak"] == None else max(stats["peak"], record.peak)
+
+        summary = DataFrame.from_dict(files, orient="index", columns=list(stages) + ["seconds", "bytes", "peak"])
+        summary.index.name = "file"
+        return summary.sort_values("seconds", ascending=False, kind="stable")
+
+    def export(self, destination: str, **kwargs: Any) -> int:
+        '''
+        Writes the per-file summary (see 'file_summary'), choosing the format from the extension of the destination
+        file (see 'export.export').
+
+            Parameters:
+            -----------
+                destination (str): The path of the file
+                **kwargs: Additional arguments of the selected writer
+
+            Returns:
+            --------
+                nrows (int): The number of written rows
+        '''
+        return export(self.file_summary(), destination, **kwargs)
+
+
+def measure(metrics: Optional[Metrics], stage: str, filename: Optional[str] = None, nbytes: int = 0) -> ContextManager[StageRecord]:
+    '''
+    Measures a stage if a Metrics object is given, otherwise returns a context manager doing nothing so that the
+    disabled instrumentation costs a function call per stage.
+
+        Parameters:
+        -----------
+            metrics (Optional[Metrics]): The collector of the measurements, None if disabled
+            stage (str): The name of the stage
+            filename (Optional[str]): The processed file (default: None)
+            nbytes (int): The number of processed bytes (default: 0)
+
+        Returns:
+        --------
+            context (ContextManager[StageRecord]): The context manager yielding the record of the stage
+    '''
+    if metrics == None:
+        return nullcontext(_DISCARDED)
+    return metrics.measure(stage, filename, nbytes)
+
+
+def timed_call(function: Callable[..., Any], *args: Any) -> Tuple[Any, float]:
+    '''
+    Calls a function returning its result and its wall time, used to measure the stages run by worker processes.
+    '''
+    start = perf_counter()
+    result = function(*args)
+    return result, perf_counter() - start
@@ -1,6 +1,10 @@
+import threading
 from io import BytesIO, TextIOWrapper
-from typing import Dict, Tuple
-from pandas import DataFrame
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Set, Tuple
+from numpy import array
+from pandas import DataFrame, Index
+from ges_xml_converter.path_index import PathIndex
 
 DEFAULT_LOOKUP_TABLE = {
     "DatiTrasmissione|IdTrasmittente|IdPaese" : "Tras_Paese",
@@ -164,40 +168,207 @@ DEFAULT_LOOKUP_TABLE = {
 }   
         
         
+def get_lookup_table_index(lookup_table: Dict[str, str] = {}) -> PathIndex:
+    '''
+    This function compiles the keys of a lookup table into a PathIndex mapping each branch to its label. Keys can
+    contain glob patterns matching a single tag (e.g. 'DatiGenerali|*|Data').
+
+        Parameters:
+        -----------
+            lookup_table (Dict[str, str]): The lookup table, the DEFAULT_LOOKUP_TABLE if empty (default: {})
+
+        Returns:
+        --------
+            index (PathIndex): The index mapping the branches to the labels
+    '''
+
+    if lookup_table == {}:
+        lookup_table = DEFAULT_LOOKUP_TABLE
+
+    return PathIndex({tuple(key.split("|")): label for key, label in lookup_table.items()})
+
+
+class HeaderMapping():
+    '''
+    Compiled mapping of the dataframe column signatures to the labels of a lookup table. The signatures already
+    seen are stored in a hash index so that the header of a dataframe is mapped with a single vectorized lookup,
+    while the PathIndex of the lookup table is probed only for new signatures. Use 'get_header_mapping' to share
+    the mapping between calls. The mapping can be shared between threads: the index of the known signatures is
+    replaced as a whole, under a lock, and is rebuilt from the current columns when it exceeds 'max_signatures'.
+
+        Conctructor parameters
+        ----------------------
+            lookup_table (Dict[str, str]): The lookup table, the DEFAULT_LOOKUP_TABLE if empty (default: {})
+            filler (str): Element to fill the gap between node fields (default: ' ')
+            max_signatures (int): Maximum number of known signatures (default: 65536)
+    '''
+
+    def __init__(self, lookup_table: Dict[str, str] = {}, filler: str = " ", max_signatures: int = 2**16) -> None:
+        self.filler = filler
+        self.max_signatures = max_signatures
+        self.index = get_lookup_table_index(lookup_table)
+        self._lock = threading.Lock()
+
+        # Known signatures, their labels and the presence of the label, always replaced together
+        self._state: Tuple[Index, Any, Any] = (Index([], dtype=object), array([], dtype=object), array([], dtype=bool))
+
+
+    @property
+    def signatures(self) -> List[Tuple[Any, ...]]:
+        '''
+        The known signatures, in order of first occurrence.
+        '''
+        return list(self._state[0])
+
+
+    def _resolve(self, signatures: Index) -> Tuple[Index, Any, Any]:
+        '''
+        Adds the unknown signatures to the index, returning the new state.
+        '''
+        with self._lock:
+            known, mapped, _ = self._state
+            missing = signatures[known.get_indexer(signatures) == -1]
+            if len(missing) == 0:
+                return self._state
+
+            keys, labels = list(known), list(mapped)
+            if len(keys) + len(missing) > self.max_signatures:
+                keys, labels, missing = [], [], signatures
+
+            for signature in dict.fromkeys(missing):
+                keys.append(signature)
+                labels.append(self.index.get(tuple([x for x in signature if x != self.filler])))
+
+            state = (
+                Index(keys, dtype=object, tupleize_cols=False),
+                array(labels, dtype=object),
+                array([label != None for label in labels], dtype=bool),
+            )
+            self._state = state
+            return state
+
+
+    def map_columns(self, columns: Index) -> Tuple[List[str], Dict[str, str]]:
+        '''
+        Maps the column signatures to the labels of the lookup table. Unknown signatures get a 'unk_N' label.
+
+            Parameters:
+            -----------
+                columns (Index): The columns of a dataframe generated by the XML_converter class
+
+            Returns:
+            --------
+                header (List[str]): The labels of the columns
+                new_labels (Dict[str, str]): The labels assigned to the unknown signatures
+        '''
+
+        keys = [signature if type(signature) == tuple else (signature,) for signature in columns]
+        signatures = Index(keys, dtype=object, tupleize_cols=False)
+
+        known, mapped, found = self._state
+        positions = known.get_indexer(signatures)
+        if (positions == -1).any():
+            known, mapped, found = self._resolve(signatures)
+            positions = known.get_indexer(signatures)
+
+        header: List[Any] = list(mapped[positions])
+        new_labels: Dict[str, str] = {}
+
+        for i in (~found[positions]).nonzero()[0]:
+            search = "|".join([x for x in keys[i] if x != self.filler])
+            new_label = "unk_{}".format(len(new_labels)+1)
+            header[i] = new_label
+            new_labels[search] = new_label
+
+        return header, new_labels
+
+
+    def apply(self, df: DataFrame) -> Tuple[DataFrame, Dict[str, str]]:
+        '''
+        Replaces in place the header of a dataframe, without copying its data.
+
+            Parameters:
+            -----------
+                df (DataFrame): Pandas dataframe generated by the XML_converter class
+
+            Returns:
+            --------
+                df (DataFrame): The same dataframe with a simplified column structure
+                new_labels (Dict[str, str]): The labels assigned to the unknown signatures
+        '''
+        header, new_labels = self.map_columns(df.columns)
+        df.columns = Index(header, dtype=object)
+        return df, new_labels
+
+
+@lru_cache(maxsize=16)
+def _cached_header_mapping(items: Tuple[Tuple[str, str], ...], filler: str) -> HeaderMapping:
+    return HeaderMapping(dict(items), filler)
+
+
+def get_header_mapping(lookup_table: Dict[str, str] = {}, filler: str = " ") -> HeaderMapping:
+    '''
+    This function returns the compiled HeaderMapping of a lookup table, reusing the one built by previous calls with
+    the same lookup table and filler.
+
+        Parameters:
+        -----------
+            lookup_table (Dict[str, str]): The lookup table, the DEFAULT_LOOKUP_TABLE if empty (default: {})
+            filler (str): Element to fill the gap between node fields (default: ' ')
+
+        Returns:
+        --------
+            mapping (HeaderMapping): The compiled header mapping
+    '''
+
+    if lookup_table == {}:
+        lookup_table = DEFAULT_LOOKUP_TABLE
+
+    return _cached_header_mapping(tuple(sorted(lookup_table.items())), filler)
+
+
 def modify_header(df: DataFrame, filler: str = " ", lookup_table: Dict[str, str] = {}) -> Tuple[DataFrame, Dict[str, str]]:
     '''
-    This function simplifies the dataframe header by substitution with a pre-defiend lookup table.
+    This function simplifies the dataframe header by substitution with a pre-defiend lookup table. The header is
+    replaced in place and the compiled mapping of the lookup table is reused between calls.
 
         Parameters:
         -----------
             df (DataFrame): Pandas dataframe generated by the XML_converter class
             filler (str): Element to fill the gap between node fields (default: ' ')
+            lookup_table (Dict[str, str]): The lookup table, the DEFAULT_LOOKUP_TABLE if empty (default: {})
         
         Returns:
         --------
             df (DataFrame): Pandas dataframe with a simplified column structure
+            new_labels (Dict[str, str]): The labels assigned to the branches missing from the lookup table
     '''
     
-    header = []
-    new_labels: Dict[str, str] = {}
+    return get_header_mapping(lookup_table, filler).apply(df)
+
+
+def get_lookup_table_paths(
+    lookup_table: Dict[str, str] = {}, roots: Iterable[str] = ("FatturaElettronicaHeader", "FatturaElettronicaBody")
+) -> Set[Tuple[str, ...]]:
+    '''
+    This function converts the keys of a lookup table into the branches to be selected by 'XML_converter.load'.
+    Since the keys do not include the first tag layer, each key is combined with all the given root tags.
+
+        Parameters:
+        -----------
+            lookup_table (Dict[str, str]): The lookup table, the DEFAULT_LOOKUP_TABLE if empty (default: {})
+            roots (Iterable[str]): Tags of the first layer of the tree (default: FatturaElettronicaHeader and
+                FatturaElettronicaBody)
+
+        Returns:
+        --------
+            paths (Set[Tuple[str, ...]]): The branches associated to the lookup table keys
+    '''
 
     if lookup_table == {}:
         lookup_table = DEFAULT_LOOKUP_TABLE
-    
-    for signature in df.columns:
-
-        search = "|".join([x for x in signature if x != filler])
 
-        if search in lookup_table:
-            header.append(lookup_table[search])
-        else:
-            new_label = "unk_{}".format(len(new_labels)+1)
-            header.append(new_label)
-            new_labels[search] = new_label
-        
-    df.columns = header         #Verify if pandas offers a more convenient header changer
-    
-    return df, new_labels
+    return {(root,) + tuple(key.split("|")) for key in lookup_table for root in roots}
 
 
 def get_default_lookup_table() -> BytesIO:
@@ -1,8 +1,22 @@
+import re
 from io import BytesIO
 from base64 import b64decode
-from OpenSSL import crypto
-from OpenSSL._util import (ffi as _ffi, lib as _lib,)
-from typing import Callable, Dict
+from codecs import BOM_UTF8, getincrementaldecoder, lookup
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Tuple, Union
+from ges_xml_converter.asn1_reader import extract_signed_content
+from ges_xml_converter.instrumentation import Metrics, measure, timed_call
+from ges_xml_converter.parse_cache import ParseCache
+from ges_xml_converter.signature import SignatureStatus, TrustStore, verify_signed_data
+from ges_xml_converter.xml_parser import MAX_CHUNK_SIZE, sniff_xml_encoding, _iter_pooled
+
+# Version of the encoding normalization of the decoded files, part of the cache keys: to be increased when the
+# output of 'normalize_xml_encoding' changes
+NORMALIZATION_VERSION = "2"
+
+# Encoding declaration of the .xml prolog
+PROLOG_ENCODING = re.compile(r"""^(\ufeff?\s*<\?xml[^>]*?encoding\s*=\s*["'])([A-Za-z0-9._-]+)(["'])""")
 
 
 def default_exception_handler(exception: Exception, filename: str) -> None:
@@ -17,53 +31,286 @@ def default_exception_handler(exception: Exception, filename: str) -> None:
     print("\t{}".format(exception))
 
 
-def p7m_to_xml(p7m_stream: BytesIO) -> BytesIO:
+def default_verification_handler(status: SignatureStatus, filename: str) -> None:
+    '''
+    Default verification handler used to print the failed signature verifications on terminal
+        Parameters:
+        -----------
+            status (SignatureStatus): The verification status
+            filename (str): The name of the verified file
+    '''
+    if status.valid == False:
+        print(""" -> Verifying '{}': \u001b[31;1m{}\u001b[0m""".format(filename, status.status.upper()))
+        print("\t{}".format(status.message))
+
+
+def sniff_p7m_format(p7m_data: bytes) -> str:
+    '''
+    Detects from the first bytes if a .p7m file is stored in binary DER format or base64 encoded (with or without
+    the PEM armor). A DER signed file always starts with the SEQUENCE tag (0x30).
+
+        Parameters:
+        -----------
+            p7m_data (bytes): The content of the .p7m file
+
+        Returns:
+        --------
+            format (str): 'der' or 'base64'
+    '''
+    return "der" if p7m_data[:1] == b"\x30" else "base64"
+
+
+def _to_der(p7m_data: bytes) -> bytes:
+    '''
+    Returns the DER content of a .p7m file, decoding it if base64 encoded. The PEM armor lines are dropped while
+    the whitespaces are ignored by the base64 decoder.
+    '''
+    if sniff_p7m_format(p7m_data) == "der":
+        return p7m_data
+
+    if p7m_data.lstrip()[:5] == b"-----":
+        p7m_data = b"".join([line for line in p7m_data.splitlines() if line.startswith(b"-----") == False])
+
+    return b64decode(p7m_data)
+
+
+# Function extracting the signed content from the DER data of a .p7m file
+P7MBackend = Callable[[bytes], bytes]
+
+# Available backends, selectable by name. The 'asn1' backend walks the ASN.1 structure without external libraries.
+P7M_BACKENDS: Dict[str, P7MBackend] = {
+    "asn1": extract_signed_content,
+}
+
+
+def get_p7m_backend(backend: Union[str, P7MBackend]) -> P7MBackend:
+    '''
+    Returns the function of an unwrapping backend, given its name in P7M_BACKENDS or the function itself.
+
+        Parameters:
+        -----------
+            backend (Union[str, P7MBackend]): The name of the backend or a function extracting the signed content
+                from the DER data of a .p7m file
+
+        Returns:
+        --------
+            backend (P7MBackend): The backend function
+    '''
+    if isinstance(backend, str):
+        if backend not in P7M_BACKENDS:
+            raise ValueError
+        return P7M_BACKENDS[backend]
+    if callable(backend) == False:
+        raise ValueError
+    return backend
+
+
+def _is_utf8(data: bytes, chunk_size: int = 2**16) -> bool:
+    '''
+    Checks if the data are valid UTF-8, decoding them in chunks so that the decoded text is never stored whole.
+    '''
+    if data.isascii():
+        return True
+    decoder = getincrementaldecoder("utf-8")()
+    view = memoryview(data)
+    try:
+        for start in range(0, len(view), chunk_size):
+            decoder.decode(view[start:start+chunk_size])
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def _cache_params(backend: Union[str, P7MBackend]) -> List[str]:
+    '''
+    Returns the parameters of the cache key of a decoded file: the backend, by name or by qualified name for the
+    custom functions, and the version of the encoding normalization.
+    '''
+    if isinstance(backend, str):
+        name = backend
+    else:
+        name = "{}.{}".format(getattr(backend, "__module__", ""), getattr(backend, "__qualname__", repr(backend)))
+    return ["p7m", name, NORMALIZATION_VERSION]
+
+
+def normalize_xml_encoding(xml_data: bytes) -> bytes:
+    '''
+    Converts an .xml file to UTF-8 only if its prolog (or byte order mark) declares a different encoding, the
+    declaration is updated accordingly. Files without declaration, or declaring UTF-8, are returned without copies
+    if they are valid UTF-8, otherwise they are mislabelled and are converted from windows-1252.
+
+        Parameters:
+        -----------
+            xml_data (bytes): The content of the .xml file
+
+        Returns:
+        --------
+            xml_data (bytes): The UTF-8 encoded content of the .xml file
     '''
-    Convert a .xml.p7m BytesIO stream into a regular .xml BytesIO stream.
+
+    encoding = sniff_xml_encoding(xml_data[:1024])
+
+    try:
+        if encoding == None or lookup(encoding).name == "utf-8":
+            if _is_utf8(xml_data):
+                return xml_data
+            encoding = "windows-1252"
+            if xml_data.startswith(BOM_UTF8):
+                xml_data = xml_data[len(BOM_UTF8):]
+        text = xml_data.decode(encoding)
+    except LookupError:
+        return xml_data
+
+    return PROLOG_ENCODING.sub(r"\g<1>UTF-8\g<3>", text.lstrip("\ufeff"), count=1).encode('utf-8')
+
+
+def p7m_to_xml_bytes(p7m_data: bytes, backend: Union[str, P7MBackend] = "asn1") -> bytes:
+    '''
+    Convert the content of a .xml.p7m file into the content of the regular .xml file. The format of the file is
+    detected from the first bytes and the signed content is converted to UTF-8 only if required (see
+    'normalize_xml_encoding').
+
+        Parameters:
+        -----------
+            p7m_data (bytes): The content of the .xml.p7m file to convert
+            backend (Union[str, P7MBackend]): The unwrapping backend, see 'get_p7m_backend' (default: 'asn1')
+
+        Returns:
+        --------
+            xml_data (bytes): The UTF-8 encoded content of the .xml file
+    '''
+    return normalize_xml_encoding(get_p7m_backend(backend)(_to_der(p7m_data)))
+
+
+def p7m_to_xml(p7m_stream: BytesIO, backend: Union[str, P7MBackend] = "asn1") -> BytesIO:
+    '''
+    Convert a .xml.p7m BytesIO stream into a regular .xml BytesIO stream (see 'p7m_to_xml_bytes').
 
         Parameters:
         -----------
             p7m_stream (BytesIO): BytesIO stream of the .xml.p7m file to convert
+            backend (Union[str, P7MBackend]): The unwrapping backend, see 'get_p7m_backend' (default: 'asn1')
         
         Returns:
         --------
             xml_stream (BytesIO): BytesIO stream of the .xml output file
     '''
-    
-    p7m_data = p7m_stream.read()
-    
+    return BytesIO(p7m_to_xml_bytes(p7m_stream.read(), backend))
+
+
+def verify_p7m(p7m_data: bytes, trust_store: TrustStore, verification_time: Optional[datetime] = None) -> SignatureStatus:
+    '''
+    Verifies the signatures of the content of a .xml.p7m file (see 'signature.verify_signed_data').
+
+        Parameters:
+        -----------
+            p7m_data (bytes): The content of the .xml.p7m file
+            trust_store (TrustStore): The trust anchors, with the cache of the verified signer certificates
+            verification_time (Optional[datetime]): The time at which the certificate chains are verified, the
+                current time if None (default: None)
+
+        Returns:
+        --------
+            status (SignatureStatus): The verification status
+    '''
     try:
-        p7m = crypto.load_pkcs7_data(crypto.FILETYPE_ASN1, p7m_data)
-    
-    except:
-        buffer = b64decode(p7m_data)
-        p7m = crypto.load_pkcs7_data(crypto.FILETYPE_ASN1, buffer)
-
-    bio_out =crypto._new_mem_buf()
-    res = _lib.PKCS7_verify(p7m._pkcs7, _ffi.NULL, _ffi.NULL, _ffi.NULL, bio_out, _lib.PKCS7_NOVERIFY|_lib.PKCS7_NOSIGS)
-
-    if res != 1:
-        raise RuntimeError
-    
+        der_data = _to_der(p7m_data)
+    except ValueError:
+        return SignatureStatus("error", message="invalid base64 encoding")
+    return verify_signed_data(der_data, trust_store, verification_time)
+
+
+def p7m_to_xml_verified(
+    p7m_stream: BytesIO, trust_store: TrustStore, backend: Union[str, P7MBackend] = "asn1"
+) -> Tuple[BytesIO, SignatureStatus]:
+    '''
+    Convert a .xml.p7m BytesIO stream into a regular .xml BytesIO stream verifying its signatures. The stream is
+    returned even if the verification fails.
+
+        Parameters:
+        -----------
+            p7m_stream (BytesIO): BytesIO stream of the .xml.p7m file to convert
+            trust_store (TrustStore): The trust anchors, with the cache of the verified signer certificates
+            backend (Union[str, P7MBackend]): The unwrapping backend, see 'get_p7m_backend' (default: 'asn1')
+
+        Returns:
+        --------
+            xml_stream (BytesIO): BytesIO stream of the .xml output file
+            status (SignatureStatus): The verification status
+    '''
+    der_data = _to_der(p7m_stream.read())
+    xml_data = normalize_xml_encoding(get_p7m_backend(backend)(der_data))
+    return BytesIO(xml_data), verify_signed_data(der_data, trust_store)
+
+
+# Result of the pooled decoding of a file: the .xml bytes or the occurred exception
+Decoded = Tuple[Optional[bytes], Optional[Exception]]
+
+
+def _strip_p7m_suffix(filename: str) -> str:
+    return filename[:-len(".p7m")] if filename.endswith(".p7m") else filename
+
+
+def _p7m_bytes_to_xml(p7m_data: bytes, backend: Union[str, P7MBackend] = "asn1") -> Decoded:
+    '''
+    Worker function used by the pooled conversion: returns the decoded .xml bytes or the occurred exception
+    so that the exception can be handled in the caller process.
+    '''
     try:
-        data = crypto._bio_to_string(bio_out).decode("utf-8")
-    except UnicodeDecodeError:
-        data = crypto._bio_to_string(bio_out).decode("windows-1252")
-    
-    return BytesIO(data.encode('utf-8'))
+        return p7m_to_xml_bytes(p7m_data, backend), None
+    except Exception as exception:
+        return None, exception
 
 
-def group_convert_p7m_to_xml(instream: Dict[str, BytesIO], verbose: bool = False, exception_handler: Callable[[Exception, str], None] = default_exception_handler) -> Dict[str, BytesIO]:
+def _p7m_chunk_to_xml(p7m_datas: List[bytes], backend: Union[str, P7MBackend]) -> List[Tuple[Decoded, float]]:
+    '''
+    Worker function of the pooled conversion: decodes a chunk of files returning the result and the wall time of each.
+    '''
+    return [timed_call(_p7m_bytes_to_xml, p7m_data, backend) for p7m_data in p7m_datas]
+
+
+def group_convert_p7m_to_xml(
+    instream: Mapping[str, BytesIO],
+    verbose: bool = False,
+    exception_handler: Callable[[Exception, str], None] = default_exception_handler,
+    workers: int = 1,
+    chunksize: Optional[int] = None,
+    cache: Optional[ParseCache] = None,
+    backend: Union[str, P7MBackend] = "asn1",
+    trust_store: Optional[TrustStore] = None,
+    verification_handler: Callable[[SignatureStatus, str], None] = default_verification_handler,
+    metrics: Optional[Metrics] = None,
+) -> Dict[str, BytesIO]:
     '''
     Converts all the .xml.p7m file contained into a 'source_folder' to a regular .xml file in a 'destination_folder'.
+    If more than one worker is requested the files are decoded by a pool of processes while the exceptions are
+    still handled in the caller process and the output keeps the input ordering. If a cache is given the decoded
+    .xml files are stored in it and files with an already cached content are not decoded again. If a trust store
+    is given the signatures of the decoded files are verified in the caller process, so that the cache of the
+    verified signer certificates is shared by the whole batch, and the status of each file is delivered to the
+    verification handler. The files are returned whatever their verification status.
 
         Parameters:
         -----------
-            instream (Dict[str, BytesIO]): Dictionary of BytesIO stream, ordered by filename, containing
+            instream (Mapping[str, BytesIO]): Dictionary (or lazy mapping) of BytesIO stream, ordered by filename, containing
                 the .xml.p7m to be converted.
             verbose (bool): If set to True will report the success of the conversion process on terminal.
             exception_handler (Callable[[Exception, str], None]): function taking as arguments the exception
                 occurred and the filename, capable of handling a .p7m conversion exception.
+            workers (int): number of worker processes used to decode the files (default: 1)
+            chunksize (Optional[int]): number of files sent to a worker at once, if None it is selected
+                automatically from the number of files and workers (default: None)
+            cache (Optional[ParseCache]): on-disk cache of the decoded files (default: None)
+            backend (Union[str, P7MBackend]): the unwrapping backend, see 'get_p7m_backend'. Custom backends used
+                with more than one worker must be picklable, i.e. defined at module level (default: 'asn1')
+            trust_store (Optional[TrustStore]): trust anchors used to verify the signatures, if None the
+                signatures are not verified (default: None)
+            verification_handler (Callable[[SignatureStatus, str], None]): function taking as arguments the
+                verification status and the filename, called for each decoded file if a trust store is given.
+            metrics (Optional[Metrics]): Collector of the time spent on each file by the decoding (stage
+                'p7m_to_xml') and the verification (stage 'verify'), disabled if None. The files decoded by the
+                worker processes report only the wall time (default: None)
         
         Returns:
         --------
@@ -71,30 +318,125 @@ def group_convert_p7m_to_xml(instream: Dict[str, BytesIO], verbose: bool = False
                 the .xml to be converted
     '''
 
-    if type(instream) == dict:
-        if instream == {}:
+    if isinstance(instream, Mapping):
+        if len(instream) == 0:
             raise ValueError
     else:
         raise ValueError
 
+    if type(workers) != int or workers < 1:
+        raise ValueError
+
+    if chunksize != None and chunksize < 1:
+        raise ValueError
+
+    get_p7m_backend(backend)
+    params = _cache_params(backend)
+
+    def handle(exception: Exception, filename: str) -> None:
+        if exception_handler == default_exception_handler:
+            if verbose == True:
+                exception_handler(exception, filename)
+        else:
+            exception_handler(exception, filename)
+
+    def report(status: SignatureStatus, filename: str) -> None:
+        if verification_handler == default_verification_handler:
+            if verbose == True:
+                verification_handler(status, filename)
+        else:
+            verification_handler(status, filename)
+
     outstream = {}
 
-    for filename, stream in instream.items():
+    if workers == 1:
 
-        newname = filename.strip(".p7m")
+        for filename, stream in instream.items():
 
-        try:
-            buffer = p7m_to_xml(stream)
+            newname = _strip_p7m_suffix(filename)
+
+            try:
+                with measure(metrics, "p7m_to_xml", filename) as record:
+                    if cache == None and trust_store == None:
+                        buffer = p7m_to_xml(stream, backend)
+                    else:
+                        p7m_data = stream.read()
+                        data = None
+                        if cache != None:
+                            key = ParseCache.make_key(p7m_data, *params)
+                            data = cache.get(key)
+                        if data == None:
+                            data = p7m_to_xml_bytes(p7m_data, backend)
+                            if cache != None:
+                                cache.put(key, data)
+                        buffer = BytesIO(data)
+                    record.nbytes = stream.tell()
+
+            except Exception as exception:
+                handle(exception, filename)
 
-        except Exception as exception:
-            if exception_handler == default_exception_handler:
-                if verbose == True:
-                    exception_handler(exception, filename)
             else:
-                exception_handler(exception, filename)
+                outstream[newname] = buffer
+                if trust_store != None:
+                    with measure(metrics, "verify", filename, len(p7m_data)):
+                        status = verify_p7m(p7m_data, trust_store)
+                    report(status, filename)
 
-        else:
-            outstream[newname] = buffer
+        return outstream
 
-    return outstream
+    filenames = list(instream)
+
+    if chunksize == None:
+        chunksize = max(1, min(MAX_CHUNK_SIZE, len(filenames)//(4*workers)))
+
+    # Yields the context of each chunk, i.e. the filenames, the cached results, the (index, cache key, size) of
+    # the files sent to the pool and the contents to verify, with the contents of the files to decode
+    def read_chunks() -> Iterator[Tuple[Tuple[List[str], Dict[int, Decoded], List[Tuple[int, str, int]], List[bytes]], List[bytes]]]:
+        for start in range(0, len(filenames), chunksize):
+            chunk = filenames[start:start+chunksize]
+            results: Dict[int, Decoded] = {}
+            missing: List[Tuple[int, str, int]] = []
+            p7m_datas: List[bytes] = []
+            datas: List[bytes] = []
+
+            for idx, filename in enumerate(chunk):
+                p7m_data = instream[filename].read()
+                if trust_store != None:
+                    p7m_datas.append(p7m_data)
+                key = ""
+                if cache != None:
+                    key = ParseCache.make_key(p7m_data, *params)
+                    data = cache.get(key)
+                    if data != None:
+                        results[idx] = (data, None)
+                        continue
+                missing.append((idx, key, len(p7m_data)))
+                datas.append(p7m_data)
 
+            yield (chunk, results, missing, p7m_datas), datas
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for (chunk, results, missing, p7m_datas), timed_results in _iter_pooled(executor, _p7m_chunk_to_xml, read_chunks(), workers, backend):
+
+            for (idx, key, nbytes), (result, seconds) in zip(missing, timed_results):
+                results[idx] = result
+                if metrics != None:
+                    metrics.record("p7m_to_xml", chunk[idx], seconds, nbytes)
+                if cache != None and result[0] != None:
+                    cache.put(key, result[0])
+
+            for idx, filename in enumerate(chunk):
+
+                data, error = results.pop(idx)
+
+                if error != None:
+                    handle(error, filename)
+
+                elif data != None:
+                    outstream[_strip_p7m_suffix(filename)] = BytesIO(data)
+                    if trust_store != None:
+                        with measure(metrics, "verify", filename, len(p7m_datas[idx])):
+                            status = verify_p7m(p7m_datas[idx], trust_store)
+                        report(status, filename)
+
+    return outstream
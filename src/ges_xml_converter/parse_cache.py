@@ -0,0 +1,140 @@
+import os
+from hashlib import sha256
+from tempfile import NamedTemporaryFile
+from typing import List, Optional, Tuple
+
+
+class ParseCache():
+    '''
+    On-disk cache of the parsing results, keyed by a content hash of the raw input bytes. Each entry is stored as
+    a separate file in a two-level folder structure. The cache size is limited: when 'max_size' is exceeded the least
+    recently used entries (according to their modification time, refreshed on each hit) are removed. Entries are
+    written atomically so that the same folder can be shared by more than one process.
+
+        Conctructor parameters
+        ----------------------
+            directory (str): Path to the folder containing the cache, created if missing
+            max_size (int): Maximum size of the cache in bytes (default: 1 GiB)
+    '''
+
+    def __init__(self, directory: str, max_size: int = 2**30) -> None:
+
+        if type(max_size) != int or max_size < 1:
+            raise ValueError
+
+        self.directory = os.path.abspath(directory)
+        self.max_size = max_size
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._size = sum([size for _, _, size in self._list_entries()])
+
+
+    @staticmethod
+    def make_key(data: bytes, *params: str) -> str:
+        '''
+        Computes the cache key of a raw input and of the parameters used to process it.
+
+            Parameters:
+            -----------
+                data (bytes): Raw bytes of the input file
+                params (str): Strings identifying the kind of result and the parameters used to obtain it
+
+            Returns:
+            --------
+                key (str): The hexadecimal key of the entry
+        '''
+        digest = sha256(data)
+        for param in params:
+            digest.update(b"\0" + param.encode('utf-8'))
+        return digest.hexdigest()
+
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+
+    def _list_entries(self) -> List[Tuple[float, str, int]]:
+        entries = []
+        for folder in os.scandir(self.directory):
+            if folder.is_dir() == False:
+                continue
+            for entry in os.scandir(folder.path):
+                if entry.is_file() and entry.name.startswith(".") == False:
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+
+    def get(self, key: str) -> Optional[bytes]:
+        '''
+        Returns the payload stored with a given key, or None if the key is not cached.
+
+            Parameters:
+            -----------
+                key (str): The key of the entry (see 'make_key')
+
+            Returns:
+            --------
+                payload (Optional[bytes]): The cached payload
+        '''
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                payload = file.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return payload
+
+
+    def put(self, key: str, payload: bytes) -> None:
+        '''
+        Stores a payload with a given key, evicting the least recently used entries if the maximum size is exceeded.
+
+            Parameters:
+            -----------
+                key (str): The key of the entry (see 'make_key')
+                payload (bytes): The payload to store
+        '''
+        if len(payload) > self.max_size:
+            return
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        if os.path.isfile(path):
+            self._size -= os.path.getsize(path)
+
+        with NamedTemporaryFile(dir=os.path.dirname(path), prefix=".", delete=False) as file:
+            file.write(payload)
+        os.replace(file.name, path)
+
+        self._size += len(payload)
+        if self._size > self.max_size:
+            self.evict()
+
+
+    def evict(self) -> None:
+        '''
+        Removes the least recently used entries until the cache size is below 90% of the maximum size.
+        '''
+        entries = sorted(self._list_entries())
+        self._size = sum([size for _, _, size in entries])
+
+        for _, path, size in entries:
+            if self._size <= 0.9*self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._size -= size
+
+
+    def clear(self) -> None:
+        '''
+        Removes all the entries of the cache.
+        '''
+        for _, path, _ in self._list_entries():
+            os.remove(path)
+        self._size = 0
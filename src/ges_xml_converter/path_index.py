@@ -0,0 +1,266 @@
+from fnmatch import fnmatchcase
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+# A branch of the .xml tree given as the tuple of its tags
+Path = Tuple[str, ...]
+
+# Characters identifying a glob pattern in a path element
+WILDCARDS = ("*", "?", "[")
+
+
+def escape_tag(tag: str) -> str:
+    '''
+    Escapes the glob special characters of a tag so that it is matched literally by a PathIndex.
+
+        Parameters:
+        -----------
+            tag (str): The tag to escape
+
+        Returns:
+        --------
+            pattern (str): The escaped tag
+    '''
+    return "".join(["[{}]".format(char) if char in WILDCARDS else char for char in tag])
+
+
+class _Node():
+    '''
+    Node of the PathIndex trie: exact tags are stored in a dictionary, glob patterns in a list.
+    '''
+    __slots__ = ("children", "patterns", "terminal", "value")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, _Node] = {}
+        self.patterns: List[Tuple[str, _Node]] = []
+        self.terminal = False
+        self.value: Any = None
+
+
+class PathIndex():
+    '''
+    Trie of .xml tree branches mapping each branch to a value. Each element of a branch can be an exact tag or a
+    glob pattern (e.g. '*', 'Dati*') matching a single tag. The trie can be walked one tag at a time, so that it can
+    be checked while traversing the .xml tree, or queried with complete branches.
+
+        Conctructor parameters
+        ----------------------
+            paths (Union[Mapping[Path, Any], Iterable[Path]]): The branches to index, given as a dictionary mapping
+                each branch to its value or as an iterable of branches associated to a True value (default: ())
+    '''
+
+    def __init__(self, paths: Union[Mapping[Path, Any], Iterable[Path]] = ()) -> None:
+        self.root = _Node()
+        self.size = 0
+
+        if isinstance(paths, Mapping):
+            for path, value in paths.items():
+                self.add(path, value)
+        else:
+            for path in paths:
+                self.add(path)
+
+
+    def add(self, path: Path, value: Any = True) -> None:
+        '''
+        Adds a branch to the index, replacing the value of an already indexed branch.
+
+            Parameters:
+            -----------
+                path (Path): The tags (or glob patterns) of the branch
+                value (Any): The value associated to the branch (default: True)
+        '''
+        node = self.root
+
+        for tag in path:
+            if any([char in tag for char in WILDCARDS]):
+                for pattern, child in node.patterns:
+                    if pattern == tag:
+                        break
+                else:
+                    child = _Node()
+                    node.patterns.append((tag, child))
+            else:
+                child = node.children.setdefault(tag, _Node())
+            node = child
+
+        if node.terminal == False:
+            self.size += 1
+        node.terminal, node.value = True, value
+
+
+    def step(self, nodes: Tuple[_Node, ...], tag: str) -> Tuple[_Node, ...]:
+        '''
+        Advances a set of trie nodes by one tag, returning all the nodes reached by an exact tag or by a pattern.
+
+            Parameters:
+            -----------
+                nodes (Tuple[_Node, ...]): The current nodes, '(index.root,)' at the beginning of a branch
+                tag (str): The next tag of the branch
+
+            Returns:
+            --------
+                nodes (Tuple[_Node, ...]): The reached nodes, empty if no indexed branch continues with the tag
+        '''
+        reached = []
+        for node in nodes:
+            child = node.children.get(tag)
+            if child != None:
+                reached.append(child)
+            for pattern, child in node.patterns:
+                if fnmatchcase(tag, pattern):
+                    reached.append(child)
+        return tuple(reached)
+
+
+    def get(self, path: Path, default: Any = None) -> Any:
+        '''
+        Returns the value associated to a complete branch, preferring exact tags over patterns.
+
+            Parameters:
+            -----------
+                path (Path): The tags of the branch
+                default (Any): The value returned if the branch is not indexed (default: None)
+
+            Returns:
+            --------
+                value (Any): The value associated to the branch
+        '''
+        nodes: Tuple[_Node, ...] = (self.root,)
+        for tag in path:
+            nodes = self.step(nodes, tag)
+            if nodes == ():
+                return default
+
+        for node in nodes:
+            if node.terminal:
+                return node.value
+        return default
+
+
+    def __contains__(self, path: object) -> bool:
+        sentinel = object()
+        return type(path) == tuple and self.get(path, sentinel) is not sentinel
+
+
+    def __len__(self) -> int:
+        return self.size
+
+
+# State of a PathFilter while walking a branch: the include nodes (None once an include prefix has been matched)
+# and the exclude nodes
+FilterState = Tuple[Optional[Tuple[_Node, ...]], Tuple[_Node, ...]]
+
+
+class PathFilter():
+    '''
+    Compiled filter of the .xml tree branches. A branch is accepted if it starts with one of the include prefixes
+    (all branches if no include prefix is given) and does not start with any of the exclude prefixes. The prefixes
+    can contain glob patterns matching a single tag. The filter can be checked while traversing the tree so that
+    the rejected subtrees are never descended.
+
+        Conctructor parameters
+        ----------------------
+            include (Optional[Iterable[Path]]): The accepted prefixes, all the branches if None (default: None)
+            exclude (Optional[Iterable[Path]]): The rejected prefixes (default: None)
+    '''
+
+    def __init__(self, include: Optional[Iterable[Path]] = None, exclude: Optional[Iterable[Path]] = None) -> None:
+        self.include = None if include == None else sorted(set([tuple(path) for path in include]))
+        self.exclude = [] if exclude == None else sorted(set([tuple(path) for path in exclude]))
+        self._include_index = None if self.include == None else PathIndex(self.include)
+        self._exclude_index = PathIndex(self.exclude)
+
+
+    @classmethod
+    def from_starting_with(cls, starting_with: str, separator: str = "#@#") -> "PathFilter":
+        '''
+        Builds the filter equivalent to a starting condition on the branch strings, in which the tags are joined by
+        the separator: the complete tags of the condition must match exactly and the last one is a tag prefix
+        (e.g. 'FatturaElettronicaBody#@#Dati' accepts the 'DatiGenerali' and 'DatiPagamento' subtrees).
+
+            Parameters:
+            -----------
+                starting_with (str): The beginning of the accepted branch strings
+                separator (str): The separator of the tags in the condition (default: '#@#')
+
+            Returns:
+            --------
+                path_filter (PathFilter): The filter accepting the branches starting with 'starting_with'
+        '''
+        tags = starting_with.split(separator)
+        return cls(include=[tuple([escape_tag(tag) for tag in tags[:-1]]) + (escape_tag(tags[-1]) + "*",)])
+
+
+    def signature(self) -> str:
+        '''
+        Returns a string identifying the filter, used to build cache keys.
+        '''
+        return repr((self.include, self.exclude))
+
+
+    def start(self) -> FilterState:
+        '''
+        Returns the state of the filter at the root of the tree.
+        '''
+        include = None if self._include_index == None else (self._include_index.root,)
+        return include, (self._exclude_index.root,)
+
+
+    def step(self, state: FilterState, tag: str) -> Optional[FilterState]:
+        '''
+        Advances the filter state by one tag.
+
+            Parameters:
+            -----------
+                state (FilterState): The state of the parent node
+                tag (str): The tag of the child node
+
+            Returns:
+            --------
+                state (Optional[FilterState]): The state of the child node, None if the whole subtree is rejected
+        '''
+        include, exclude = state
+
+        exclude = self._exclude_index.step(exclude, tag)
+        for node in exclude:
+            if node.terminal:
+                return None
+
+        if include != None and self._include_index != None:
+            include = self._include_index.step(include, tag)
+            if include == ():
+                return None
+            for node in include:
+                if node.terminal:
+                    include = None
+                    break
+
+        return include, exclude
+
+
+    @staticmethod
+    def is_accepted(state: Optional[FilterState]) -> bool:
+        '''
+        Checks if a node with the given state is accepted, i.e. it is inside an included and not excluded subtree.
+        '''
+        return state != None and state[0] == None
+
+
+    def accepts(self, path: Path) -> bool:
+        '''
+        Checks if a complete branch is accepted by the filter.
+
+            Parameters:
+            -----------
+                path (Path): The tags of the branch
+
+            Returns:
+            --------
+                accepted (bool): True if the branch is accepted
+        '''
+        state: Optional[FilterState] = self.start()
+        for tag in path:
+            if state == None:
+                return False
+            state = self.step(state, tag)
+        return self.is_accepted(state)
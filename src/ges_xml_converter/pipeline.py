@@ -0,0 +1,300 @@
+import asyncio
+from io import BytesIO
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, List, Mapping, Optional, Tuple, Union
+from pandas import DataFrame
+from ges_xml_converter.instrumentation import Metrics, measure, timed_call
+from ges_xml_converter.p7m_converter import P7MBackend, default_exception_handler, get_p7m_backend, _p7m_bytes_to_xml
+from ges_xml_converter.path_index import PathFilter
+from ges_xml_converter.xml_parser import Leaf, build_path_filter, load_leaves, _build_dataframe, _build_header, _count_collisions, _entry_name
+
+# Outcome of a stage for a single file: the result or the occurred exception
+Outcome = Tuple[Optional[Any], Optional[Exception]]
+
+# Item of the queues between the stages: the filename and the pending outcome, None at the end of the files
+Item = Optional[Tuple[str, Awaitable[Outcome]]]
+
+
+def _read_file(instream: Mapping[str, BytesIO], filename: str, metrics: Optional[Metrics] = None) -> Outcome:
+    '''
+    Reads a whole stream of the mapping (for lazy mappings the file is read from disk).
+    '''
+    try:
+        with measure(metrics, "read", filename) as record:
+            stream = instream[filename]
+            stream.seek(0)
+            data = stream.read()
+            record.nbytes = len(data)
+        return data, None
+    except Exception as exception:
+        return None, exception
+
+
+def _parse_bytes(xml_data: bytes, concat_symbol: str, path_filter: Optional[PathFilter]) -> Outcome:
+    '''
+    Worker function of the parsing stage: returns the leaves of an .xml file or the occurred exception so that the
+    exception can be handled in the caller process.
+    '''
+    try:
+        return load_leaves(BytesIO(xml_data), concat_symbol, path_filter), None
+    except Exception as exception:
+        return None, exception
+
+
+async def _recorded(metrics: Metrics, stage: str, filename: str, nbytes: int, pending: Awaitable[Tuple[Outcome, float]]) -> Outcome:
+    '''
+    Waits the outcome of a stage run by 'timed_call' on the executor and records its wall time.
+    '''
+    outcome, seconds = await pending
+    metrics.record(stage, filename, seconds, nbytes)
+    return outcome
+
+
+def _resolved(loop: asyncio.AbstractEventLoop, outcome: Outcome) -> "asyncio.Future[Outcome]":
+    future: "asyncio.Future[Outcome]" = loop.create_future()
+    future.set_result(outcome)
+    return future
+
+
+async def _read_stage(
+    loop: asyncio.AbstractEventLoop,
+    instream: Mapping[str, BytesIO],
+    outqueue: "asyncio.Queue[Item]",
+    reader: Executor,
+    metrics: Optional[Metrics] = None,
+) -> None:
+    '''
+    Schedules the reading of the files, in order, on the reader thread. The files are read one at a time since
+    lazy mappings are not required to support concurrent reads (e.g. members of the same archive).
+    '''
+    try:
+        for filename in instream:
+            await outqueue.put((filename, loop.run_in_executor(reader, _read_file, instream, filename, metrics)))
+    except Exception:
+        await outqueue.put(None)
+        raise
+    await outqueue.put(None)
+
+
+async def _map_stage(
+    inqueue: "asyncio.Queue[Item]",
+    outqueue: "asyncio.Queue[Item]",
+    submit: Callable[[str, Any], Awaitable[Outcome]],
+) -> None:
+    '''
+    Waits, in order, the outcome of the previous stage for each file and schedules the next processing step. The
+    exceptions are forwarded to the following stages without processing. The queues are bounded so that the stage
+    stops when the following ones are slower. If the stage fails the following ones are terminated, the exception
+    is raised when the stage task is awaited.
+    '''
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            item = await inqueue.get()
+            if item == None:
+                break
+            filename, pending = item
+            result, error = await pending
+            if error != None:
+                await outqueue.put((filename, _resolved(loop, (None, error))))
+            else:
+                await outqueue.put((filename, submit(filename, result)))
+    except Exception:
+        await outqueue.put(None)
+        raise
+    await outqueue.put(None)
+
+
+async def aiter_pandas_datasets(
+    instream: Mapping[str, BytesIO],
+    batch_size: int = 1000,
+    offset: int = 0,
+    schema: Optional[Iterable[Tuple[str, ...]]] = None,
+    concat_symbol: str = "|",
+    filler: Optional[str] = None,
+    starting_with: str = "",
+    select: Optional[Iterable[Tuple[str, ...]]] = None,
+    path_filter: Optional[PathFilter] = None,
+    workers: int = 1,
+    queue_size: int = 16,
+    backend: Union[str, P7MBackend] = "asn1",
+    verbose: bool = False,
+    exception_handler: Callable[[Exception, str], None] = default_exception_handler,
+    executor: Optional[Executor] = None,
+    metrics: Optional[Metrics] = None,
+) -> AsyncIterator[DataFrame]:
+    '''
+    Asynchronous pipeline converting a mapping of .xml and .xml.p7m streams (e.g. the lazy mapping of a folder,
+    see 'bytesIO_utils.path_to_lazy_BytesIO') into pandas.DataFrame batches. The files flow, in order, through
+    four stages connected by bounded queues: file reading (on a dedicated thread), .p7m
+    unwrapping and .xml parsing (on the executor) and row assembly (in the event loop). Reading and processing of
+    different files overlap, while the files in flight are limited by the size of the queues: if the consumer of
+    the batches is slow the stages stop when their queues are full. Files that cannot be read, unwrapped or parsed
+    are delivered to the exception handler and skipped.
+
+        Parameters:
+        -----------
+            instream (Mapping[str, BytesIO]): Dictionary (or lazy mapping) of BytesIO stream, ordered by filename,
+                containing the .xml and .xml.p7m files (recognized by the '.p7m' suffix)
+            batch_size (int): number of files in each batch (default: 1000)
+            offset (int): number of tree layer to remove from the header creation (default: 0)
+            schema (Optional[Iterable[Tuple[str, ...]]]): The branches associated to the columns, in order (see
+                'XML_converter.iter_pandas_datasets'). If None the columns of each batch are built from its own
+                branches and may differ between batches (default: None)
+            concat_symbol (str): Symbol used to concatenate the values of equivalent branches (default: '|')
+            filler (Optional[str]): Element used to fill the gap between node fields in the header, the tree is
+                not inflated if None (default: None)
+            starting_with, select, path_filter: The branch selection options, see 'XML_converter.load'
+            workers (int): number of worker processes of the unwrapping and parsing stages, if 1 a single thread
+                is used (default: 1)
+            queue_size (int): maximum number of files waiting between two stages (default: 16)
+            backend (Union[str, P7MBackend]): the unwrapping backend, see 'p7m_converter.get_p7m_backend'
+                (default: 'asn1')
+            verbose (bool): If set to True the default exception handler reports the failures on terminal
+            exception_handler (Callable[[Exception, str], None]): function taking as arguments the exception
+                occurred and the filename
+            executor (Optional[Executor]): executor of the unwrapping and parsing stages, overrides 'workers'
+                (default: None)
+            metrics (Optional[Metrics]): Collector of the time spent on each file by the stages ('read',
+                'p7m_to_xml' and 'parse') and on each batch by the row assembly ('build_dataframe'), disabled if
+                None. The stages of different files overlap, so their times do not add up to the total time. The
+                reading is measured by the pipeline, a lazy mapping should not record it too (default: None)
+
+        Yields:
+        -------
+            dataframe (pandas.DataFrame): pandas dataframe containing a batch of files, indexed by entry name
+    '''
+
+    if type(batch_size) != int or batch_size < 1:
+        raise ValueError
+
+    if type(workers) != int or workers < 1:
+        raise ValueError
+
+    if type(queue_size) != int or queue_size < 1:
+        raise ValueError
+
+    get_p7m_backend(backend)
+    path_filter = build_path_filter(starting_with, select, path_filter)
+
+    positions, header = None, None
+    if schema != None:
+        positions, header = _build_header(dict.fromkeys([tuple(path) for path in schema]), offset, filler)
+
+    def handle(exception: Exception, filename: str) -> None:
+        if exception_handler == default_exception_handler:
+            if verbose == True:
+                exception_handler(exception, filename)
+        else:
+            exception_handler(exception, filename)
+
+    def build(rows: List[List[Leaf]], names: List[str]) -> DataFrame:
+        if positions == None or header == None:
+            paths = dict.fromkeys([path for leaves in rows for path, _ in leaves])
+            return _build_dataframe(rows, names, *_build_header(paths, offset, filler, _count_collisions(rows, offset, filler)))
+        return _build_dataframe(rows, names, positions, header)
+
+    own_executor = executor == None
+    if executor == None:
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else ThreadPoolExecutor(max_workers=1)
+    pool: Executor = executor
+    reader = ThreadPoolExecutor(max_workers=1)
+
+    loop = asyncio.get_running_loop()
+
+    def submit(stage: str, filename: str, data: bytes, function: Callable[..., Outcome], *args: Any) -> Awaitable[Outcome]:
+        if metrics == None:
+            return loop.run_in_executor(pool, function, data, *args)
+        pending = loop.run_in_executor(pool, timed_call, function, data, *args)
+        return asyncio.ensure_future(_recorded(metrics, stage, filename, len(data), pending))
+
+    def unwrap(filename: str, data: bytes) -> Awaitable[Outcome]:
+        if filename.endswith(".p7m"):
+            return submit("p7m_to_xml", filename, data, _p7m_bytes_to_xml, backend)
+        return _resolved(loop, (data, None))
+
+    def parse(filename: str, data: bytes) -> Awaitable[Outcome]:
+        return submit("parse", filename, data, _parse_bytes, concat_symbol, path_filter)
+
+    read_queue: "asyncio.Queue[Item]" = asyncio.Queue(maxsize=queue_size)
+    unwrap_queue: "asyncio.Queue[Item]" = asyncio.Queue(maxsize=queue_size)
+    parse_queue: "asyncio.Queue[Item]" = asyncio.Queue(maxsize=queue_size)
+
+    tasks = [
+        asyncio.ensure_future(_read_stage(loop, instream, read_queue, reader, metrics)),
+        asyncio.ensure_future(_map_stage(read_queue, unwrap_queue, unwrap)),
+        asyncio.ensure_future(_map_stage(unwrap_queue, parse_queue, parse)),
+    ]
+
+    try:
+        rows: List[List[Leaf]] = []
+        names: List[str] = []
+
+        while True:
+            item = await parse_queue.get()
+            if item == None:
+                break
+            filename, pending = item
+            leaves, error = await pending
+
+            if error != None:
+                handle(error, filename)
+
+            elif leaves != None:
+                rows.append(leaves)
+                names.append(_entry_name(filename))
+                if len(rows) == batch_size:
+                    with measure(metrics, "build_dataframe"):
+                        batch = build(rows, names)
+                    yield batch
+                    rows, names = [], []
+
+        if rows != []:
+            with measure(metrics, "build_dataframe"):
+                batch = build(rows, names)
+            yield batch
+
+        # Errors of the stages themselves (e.g. a broken executor)
+        for task in tasks:
+            await task
+
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        reader.shutdown()
+        if own_executor == True:
+            pool.shutdown()
+
+
+def run_pipeline(instream: Mapping[str, BytesIO], sink: Callable[[DataFrame], Any], **kwargs: Any) -> int:
+    '''
+    Runs the asynchronous pipeline (see 'aiter_pandas_datasets') in a new event loop, passing each batch to a sink,
+    e.g. a writer appending the batches to a file. Synchronous sinks are called on the default thread pool so
+    that the pipeline keeps processing the next files meanwhile, coroutine functions are awaited. The batches are
+    passed to the sink one at a time, in order.
+
+        Parameters:
+        -----------
+            instream (Mapping[str, BytesIO]): Dictionary (or lazy mapping) of BytesIO stream of the .xml and .xml.p7m
+                files
+            sink (Callable[[DataFrame], Any]): function or coroutine function called on each batch
+            **kwargs: Additional arguments of 'aiter_pandas_datasets'
+
+        Returns:
+        --------
+            nrows (int): The number of processed rows
+    '''
+
+    async def main() -> int:
+        loop = asyncio.get_running_loop()
+        nrows = 0
+        async for batch in aiter_pandas_datasets(instream, **kwargs):
+            if asyncio.iscoroutinefunction(sink):
+                await sink(batch)
+            else:
+                await loop.run_in_executor(None, sink, batch)
+            nrows += len(batch)
+        return nrows
+
+    return asyncio.run(main())
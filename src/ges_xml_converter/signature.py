@@ -0,0 +1,597 @@
+from datetime import datetime, timezone
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple, Union
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature, UnsupportedAlgorithm
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, padding, rsa
+from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
+from cryptography.hazmat.primitives.serialization import Encoding
+from cryptography.x509.oid import ExtendedKeyUsageOID, ExtensionOID
+from ges_xml_converter.asn1_reader import (
+    CONTEXT_0, SEQUENCE, decode_oid, extract_signed_content, get_content, get_element, iter_children, iter_signed_content,
+    read_header, split_signed_data,
+)
+from ges_xml_converter.bytesIO_utils import path_to_BytesIO
+
+# Statuses of the verification of a signed file
+SIGNATURE_STATUSES = ("valid", "invalid", "untrusted", "expired", "error")
+
+# Supported digest algorithms, by object identifier
+DIGEST_ALGORITHMS: Dict[str, Callable[[], hashes.HashAlgorithm]] = {
+    "1.3.14.3.2.26": hashes.SHA1,
+    "2.16.840.1.101.3.4.2.1": hashes.SHA256,
+    "2.16.840.1.101.3.4.2.2": hashes.SHA384,
+    "2.16.840.1.101.3.4.2.3": hashes.SHA512,
+}
+
+# Object identifiers of the RSASSA-PSS signature algorithm, of the used signed attributes and of the RFC 3161
+# timestamp token unsigned attribute
+RSASSA_PSS_OID = "1.2.840.113549.1.1.10"
+MESSAGE_DIGEST_OID = "1.2.840.113549.1.9.4"
+SIGNING_TIME_OID = "1.2.840.113549.1.9.5"
+TIMESTAMP_TOKEN_OID = "1.2.840.113549.1.9.16.2.14"
+
+# Maximum number of intermediate certificates between a signer certificate and a trust anchor
+MAX_CHAIN_LENGTH = 8
+
+# Extended key usages accepted in the signer certificates, by purpose: the signers of the files (e-mail
+# protection, document signing and the Adobe and Microsoft document signing usages) and the timestamping
+# authorities. Certificates without the extension are valid only for signing.
+KEY_PURPOSES: Dict[str, FrozenSet[str]] = {
+    "signing": frozenset([
+        "2.5.29.37.0", ExtendedKeyUsageOID.EMAIL_PROTECTION.dotted_string, "1.3.6.1.5.5.7.3.36",
+        "1.2.840.113583.1.1.5", "1.3.6.1.4.1.311.10.3.12",
+    ]),
+    "timestamping": frozenset([ExtendedKeyUsageOID.TIME_STAMPING.dotted_string]),
+}
+
+# Extensions processed by the chain building, any other critical extension makes a certificate invalid
+KNOWN_EXTENSIONS = frozenset([
+    ExtensionOID.BASIC_CONSTRAINTS, ExtensionOID.KEY_USAGE, ExtensionOID.EXTENDED_KEY_USAGE,
+    ExtensionOID.SUBJECT_KEY_IDENTIFIER, ExtensionOID.AUTHORITY_KEY_IDENTIFIER, ExtensionOID.SUBJECT_ALTERNATIVE_NAME,
+    ExtensionOID.ISSUER_ALTERNATIVE_NAME,
+])
+
+# Parsed certificate: (certificate, DER encoding, issuer DER encoding, serial number, subject key identifier)
+CertificateEntry = Tuple[x509.Certificate, bytes, bytes, int, Optional[bytes]]
+
+
+class SignatureError(Exception):
+    '''
+    Exception raised when a signed file cannot be verified.
+
+        Attributes:
+        -----------
+            status (str): The verification status, one of SIGNATURE_STATUSES
+            message (str): Description of the failure
+    '''
+    def __init__(self, status: str, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class SignatureStatus():
+    '''
+    Result of the verification of a signed file.
+
+        Attributes:
+        -----------
+            status (str): One of SIGNATURE_STATUSES: 'valid', 'invalid' (the content or the signed attributes do not
+                match the signature), 'untrusted' (the signer certificate is not issued by the trust store),
+                'expired' (the certificate chain is not valid at the verification time, or at the time certified
+                by a trusted timestamp) or 'error' (malformed file or unsupported algorithm)
+            signer (Optional[str]): The subject of the signer certificate, if found
+            signing_time (Optional[datetime]): The signing time declared in the signed attributes, if any. It is
+                declared by the signer and it is not used by the verification
+            message (str): Description of the failure, empty if the signature is valid
+            timestamp (Optional[datetime]): The time certified by a trusted RFC 3161 timestamp token of the
+                signature, if any
+    '''
+    def __init__(
+        self, status: str, signer: Optional[str] = None, signing_time: Optional[datetime] = None, message: str = "",
+        timestamp: Optional[datetime] = None,
+    ) -> None:
+        if status not in SIGNATURE_STATUSES:
+            raise ValueError
+        self.status = status
+        self.signer = signer
+        self.signing_time = signing_time
+        self.message = message
+        self.timestamp = timestamp
+
+    @property
+    def valid(self) -> bool:
+        '''True if the signature is valid'''
+        return self.status == "valid"
+
+    def __repr__(self) -> str:
+        return "SignatureStatus(status={!r}, signer={!r}, signing_time={!r}, message={!r}, timestamp={!r})".format(
+            self.status, self.signer, self.signing_time, self.message, self.timestamp
+        )
+
+
+def _is_issued_by(certificate: x509.Certificate, issuer: x509.Certificate) -> bool:
+    try:
+        certificate.verify_directly_issued_by(issuer)
+    except (ValueError, TypeError, InvalidSignature, UnsupportedAlgorithm):
+        return False
+    return True
+
+
+def _has_unknown_critical_extensions(certificate: x509.Certificate) -> bool:
+    for extension in certificate.extensions:
+        if extension.critical == True and extension.oid not in KNOWN_EXTENSIONS:
+            return True
+    return False
+
+
+def _can_issue(certificate: x509.Certificate, depth: int, trusted: bool = False) -> bool:
+    '''
+    True if the certificate can sign certificates with 'depth' intermediate certificates below it: it must be a
+    CA allowed to sign certificates (keyCertSign) with a path length constraint not lower than 'depth'. The trust
+    anchors without the basic constraints (version 1 certificates) are accepted.
+    '''
+    try:
+        constraints = certificate.extensions.get_extension_for_class(x509.BasicConstraints).value
+    except x509.ExtensionNotFound:
+        return trusted
+    if constraints.ca == False or (constraints.path_length != None and constraints.path_length < depth):
+        return False
+    try:
+        return certificate.extensions.get_extension_for_class(x509.KeyUsage).value.key_cert_sign
+    except x509.ExtensionNotFound:
+        return True
+
+
+def _check_signer_certificate(certificate: x509.Certificate, purpose: str) -> None:
+    '''
+    Checks that a certificate can sign data for the given purpose (see KEY_PURPOSES): digitalSignature or
+    nonRepudiation key usage, a matching extended key usage and no unknown critical extension. Raises
+    SignatureError with status 'untrusted' if not.
+    '''
+    subject = certificate.subject.rfc4514_string()
+
+    if _has_unknown_critical_extensions(certificate) == True:
+        raise SignatureError("untrusted", "certificate '{}' has an unsupported critical extension".format(subject))
+
+    try:
+        usage = certificate.extensions.get_extension_for_class(x509.KeyUsage).value
+        if usage.digital_signature == False and usage.content_commitment == False:
+            raise SignatureError("untrusted", "certificate '{}' not valid for digital signatures".format(subject))
+    except x509.ExtensionNotFound:
+        pass
+
+    try:
+        usages: Optional[List[str]] = [
+            oid.dotted_string for oid in certificate.extensions.get_extension_for_class(x509.ExtendedKeyUsage).value
+        ]
+    except x509.ExtensionNotFound:
+        usages = None
+
+    if (usages == None and purpose != "signing") or (usages != None and KEY_PURPOSES[purpose].isdisjoint(usages)):
+        raise SignatureError("untrusted", "certificate '{}' not valid for {}".format(subject, purpose))
+
+
+class TrustStore():
+    '''
+    Trust anchors used to verify the signed files, loaded once and shared by all the verifications. The parsed
+    certificates and the outcome of the chain building of each signer certificate are cached, so that a batch of
+    files from a few signers builds each certificate chain only once.
+
+        Attributes:
+        -----------
+            anchors (List[x509.Certificate]): The trusted certificates
+            hits (int): Number of signer certificates found in the cache
+            misses (int): Number of signer certificates whose chain has been built
+    '''
+
+    def __init__(self, certificates: Iterable[x509.Certificate], max_cached: int = 4096) -> None:
+        self.anchors = list(certificates)
+        self.hits, self.misses = 0, 0
+        self._max_cached = max_cached
+
+        self._anchors_by_subject: Dict[bytes, List[x509.Certificate]] = {}
+        self._anchor_ders: Set[bytes] = set()
+        for anchor in self.anchors:
+            self._anchors_by_subject.setdefault(anchor.subject.public_bytes(), []).append(anchor)
+            self._anchor_ders.add(anchor.public_bytes(Encoding.DER))
+
+        self._certificates: Dict[bytes, CertificateEntry] = {}
+        self._chains: Dict[Tuple[str, bytes], Tuple[datetime, datetime]] = {}
+        self._rejected: Dict[Tuple[bytes, ...], str] = {}
+
+    @classmethod
+    def from_path(cls, source: str, extension: Union[Tuple[str, ...], str] = (".pem", ".crt", ".cer", ".der")) -> "TrustStore":
+        '''
+        Loads the trust anchors from a certificate file or from the certificate files of a folder. The files can
+        be DER encoded or contain one or more PEM encoded certificates.
+
+            Parameters:
+            -----------
+                source (str): The path of the file or of the folder
+                extension (Union[Tuple[str, ...], str]): The extensions of the certificate files (default: ('.pem',
+                    '.crt', '.cer', '.der'))
+
+            Returns:
+            --------
+                trust_store (TrustStore): The trust store
+        '''
+
+        certificates: List[x509.Certificate] = []
+        for stream in path_to_BytesIO(source, extension).values():
+            data = stream.read()
+            if b"-----BEGIN CERTIFICATE-----" in data:
+                certificates += x509.load_pem_x509_certificates(data)
+            else:
+                certificates.append(x509.load_der_x509_certificate(data))
+        return cls(certificates)
+
+    def load_certificate(self, der_data: bytes) -> CertificateEntry:
+        '''
+        Parses a DER encoded certificate, parsed certificates are cached.
+
+            Parameters:
+            -----------
+                der_data (bytes): The DER encoded certificate
+
+            Returns:
+            --------
+                entry (CertificateEntry): The certificate with its DER encoding, the DER encoding of its issuer,
+                    its serial number and its subject key identifier (None if not present)
+        '''
+
+        entry = self._certificates.get(der_data)
+        if entry != None:
+            return entry
+
+        certificate = x509.load_der_x509_certificate(der_data)
+        try:
+            ski: Optional[bytes] = certificate.extensions.get_extension_for_class(x509.SubjectKeyIdentifier).value.digest
+        except x509.ExtensionNotFound:
+            ski = None
+
+        if len(self._certificates) >= self._max_cached:
+            self._certificates.clear()
+
+        entry = (certificate, der_data, certificate.issuer.public_bytes(), certificate.serial_number, ski)
+        self._certificates[der_data] = entry
+        return entry
+
+    def _build_chain(
+        self, certificate: x509.Certificate, pool: Dict[bytes, List[x509.Certificate]], depth: int
+    ) -> Optional[List[x509.Certificate]]:
+        '''
+        Builds the chain from a certificate to a trust anchor, using the intermediate certificates of the pool.
+        'depth' is the number of intermediate certificates already in the chain, below the issuer of the
+        certificate.
+        '''
+
+        issuer = certificate.issuer.public_bytes()
+        for anchor in self._anchors_by_subject.get(issuer, []):
+            if _can_issue(anchor, depth, trusted=True) and _is_issued_by(certificate, anchor):
+                return [certificate, anchor]
+
+        if depth < MAX_CHAIN_LENGTH:
+            for intermediate in pool.get(issuer, []):
+                if (
+                    intermediate != certificate and _can_issue(intermediate, depth)
+                    and _has_unknown_critical_extensions(intermediate) == False and _is_issued_by(certificate, intermediate)
+                ):
+                    chain = self._build_chain(intermediate, pool, depth + 1)
+                    if chain != None:
+                        return [certificate] + chain
+
+        return None
+
+    def verify_certificate(
+        self, entry: CertificateEntry, intermediates: Iterable[CertificateEntry] = (), purpose: str = "signing"
+    ) -> Tuple[datetime, datetime]:
+        '''
+        Verifies that a certificate can sign data for the given purpose and that it is issued by a trust anchor,
+        directly or through the intermediate certificates. The key usages, the basic and path length constraints
+        and the critical extensions of the chain are checked. The outcome is cached: trusted certificates are not
+        verified again, untrusted ones are not verified again with the same intermediate certificates.
+
+            Parameters:
+            -----------
+                entry (CertificateEntry): The certificate to verify (see 'load_certificate')
+                intermediates (Iterable[CertificateEntry]): The available intermediate certificates (default: ())
+                purpose (str): The usage of the certificate, one of KEY_PURPOSES (default: 'signing')
+
+            Returns:
+            --------
+                validity (Tuple[datetime, datetime]): The period in which all the certificates of the chain are valid
+        '''
+
+        if purpose not in KEY_PURPOSES:
+            raise ValueError
+
+        certificate, der_data = entry[0], entry[1]
+
+        validity = self._chains.get((purpose, der_data))
+        if validity != None:
+            self.hits += 1
+            return validity
+
+        intermediates = [x for x in intermediates if x[1] != der_data]
+        key = (purpose.encode(), der_data) + tuple(sorted([x[1] for x in intermediates]))
+        if key in self._rejected:
+            self.hits += 1
+            raise SignatureError("untrusted", self._rejected[key])
+
+        self.misses += 1
+
+        if len(self._chains) + len(self._rejected) >= self._max_cached:
+            self._chains.clear()
+            self._rejected.clear()
+
+        try:
+            _check_signer_certificate(certificate, purpose)
+        except SignatureError as error:
+            self._rejected[key] = error.message
+            raise
+
+        chain: Optional[List[x509.Certificate]] = None
+        if der_data in self._anchor_ders:
+            chain = [certificate]
+        else:
+            pool: Dict[bytes, List[x509.Certificate]] = {}
+            for intermediate in intermediates:
+                pool.setdefault(intermediate[0].subject.public_bytes(), []).append(intermediate[0])
+            chain = self._build_chain(certificate, pool, 0)
+
+        if chain == None:
+            message = "certificate '{}' not issued by a trusted authority".format(certificate.subject.rfc4514_string())
+            self._rejected[key] = message
+            raise SignatureError("untrusted", message)
+
+        validity = (max([x.not_valid_before_utc for x in chain]), min([x.not_valid_after_utc for x in chain]))
+        self._chains[(purpose, der_data)] = validity
+        return validity
+
+
+def _find_signer(signer_info: memoryview, sid: int, entries: List[CertificateEntry]) -> Optional[CertificateEntry]:
+    '''
+    Finds the signer certificate identified by issuer and serial number or by subject key identifier.
+    '''
+
+    if signer_info[sid] == SEQUENCE:
+        issuer, serial = list(iter_children(signer_info, sid))[:2]
+        issuer_der = bytes(get_element(signer_info, issuer))
+        serial_number = int.from_bytes(get_content(signer_info, serial), "big", signed=True)
+        for entry in entries:
+            if entry[3] == serial_number and entry[2] == issuer_der:
+                return entry
+
+    elif signer_info[sid] == 0x80:
+        ski = bytes(get_content(signer_info, sid))
+        for entry in entries:
+            if entry[4] == ski:
+                return entry
+
+    return None
+
+
+def _read_attributes(signer_info: memoryview, offset: int) -> Dict[str, int]:
+    '''
+    Returns the offset of the first value of each signed attribute, by object identifier.
+    '''
+    attributes = {}
+    for attribute in iter_children(signer_info, offset):
+        oid, values = list(iter_children(signer_info, attribute))[:2]
+        for value in iter_children(signer_info, values):
+            attributes[decode_oid(get_content(signer_info, oid))] = value
+            break
+    return attributes
+
+
+def _decode_time(data: memoryview, offset: int) -> datetime:
+    '''
+    Decodes an UTCTime or GeneralizedTime element.
+    '''
+    tag = read_header(data, offset)[0]
+    text = bytes(get_content(data, offset)).decode("ascii").rstrip("Z").split(".")[0]
+    if tag == 0x17:
+        return datetime.strptime(text, "%y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+    if tag == 0x18:
+        return datetime.strptime(text, "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+    raise ValueError
+
+
+def _verify_signature(
+    certificate: x509.Certificate, signature: bytes, message: bytes, algorithm: hashes.HashAlgorithm,
+    signature_oid: str, prehashed: bool,
+) -> None:
+    '''
+    Verifies a signature with the public key of a certificate, raises InvalidSignature if not valid.
+    '''
+
+    public_key = certificate.public_key()
+    hash_algorithm: Union[hashes.HashAlgorithm, Prehashed] = Prehashed(algorithm) if prehashed == True else algorithm
+
+    if isinstance(public_key, rsa.RSAPublicKey):
+        if signature_oid == RSASSA_PSS_OID:
+            public_key.verify(signature, message, padding.PSS(padding.MGF1(algorithm), padding.PSS.AUTO), hash_algorithm)
+        else:
+            public_key.verify(signature, message, padding.PKCS1v15(), hash_algorithm)
+
+    elif isinstance(public_key, ec.EllipticCurvePublicKey):
+        public_key.verify(signature, message, ec.ECDSA(hash_algorithm))
+
+    elif isinstance(public_key, ed25519.Ed25519PublicKey):
+        public_key.verify(signature, message)
+
+    else:
+        raise SignatureError("error", "unsupported public key")
+
+
+def _verify_timestamp(
+    token: bytes, signature: bytes, trust_store: TrustStore, verification_time: datetime
+) -> Optional[datetime]:
+    '''
+    Verifies the RFC 3161 timestamp token of a signature and returns the certified time (genTime), None if the
+    token is not trusted: the token must be signed by a timestamping certificate issued by the trust store, valid
+    at the verification time, and its message imprint must be the digest of the signature.
+    '''
+    try:
+        if _verify_signed_data(token, trust_store, verification_time, "timestamping").valid == False:
+            return None
+
+        # TSTInfo: version, policy, messageImprint (hashAlgorithm, hashedMessage), serialNumber, genTime, ...
+        data = memoryview(extract_signed_content(token))
+        imprint, gen_time = list(iter_children(data, 0))[2:5:2]
+        algorithm, hashed = list(iter_children(data, imprint))[:2]
+        digest_oid = decode_oid(get_content(data, next(iter_children(data, algorithm))))
+        if digest_oid not in DIGEST_ALGORITHMS:
+            return None
+
+        digest = hashes.Hash(DIGEST_ALGORITHMS[digest_oid]())
+        digest.update(signature)
+        if get_content(data, hashed) != digest.finalize():
+            return None
+
+        time = _decode_time(data, gen_time)
+
+    except (ValueError, TypeError, StopIteration, UnsupportedAlgorithm):
+        return None
+
+    return time if time <= verification_time else None
+
+
+def _verify_signer_info(
+    der_data: bytes, signer_info: memoryview, entries: List[CertificateEntry], trust_store: TrustStore,
+    digests: Dict[str, bytes], verification_time: datetime, purpose: str,
+) -> SignatureStatus:
+    '''
+    Verifies a single SignerInfo: the digest of the content, the signature and the signer certificate. The
+    certificate chain must be valid at the verification time or, for the signed files, at the time certified by
+    a trusted timestamp token. The signing time declared by the signer is not trusted.
+    '''
+
+    # version, sid, digestAlgorithm, [signedAttrs], signatureAlgorithm, signature, [unsignedAttrs]
+    children = list(iter_children(signer_info, 0))
+    if len(children) < 5:
+        raise ValueError
+
+    signed_attrs: Optional[int] = None
+    if signer_info[children[3]] == CONTEXT_0:
+        signed_attrs = children[3]
+        children = children[:3] + children[4:]
+
+    unsigned_attrs: Optional[int] = None
+    if len(children) > 5 and signer_info[children[5]] == CONTEXT_0 + 1:
+        unsigned_attrs = children[5]
+
+    entry = _find_signer(signer_info, children[1], entries)
+    if entry == None:
+        return SignatureStatus("error", message="signer certificate not found")
+    signer = entry[0].subject.rfc4514_string()
+
+    digest_oid = decode_oid(get_content(signer_info, next(iter_children(signer_info, children[2]))))
+    signature_oid = decode_oid(get_content(signer_info, next(iter_children(signer_info, children[3]))))
+    signature = bytes(get_content(signer_info, children[4]))
+
+    if digest_oid not in DIGEST_ALGORITHMS:
+        return SignatureStatus("error", signer, message="unsupported digest algorithm {}".format(digest_oid))
+    algorithm = DIGEST_ALGORITHMS[digest_oid]()
+
+    if digest_oid not in digests:
+        digest = hashes.Hash(algorithm)
+        for chunk in iter_signed_content(der_data):
+            digest.update(chunk)
+        digests[digest_oid] = digest.finalize()
+
+    signing_time: Optional[datetime] = None
+    if signed_attrs != None:
+        attributes = _read_attributes(signer_info, signed_attrs)
+        if MESSAGE_DIGEST_OID not in attributes or get_content(signer_info, attributes[MESSAGE_DIGEST_OID]) != digests[digest_oid]:
+            return SignatureStatus("invalid", signer, message="content digest mismatch")
+        if SIGNING_TIME_OID in attributes:
+            signing_time = _decode_time(signer_info, attributes[SIGNING_TIME_OID])
+
+        # The signature is computed on the DER encoding of the attributes as a SET
+        message, prehashed = b"\x31" + bytes(get_element(signer_info, signed_attrs)[1:]), False
+    elif isinstance(entry[0].public_key(), ed25519.Ed25519PublicKey):
+        message, prehashed = b"".join(iter_signed_content(der_data)), False
+    else:
+        message, prehashed = digests[digest_oid], True
+
+    try:
+        _verify_signature(entry[0], signature, message, algorithm, signature_oid, prehashed)
+    except InvalidSignature:
+        return SignatureStatus("invalid", signer, signing_time, "signature mismatch")
+    except SignatureError as error:
+        return SignatureStatus(error.status, signer, signing_time, error.message)
+
+    try:
+        not_before, not_after = trust_store.verify_certificate(entry, entries, purpose)
+    except SignatureError as error:
+        return SignatureStatus(error.status, signer, signing_time, error.message)
+
+    timestamp: Optional[datetime] = None
+    if purpose == "signing" and unsigned_attrs != None:
+        attributes = _read_attributes(signer_info, unsigned_attrs)
+        if TIMESTAMP_TOKEN_OID in attributes:
+            token = bytes(get_element(signer_info, attributes[TIMESTAMP_TOKEN_OID]))
+            timestamp = _verify_timestamp(token, signature, trust_store, verification_time)
+
+    time = timestamp if timestamp != None else verification_time
+    if time < not_before or time > not_after:
+        return SignatureStatus("expired", signer, signing_time, "certificate chain not valid at {}".format(time.isoformat()), timestamp)
+
+    return SignatureStatus("valid", signer, signing_time, timestamp=timestamp)
+
+
+def verify_signed_data(der_data: bytes, trust_store: TrustStore, verification_time: Optional[datetime] = None) -> SignatureStatus:
+    '''
+    Verifies the signatures of a PKCS#7/CMS signed file: the digest of the signed content, the signature of each
+    signer and the chain of each signer certificate up to the trust store. The certificate chain must be valid at
+    the verification time or, if the signature carries an RFC 3161 timestamp token issued by a timestamping
+    authority of the trust store, at the certified time. The signing time declared by the signer is reported but
+    never used. The function does not raise on invalid files, the failure is reported in the returned status.
+
+        Parameters:
+        -----------
+            der_data (bytes): The DER/BER encoded signed file
+            trust_store (TrustStore): The trust anchors
+            verification_time (Optional[datetime]): The time at which the certificate chains are verified, the
+                current time if None (default: None)
+
+        Returns:
+        --------
+            status (SignatureStatus): The verification status, the first failure if more than one signer
+    '''
+
+    if verification_time == None:
+        verification_time = datetime.now(timezone.utc)
+    elif verification_time.tzinfo == None:
+        verification_time = verification_time.replace(tzinfo=timezone.utc)
+
+    return _verify_signed_data(der_data, trust_store, verification_time, "signing")
+
+
+def _verify_signed_data(der_data: bytes, trust_store: TrustStore, verification_time: datetime, purpose: str) -> SignatureStatus:
+    '''
+    Verifies the signatures of a signed file with signer certificates valid for the given purpose.
+    '''
+
+    try:
+        certificates, signer_infos = split_signed_data(der_data)
+        if signer_infos == []:
+            return SignatureStatus("error", message="no signer")
+
+        entries = [trust_store.load_certificate(bytes(certificate)) for certificate in certificates]
+        digests: Dict[str, bytes] = {}
+        statuses = [
+            _verify_signer_info(der_data, signer_info, entries, trust_store, digests, verification_time, purpose)
+            for signer_info in signer_infos
+        ]
+
+    except (ValueError, TypeError, StopIteration, UnsupportedAlgorithm) as exception:
+        return SignatureStatus("error", message=str(exception) if str(exception) != "" else "malformed signed file")
+
+    for status in statuses:
+        if status.valid == False:
+            return status
+    return statuses[0]
@@ -1,7 +1,15 @@
+import gzip, json, re
 from io import BytesIO
-from lxml import objectify
-from typing import List, Tuple, Dict, Union
-from pandas import DataFrame, concat
+from lxml import etree, objectify
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from math import nan
+from typing import Any, Callable, Counter as CounterType, Deque, Iterable, Iterator, List, Mapping, Optional, Set, Tuple, Dict, TypeVar
+from pandas import DataFrame, MultiIndex
+from ges_xml_converter.instrumentation import Metrics, measure, timed_call
+from ges_xml_converter.parse_cache import ParseCache
+from ges_xml_converter.path_index import FilterState, PathFilter
 
 
 class SeparatorError(Exception):
@@ -11,34 +19,681 @@ class SeparatorError(Exception):
         Attributes:
         -----------
         separator(str): Separator value
+        occurrences(Dict[str, List[int]]): Byte offsets of the separator in each offending file
     '''
 
-    def __init__(self, separator:str, *args: object) -> None:
+    def __init__(self, separator:str, *args: object, occurrences: Optional[Dict[str, List[int]]] = None) -> None:
         super().__init__(*args)
         self.separator = separator
+        self.occurrences = {} if occurrences == None else occurrences
     
     def __str__(self) -> str:
-        return """The string '{}' is not a valid field separator""".format(self.separator)
+        message = """The string '{}' is not a valid field separator""".format(self.separator)
+        for filename, offsets in self.occurrences.items():
+            message += "\n\t{}: byte offsets {}".format(filename, ", ".join([str(offset) for offset in offsets]))
+        return message
 
 
 
+# Encoding declared in the prolog of an .xml file
+XML_ENCODING = re.compile(rb"""^\s*<\?xml[^>]*?encoding\s*=\s*["']([A-Za-z0-9._-]+)["']""")
+
+
+def sniff_xml_encoding(head: bytes) -> Optional[str]:
+    '''
+    Returns the encoding of an .xml file from its first bytes: the byte order mark, if any, or the encoding declared
+    in the prolog.
+
+        Parameters:
+        -----------
+            head (bytes): The first bytes of the file (the prolog is searched at the beginning of the file)
+
+        Returns:
+        --------
+            encoding (Optional[str]): The encoding of the file, None if it is not declared (i.e. UTF-8)
+    '''
+    if head.startswith(b"\xff\xfe"):
+        return "utf-16-le"
+    if head.startswith(b"\xfe\xff"):
+        return "utf-16-be"
+    match = XML_ENCODING.match(head.lstrip(b"\xef\xbb\xbf"))
+    return None if match == None else match.group(1).decode('ascii')
+
+
+def find_separator(instream: Mapping[str, BytesIO], separator: str, chunk_size: int = 2**20) -> Dict[str, List[int]]:
+    '''
+    Searches the separator in the raw bytes of the .xml files, without decoding them. Each stream is read in chunks
+    of fixed size, keeping the tail of the previous chunk so that occurrences across two chunks are found. The
+    separator is encoded with the encoding of each file (see 'sniff_xml_encoding'). The streams are rewound after
+    the search.
+
+        Parameters:
+        -----------
+            instream (Mapping[str, BytesIO]): Dictionary (or lazy mapping) containing the BytesIO streams to check
+            separator (str): The separator to search
+            chunk_size (int): Number of bytes read at a time (default: 1 MiB)
+
+        Returns:
+        --------
+            occurrences (Dict[str, List[int]]): The byte offsets of the non overlapping occurrences of the separator
+                in each file containing it
+    '''
+
+    if separator == "" or chunk_size < 1:
+        raise ValueError
+
+    occurrences: Dict[str, List[int]] = {}
+
+    for filename, stream in instream.items():
+        stream.seek(0)
+        buffer = stream.read(max(chunk_size, 1024))
+
+        try:
+            needle = separator.encode(sniff_xml_encoding(buffer) or 'utf-8')
+        except (LookupError, UnicodeEncodeError):
+            needle = separator.encode('utf-8')
+
+        offsets: List[int] = []
+        base, start = 0, 0
+
+        while True:
+            idx = buffer.find(needle, start)
+            if idx != -1:
+                offsets.append(base + idx)
+                start = idx + len(needle)
+                continue
+
+            chunk = stream.read(chunk_size)
+            if chunk == b"":
+                break
+
+            # Keep the bytes that may be the beginning of an occurrence not yet found
+            keep = max(start, len(buffer) - len(needle) + 1)
+            base += keep
+            buffer, start = buffer[keep:] + chunk, 0
+
+        stream.seek(0)
+        if offsets != []:
+            occurrences[filename] = offsets
+
+    return occurrences
+
+
+# A leaf of the .xml tree: the tuple of tags leading to the node and the node value
+Leaf = Tuple[Tuple[str, ...], str]
+
+
+def iterparse_leaves(stream: BytesIO, path_filter: Optional[PathFilter] = None) -> Iterator[Leaf]:
+    '''
+    Iteratively linearizes the .xml tree of a stream into leaves, yielding each leaf as soon as the corresponding
+    element is closed. Processed elements are cleared and detached from the tree so that the memory usage does
+    not depend on the size of the file and no recursion is involved. The root tag is not included in the paths
+    and comments are ignored. If a path filter is given it is checked while descending the tree: the rejected
+    subtrees are skipped and their elements are cleared without reading their content.
+
+        Parameters:
+        -----------
+            stream (BytesIO): BytesIO stream of the .xml file to parse
+            path_filter (Optional[PathFilter]): Filter of the branches to extract, all if None (default: None)
+
+        Yields:
+        -------
+            leaf (Leaf): The (path, value) tuple of each XML entry in document order
+    '''
+
+    path: List[str] = []
+    has_children: List[bool] = []
+
+    # Filter states of the open elements, None inside the rejected subtrees
+    states: List[Optional[FilterState]] = []
+
+    for event, element in etree.iterparse(stream, events=("start", "end"), remove_comments=True, huge_tree=True):
+
+        if event == "start":
+            if has_children != []:
+                has_children[-1] = True
+            if path_filter != None:
+                if states == []:
+                    states.append(path_filter.start())
+                else:
+                    parent = states[-1]
+                    states.append(None if parent == None else path_filter.step(parent, element.tag))
+            path.append(element.tag)
+            has_children.append(False)
+            continue
+
+        if has_children.pop() == False and len(path) > 1:
+            if path_filter == None or PathFilter.is_accepted(states[-1]):
+                yield tuple(path[1:]), "{}".format(element.text)
+
+        path.pop()
+        if path_filter != None:
+            states.pop()
+
+        element.clear(keep_tail=True)
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+
+def prune_leaves(leaves: List[Leaf], concat_symbol: str) -> List[Leaf]:
+    '''
+    Unites the values of equivalent branches in a single leaf, separated by the 'concat_symbol' string. The branches
+    are grouped in a single pass and returned in order of first occurrence.
+
+        Parameters:
+        -----------
+            leaves (list[Leaf]): A list of (path, value) tuples containing the branches of the .xml tree
+            concat_symbol (str): Symbol used to concatenate the values of equivalent branches
+
+        Returns:
+        --------
+            leaves (list[Leaf]): The pruned leaf decomposition of the .xml file
+    '''
+
+    branches: Dict[Tuple[str, ...], List[str]] = {}
+
+    for path, value in leaves:
+        if path in branches:
+            branches[path].append(value)
+        else:
+            branches[path] = [value]
+
+    return [(path, concat_symbol.join(values)) for path, values in branches.items()]
+
+
+def load_leaves(stream: BytesIO, concat_symbol: str, path_filter: Optional[PathFilter] = None) -> List[Leaf]:
+    '''
+    Parses a single .xml stream into its pruned list of leaves.
+
+        Parameters:
+        -----------
+            stream (BytesIO): BytesIO stream of the .xml file to parse
+            concat_symbol (str): Symbol used to concatenate the values of equivalent branches
+            path_filter (Optional[PathFilter]): Filter of the branches to extract, all if None (default: None)
+
+        Returns:
+        --------
+            leaves (list[Leaf]): The pruned leaf decomposition of the .xml file
+    '''
+    return prune_leaves(list(iterparse_leaves(stream, path_filter)), concat_symbol)
+
+
+def _measured_load_leaves(stream: BytesIO, concat_symbol: str, path_filter: Optional[PathFilter], metrics: Metrics) -> List[Leaf]:
+    '''
+    Version of 'load_leaves' measuring the pruning of the leaves as a stage nested in the parsing of the file.
+    '''
+    leaves = list(iterparse_leaves(stream, path_filter))
+    with measure(metrics, "prune"):
+        return prune_leaves(leaves, concat_symbol)
+
+
+# Default repeated blocks of the FatturaPA invoices extracted as line items by 'parse_records'
+DEFAULT_RECORD_TAGS = ("DettaglioLinee", "DatiRiepilogo", "DettaglioPagamento")
+
+# Leaves outside the records and records (grouped by tag) of a single file
+Records = Tuple[List[Leaf], Dict[str, List[List[Leaf]]]]
+
+
+class _RecordsTarget():
+    '''
+    Parser target used by 'parse_records': the callbacks of the lxml parser are processed as they are received,
+    without building the element tree, keeping the same path, leaf and filter bookkeeping of 'iterparse_leaves'.
+    '''
+
+    def __init__(self, record_tags: Iterable[str], concat_symbol: str, path_filter: Optional[PathFilter]) -> None:
+        self.record_tags = frozenset(record_tags)
+        self.concat_symbol = concat_symbol
+        self.path_filter = path_filter
+
+        self.path: List[str] = []
+        self.has_children: List[bool] = []
+        self.states: List[Optional[FilterState]] = []
+        self.text: List[str] = []
+
+        self.leaves: List[Leaf] = []
+        self.records: Dict[str, List[List[Leaf]]] = {}
+        self.record: Optional[Dict[Tuple[str, ...], str]] = None
+        self.record_depth, self.record_tag = 0, ""
+
+
+    def start(self, tag: str, attrib: Any) -> None:
+        path, has_children = self.path, self.has_children
+        if has_children != []:
+            has_children[-1] = True
+        if self.path_filter != None:
+            states = self.states
+            if states == []:
+                states.append(self.path_filter.start())
+            else:
+                parent = states[-1]
+                states.append(None if parent == None else self.path_filter.step(parent, tag))
+        path.append(tag)
+        has_children.append(False)
+        self.text = []
+        if self.record == None and tag in self.record_tags and len(path) > 1:
+            self.record, self.record_depth, self.record_tag = {}, len(path), tag
+
+
+    def data(self, data: str) -> None:
+        self.text.append(data)
+
+
+    def end(self, tag: str) -> None:
+        path, record, text = self.path, self.record, self.text
+        depth = len(path)
+
+        if self.has_children.pop() == False and depth > 1:
+            if self.path_filter == None or PathFilter.is_accepted(self.states[-1]):
+                value = "".join(text) if text != [] else "None"
+                if record == None:
+                    self.leaves.append((tuple(path[1:]), value))
+                else:
+                    record_depth = self.record_depth
+                    if depth > record_depth:
+                        key = tuple(path[record_depth:])
+                        record[key] = value if key not in record else record[key] + self.concat_symbol + value
+
+        if record != None and depth == self.record_depth:
+            if record != {}:
+                self.records.setdefault(self.record_tag, []).append(list(record.items()))
+            self.record = None
+
+        path.pop()
+        if self.path_filter != None:
+            self.states.pop()
+        self.text = []
+
+
+    def close(self) -> "Records":
+        return prune_leaves(self.leaves, self.concat_symbol), self.records
+
+
+def parse_records(
+    stream: BytesIO, record_tags: Iterable[str], concat_symbol: str, path_filter: Optional[PathFilter] = None
+) -> Records:
+    '''
+    Parses a single .xml stream separating the repeated blocks (records), e.g. the 'DettaglioLinee' elements of an
+    invoice, from the rest of the tree. The leaves of each record are stored in a separate list, with the paths
+    relative to the record element, so that the values of different records are never joined. Records nested in
+    other records are treated as fields of the outer record. The remaining leaves, and the leaves repeated inside
+    the same record, are pruned as in 'load_leaves'. The file is parsed by a parser target, without building the
+    element tree, and the leaves are the same extracted by 'iterparse_leaves'.
+
+        Parameters:
+        -----------
+            stream (BytesIO): BytesIO stream of the .xml file to parse
+            record_tags (Iterable[str]): The tags of the record elements
+            concat_symbol (str): Symbol used to concatenate the values of equivalent branches
+            path_filter (Optional[PathFilter]): Filter of the branches to extract, all if None (default: None)
+
+        Returns:
+        --------
+            records (Records): The pruned leaves outside the records and the non empty records grouped by tag
+    '''
+
+    target = _RecordsTarget(record_tags, concat_symbol, path_filter)
+    parser = etree.XMLParser(target=target, remove_comments=True, huge_tree=True)
+    records: Records = etree.parse(stream, parser)
+    return records
+
+
+def build_path_filter(
+    starting_with: Optional[str] = "",
+    select: Optional[Iterable[Tuple[str, ...]]] = None,
+    path_filter: Optional[PathFilter] = None,
+    separator: str = "#@#",
+) -> Optional[PathFilter]:
+    '''
+    Builds the path filter equivalent to the loading options of 'XML_converter.load'.
+
+        Parameters:
+        -----------
+            starting_with (Optional[str]): starting condition on the branches, whose tags are joined by the separator
+                (see 'PathFilter.from_starting_with') (default: "")
+            select (Optional[Iterable[Tuple[str, ...]]]): The branches to extract (default: None)
+            path_filter (Optional[PathFilter]): A custom filter, cannot be combined with the other options (default: None)
+            separator (str): The separator of the tags in the starting condition (default: '#@#')
+
+        Returns:
+        --------
+            path_filter (Optional[PathFilter]): The filter of the branches to extract, None if all are extracted
+    '''
+
+    if starting_with == None:
+        starting_with = ""
+
+    if path_filter != None:
+        if starting_with != "" or select != None:
+            raise ValueError
+        return path_filter
+
+    if select != None:
+        if starting_with != "":
+            condition = PathFilter.from_starting_with(starting_with, separator)
+            select = [path for path in select if condition.accepts(tuple(path))]
+        return PathFilter(include=[tuple(path) for path in select if len(path) != 0])
+
+    if starting_with != "":
+        return PathFilter.from_starting_with(starting_with, separator)
+
+    return None
+
+
+def _entry_name(filename: str) -> str:
+    '''
+    Returns the name of the dataset entry associated to a file: the filename up to the first dot, preceded by
+    the folders in which the file is stored, if any (e.g. '2022/01/invoice.xml' -> '2022/01/invoice').
+    '''
+    folder, _, name = filename.rpartition("/")
+    return folder + "/" + name.split(".")[0] if folder != "" else name.split(".")[0]
+
+
+# Version of the parsed leaves and records, part of the cache keys: to be increased when the output of the parsing
+# or of its encoding changes
+LEAVES_FORMAT_VERSION = "1"
+
+
+def _encode_leaves(leaves: List[Leaf]) -> bytes:
+    return json.dumps(leaves, separators=(',', ':')).encode('utf-8')
+
+
+def _decode_leaves(payload: bytes) -> List[Leaf]:
+    return [(tuple(path), value) for path, value in json.loads(payload)]
+
+
+def _encode_records(records: Records) -> bytes:
+    return json.dumps(records, separators=(',', ':')).encode('utf-8')
+
+
+def _decode_records(payload: bytes) -> Records:
+    leaves, records = json.loads(payload)
+    return (
+        [(tuple(path), value) for path, value in leaves],
+        {tag: [[(tuple(path), value) for path, value in record] for record in items] for tag, items in records.items()},
+    )
+
+
+# Result of the parsing of a single file
+Parsed = TypeVar("Parsed")
+
+# Context of a chunk of files processed by the pool
+Context = TypeVar("Context")
+
+
+# Maximum number of files sent to a worker process at once by the pooled parsing
+MAX_CHUNK_SIZE = 64
+
+
+def _apply_to_bytes(data: bytes, function: Callable[[BytesIO], Parsed]) -> Parsed:
+    return function(BytesIO(data))
+
+
+def _apply_to_chunk(datas: List[bytes], function: Callable[[BytesIO], Parsed]) -> List[Tuple[Parsed, float]]:
+    '''
+    Worker function of the pooled parsing: parses a chunk of files returning the result and the wall time of each.
+    '''
+    return [timed_call(_apply_to_bytes, data, function) for data in datas]
+
+
+def _iter_pooled(
+    executor: ProcessPoolExecutor,
+    function: Callable[..., List[Parsed]],
+    chunks: Iterable[Tuple[Context, List[bytes]]],
+    workers: int,
+    *args: Any,
+) -> Iterator[Tuple[Context, List[Parsed]]]:
+    '''
+    Sends 'function(datas, *args)' to the process pool for each chunk of file contents, yielding in order the
+    context of each chunk with the results. At most two chunks per worker are in flight and the next chunk is taken
+    from the iterable only when there is room, so that the files are read while the previous ones are processed
+    and the memory does not grow with the number of files. Chunks without contents are not sent to the pool.
+    '''
+
+    pending: Deque[Tuple[Context, Any]] = deque()
+
+    def collect() -> Tuple[Context, List[Parsed]]:
+        context, future = pending.popleft()
+        return context, future.result() if future != None else []
+
+    for context, datas in chunks:
+        pending.append((context, executor.submit(function, datas, *args) if datas != [] else None))
+        del datas
+        if len(pending) > 2*workers:
+            yield collect()
+
+    while pending:
+        yield collect()
+
+
+def _header_key(path: Tuple[str, ...], offset: int, filler: Optional[str]) -> Tuple[str, ...]:
+    '''
+    Returns the part of a branch that determines its header signature: the branch without the first 'offset'
+    layers and, if the tree is inflated, without the trailing fillers.
+    '''
+    key = path[offset:]
+    if filler != None:
+        while key != () and key[-1] == filler:
+            key = key[:-1]
+    return key
+
+
+def _count_collisions(
+    rows: Iterable[Iterable[Leaf]], offset: int, filler: Optional[str], collisions: Optional[Dict[Tuple[str, ...], int]] = None
+) -> Dict[Tuple[str, ...], int]:
+    '''
+    Counts the branches of a single entry that get the same header signature because of the offset. For each
+    header key shared by more than one branch of an entry (see '_header_key') the maximum number of such branches
+    over the entries is returned, updating the given counts if any.
+    '''
+    if collisions == None:
+        collisions = {}
+    for leaves in rows:
+        keys = Counter([_header_key(path, offset, filler) for path, _ in leaves])
+        for key, count in keys.items():
+            if count > 1 and count > collisions.get(key, 1):
+                collisions[key] = count
+    return collisions
+
+
+def _build_header(
+    paths: Iterable[Tuple[str, ...]], offset: int, filler: Optional[str], collisions: Optional[Dict[Tuple[str, ...], int]] = None
+) -> Tuple[Dict[Tuple[str, ...], List[int]], List[Tuple[str, ...]]]:
+    '''
+    Builds the dataframe header associated to a sequence of branches. The first layers of each branch, up to the
+    minimum branch length, are used as header levels while the remaining tags are joined in the last level, that
+    is dropped if all the branches have the same length. If a filler is given the branches are padded to the
+    maximum branch length. Branches with the same signature share the same column, unless the offset gives the
+    same signature to different branches of a single entry: each signature has as many columns as the branches
+    sharing it in a single entry (see '_count_collisions') and the header contains duplicate signatures.
+
+        Parameters:
+        -----------
+            paths (Iterable[Tuple[str, ...]]): The distinct branches in column order
+            offset (int): number of tree layer to remove from the header creation
+            filler (Optional[str]): The filler of the inflated tree, None if the tree is not inflated
+            collisions (Optional[Dict[Tuple[str, ...], int]]): The number of branches of a single entry sharing
+                each header key, one if missing (default: None)
+
+        Returns:
+        --------
+            positions (Dict[Tuple[str, ...], List[int]]): The columns of the signature of each branch, taken in
+                order by the branches of an entry sharing it
+            header (List[Tuple[str, ...]]): The signatures of the columns
+    '''
+
+    paths = list(paths)
+    if paths == []:
+        return {}, []
+
+    lmax = max([len(path) for path in paths])
+    lmin = lmax if filler != None else min([len(path) for path in paths])
+    lmin -= offset
+
+    positions: Dict[Tuple[str, ...], List[int]] = {}
+    signatures: Dict[Tuple[str, ...], List[int]] = {}
+    header: List[Tuple[str, ...]] = []
+
+    for path in paths:
+        if filler != None and len(path) < lmax:
+            path_padded = path + (filler,)*(lmax-len(path))
+        else:
+            path_padded = path
+        signature = path_padded[offset:lmin+offset] + (' - '.join(path_padded[lmin+offset:]),)
+
+        columns = signatures.setdefault(signature, [])
+        count = collisions.get(_header_key(path, offset, filler), 1) if collisions != None else 1
+        while len(columns) < count:
+            columns.append(len(header))
+            header.append(signature)
+        positions[path] = columns
+
+    if lmin+offset == lmax:
+        header = [signature[:-1] for signature in header]
+
+    return positions, header
+
+
+def _build_dataframe(
+    rows: List[List[Leaf]], index: Any, positions: Dict[Tuple[str, ...], List[int]], header: List[Tuple[str, ...]]
+) -> DataFrame:
+    '''
+    Fills the columns of a dataframe, one list per column, with the leaves of each row. The leaves whose branch is
+    not in the header are ignored. The branches of a row sharing a signature fill its columns in order, the
+    branches exceeding the columns of the signature overwrite its last column.
+
+        Parameters:
+        -----------
+            rows (List[List[Leaf]]): The leaves of each row
+            index (Any): The index of the dataframe, e.g. the entry names
+            positions (Dict[Tuple[str, ...], List[int]]): The columns of the signature of each branch
+            header (List[Tuple[str, ...]]): The signatures of the columns
+
+        Returns:
+        --------
+            dataframe (pandas.DataFrame): pandas dataframe containing the entries
+    '''
+
+    nrows = len(rows)
+    columns: List[List[object]] = [[nan]*nrows for _ in header]
+
+    for row, leaves in enumerate(rows):
+        filled: Set[int] = set()
+        for path, value in leaves:
+            slots = positions.get(path)
+            if slots == None:
+                continue
+            position = slots[-1]
+            if len(slots) > 1:
+                position = next((x for x in slots if x not in filled), position)
+                filled.add(position)
+            columns[position][row] = value
+
+    dataframe = DataFrame(dict(enumerate(columns)), index=index)
+    if header != []:
+        dataframe.columns = MultiIndex.from_tuples(header)
+
+    return dataframe
+
+
+class BranchStatistics():
+    '''
+    Statistics of the branches of a dataset, updated incrementally while the entries are added or removed so that
+    they are available without scanning the dataset.
+
+        Attributes:
+        -----------
+            depth_histogram (Counter[int]): Number of leaves for each branch length
+            path_counts (Counter[Tuple[str, ...]]): Number of entries containing each branch
+            nleaves (int): Total number of leaves
+    '''
+
+    def __init__(self) -> None:
+        self.depth_histogram: CounterType[int] = Counter()
+        self.path_counts: CounterType[Tuple[str, ...]] = Counter()
+        self.nleaves = 0
+        self._min_depth, self._max_depth = -1, -1
+
+    @property
+    def min_depth(self) -> int:
+        '''Minimum branch length, -1 if there are no leaves'''
+        return self._min_depth
+
+    @property
+    def max_depth(self) -> int:
+        '''Maximum branch length, -1 if there are no leaves'''
+        return self._max_depth
+
+    @property
+    def distinct_paths(self) -> int:
+        '''Number of distinct branches'''
+        return len(self.path_counts)
+
+    def add(self, paths: List[Tuple[str, ...]]) -> None:
+        '''
+        Updates the statistics with the branches of a new entry.
+
+            Parameters:
+            -----------
+                paths (List[Tuple[str, ...]]): The branches of the entry
+        '''
+        for path in paths:
+            self.depth_histogram[len(path)] += 1
+            self.path_counts[path] += 1
+        self.nleaves += len(paths)
+        self._update_limits()
+
+    def remove(self, paths: List[Tuple[str, ...]]) -> None:
+        '''
+        Updates the statistics removing the branches of an entry.
+
+            Parameters:
+            -----------
+                paths (List[Tuple[str, ...]]): The branches of the entry
+        '''
+        for path in paths:
+            self.depth_histogram[len(path)] -= 1
+            if self.depth_histogram[len(path)] == 0:
+                del self.depth_histogram[len(path)]
+            self.path_counts[path] -= 1
+            if self.path_counts[path] == 0:
+                del self.path_counts[path]
+        self.nleaves -= len(paths)
+        self._update_limits()
+
+    def _update_limits(self) -> None:
+        # The number of distinct branch lengths is small, the limits are evaluated on the histogram keys
+        if len(self.depth_histogram) == 0:
+            self._min_depth, self._max_depth = -1, -1
+        else:
+            self._min_depth, self._max_depth = min(self.depth_histogram), max(self.depth_histogram)
+
+
 class XML_converter():
     '''
     This class allows for the conversion of multiple .xml files, given asy BytesIO streams, characterized by a generic topology, into
-    a pandas DataFrame object.
+    a pandas DataFrame object. Each branch of the .xml tree is internally stored as a leaf, i.e. a tuple of
+    tags and the associated value.
 
         Conctructor parameters
         ----------------------
-            instream (Dict[str, BytesIO]): Dictionary containing the BytesIO stream of all the .xml files to parse
-                ordered by filename
-            separator (str): Separator to be used during the parsing operation of the node fields (default: '|')
-            concat_symbol (str): Symbol used to concatenate field associated with equivalent branches (default: ' & ')
+            instream (Mapping[str, BytesIO]): Dictionary (or lazy mapping) containing the BytesIO stream of all the .xml
+                files to parse ordered by filename
+            separator (str): Separator used to join the node fields in the string view of the dataset (default: '#@#')
+            concat_symbol (str): Symbol used to concatenate field associated with equivalent branches (default: '|')
+            validate (bool): If True the files are searched for the separator (see 'find_separator') and a
+                SeparatorError reporting all the occurrences is raised if it is found (default: False)
+            metrics (Optional[Metrics]): Collector of the time spent on each file by the parsing (stage 'parse', with
+                the nested 'prune' stage in the serial loading) and on each dataset by the dataframe creation (stage
+                'build_dataframe'), disabled if None (default: None)
     '''
 
-    def __init__(self, instream: Dict[str, BytesIO], separator: str = "#@#", concat_symbol: str = "|") -> None:
+    def __init__(
+        self, instream: Mapping[str, BytesIO], separator: str = "#@#", concat_symbol: str = "|", validate: bool = False,
+        metrics: Optional[Metrics] = None,
+    ) -> None:
         
-        if type(instream) == dict:
-            if instream == {}:
+        if isinstance(instream, Mapping):
+            if len(instream) == 0:
                 raise ValueError
         else:
             raise ValueError
@@ -46,23 +701,49 @@ class XML_converter():
         if concat_symbol == separator:
             raise ValueError
 
-        self.dataset: Dict[str, List[str]] = {}
+        if validate == True:
+            occurrences = find_separator(instream, separator)
+            if occurrences != {}:
+                raise SeparatorError(separator, occurrences=occurrences)
+
         self.instream = instream
         self.separator = separator
         self.concat_symbol = concat_symbol
+        self.metrics = metrics
+        self._reset()
+
 
-        for stream in instream.values():
+    def _reset(self) -> None:
+        '''
+        Initializes an empty dataset. The leaves must be modified only through the class methods so that the
+        branch statistics, used to evaluate the branch limits without scanning the dataset, are kept updated.
+        '''
+        self.leaves: Dict[str, List[Leaf]] = {}
+        self.filler: Optional[str] = None
+        self.statistics = BranchStatistics()
 
-            if self.separator in stream.read().decode('utf-8'):
-                raise SeparatorError(self.separator)
 
-            stream.seek(0)
+    @property
+    def dataset(self) -> Dict[str, List[str]]:
+        '''
+        String view of the loaded dataset in which the tags and the value of each leaf are joined by the 'self.separator'
+        string. The view is generated on request and is not used by the parsing pipeline. If the tree has been inflated
+        the branches are padded with the filler.
+
+            Returns:
+            --------
+                dataset (Dict[str, List[str]]): Dictionary of the branch strings ordered by entry name
+        '''
+        dataset = {}
+        for entry_name, leaves in self.leaves.items():
+            dataset[entry_name] = [self.separator.join(self.pad_path(path) + (value,)) for path, value in leaves]
+        
+        return dataset
 
 
-    def traverse_node(self, nodes: List[objectify.ObjectifiedElement]) -> List[str]:
+    def traverse_node(self, nodes: List[objectify.ObjectifiedElement]) -> List[Leaf]:
         '''
-        Recursively linearizes the XML file tree into a list of strings containing the nodes tags and final values.
-        each node/value field is separated by the 'self.separator' string.
+        Recursively linearizes the XML file tree into a list of leaves containing the nodes tags and final values.
 
             Parameters:
             -----------
@@ -70,163 +751,388 @@ class XML_converter():
             
             Returns:
             --------
-                strings (list): A list of string containing nodes and values for each XML entry    
+                leaves (list): A list of (path, value) tuples for each XML entry
         '''
 
-        strings = []
+        leaves = []
 
         for node in nodes:
 
             if node.countchildren() != 0:
 
-                tail_strings = self.traverse_node(node.getchildren())
-
-                for entry in tail_strings:
-                    strings.append("{}{}{}".format(node.tag, self.separator, entry))
+                for path, value in self.traverse_node(node.getchildren()):
+                    leaves.append(((node.tag,) + path, value))
             
             else:
-                strings.append("{}{}{}".format(node.tag, self.separator, node.text))
+                leaves.append(((node.tag,), "{}".format(node.text)))
                 
-        return strings
+        return leaves
 
 
-    def prune_equivalent_nodes(self, strings: List[str]) -> List[str]:
+    def prune_equivalent_nodes(self, leaves: List[Leaf]) -> List[Leaf]:
         '''
-        Prune the string decomposition of the .xml tree to remove data attached to identical branches.
-        The data of equivalent branches are united in the same entry and divided by a '&' separator.
+        Prune the leaf decomposition of the .xml tree to remove data attached to identical branches.
+        The data of equivalent branches are united in the same entry and divided by the 'self.concat_symbol' string.
+        The branches are grouped in a single pass and returned in order of first occurrence.
             
             Parameters:
             -----------
-                strings (list[str]): A list of strings containing the branches of the .xml tree
+                leaves (list[Leaf]): A list of (path, value) tuples containing the branches of the .xml tree
             
             Returns:
             --------
-                strings (list[str]): The pruned string decomposition of the .xml file   
+                leaves (list[Leaf]): The pruned leaf decomposition of the .xml file   
         '''
 
-        skip = []
-        pruned_strings = []
+        return prune_leaves(leaves, self.concat_symbol)
+    
 
-        for a, string_a in enumerate(strings):
-            
-            if a in skip:
-                continue
-            
-            buffer: List[str] = []
-            branch_a = self.separator.join(string_a.split(self.separator)[0:-1])
+    def load(
+        self,
+        starting_with: str = "",
+        workers: int = 1,
+        cache: Optional[ParseCache] = None,
+        select: Optional[Iterable[Tuple[str, ...]]] = None,
+        path_filter: Optional[PathFilter] = None,
+    ) -> None:
+        '''
+        Loads the .xml files contained in the instream BytesIO dictionary. Each branch of the .xml tree
+        is linearized in data fields by a streaming parser (see 'iterparse_leaves') and the data related
+        to identical branches are united in a single field. A starting condition for the branches can be specified.
+        If more than one worker is requested the files are parsed by a pool of processes, the resulting dataset
+        is identical to the one obtained by the serial loading. If a cache is given the pruned leaves of each file
+        are stored in it and files with an already cached content are not parsed again. If a set of branches is
+        selected only those branches are extracted and the subtrees not leading to them are skipped while parsing
+        (see 'invoices_modifier.get_lookup_table_paths' to select the branches of a lookup table). More complex
+        selections, with excluded branches and wildcards, can be given as a PathFilter.
 
-            for b, string_b in enumerate(strings[a+1::]):
+            Parameters:
+            -----------
+                starting_with (str): starting condition on the branches, with the tags joined by the separator (e.g.
+                    'FatturaElettronicaBody#@#Dati'), the last tag can be incomplete (default: "")
+                workers (int): number of worker processes used to parse the files (default: 1)
+                cache (Optional[ParseCache]): on-disk cache of the parsed files (default: None)
+                select (Optional[Iterable[Tuple[str, ...]]]): The branches to extract, as tuples of tags starting
+                    from the first layer below the root, all if None (default: None)
+                path_filter (Optional[PathFilter]): Filter of the branches to extract, cannot be combined with the
+                    'starting_with' and 'select' options (default: None)
+        '''
+        self.add_streams(
+            self.instream, starting_with=starting_with, workers=workers, cache=cache, select=select, path_filter=path_filter
+        )
 
-                branch_b = self.separator.join(string_b.split(self.separator)[0:-1])
 
-                if branch_a == branch_b:
-                    if buffer == []:
-                        buffer.append(string_a.split(self.separator)[-1])
-                    buffer.append(string_b.split(self.separator)[-1])
-                    skip.append(a+b+1)
-            
-            if buffer == []:
-                pruned_strings.append(string_a)
-            else:
-                pruned_strings.append(branch_a + self.separator + self.concat_symbol.join(buffer))
-        
-        return pruned_strings
-    
+    def add_streams(
+        self,
+        instream: Mapping[str, BytesIO],
+        starting_with: str = "",
+        workers: int = 1,
+        cache: Optional[ParseCache] = None,
+        select: Optional[Iterable[Tuple[str, ...]]] = None,
+        path_filter: Optional[PathFilter] = None,
+    ) -> None:
+        '''
+        Loads additional .xml files into the current dataset, see 'load' for the details. Entries with the same
+        name of an already loaded file are replaced.
 
-    def load(self, starting_with: str = "") -> None:
+            Parameters:
+            -----------
+                instream (Mapping[str, BytesIO]): Dictionary (or lazy mapping) containing the BytesIO stream of the
+                    .xml files to add ordered by filename
+                starting_with (str): starting condition on the branches, with the tags joined by the separator (e.g.
+                    'FatturaElettronicaBody#@#Dati'), the last tag can be incomplete (default: "")
+                workers (int): number of worker processes used to parse the files (default: 1)
+                cache (Optional[ParseCache]): on-disk cache of the parsed files (default: None)
+                select (Optional[Iterable[Tuple[str, ...]]]): The branches to extract, all if None (default: None)
+                path_filter (Optional[PathFilter]): Filter of the branches to extract (default: None)
         '''
-        Loads the .xml files contained in the instream BytesIO dictionary. Each branch of the .xml tree
-        is linearized in data fields and the data related to identical branches are united in a single field. A starting
-        condition for the branches can be specified.
+
+        if isinstance(instream, Mapping) == False:
+            raise ValueError
+
+        if type(workers) != int or workers < 1:
+            raise ValueError
+
+        path_filter = build_path_filter(starting_with, select, path_filter, self.separator)
+
+        if workers == 1:
+            for entry_name, leaves in self._iter_entries(instream, path_filter, cache):
+                self._store_entry(entry_name, leaves)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for entry_name, leaves in self._iter_entries(instream, path_filter, cache, executor, workers):
+                self._store_entry(entry_name, leaves)
+
+
+    def _iter_entries(
+        self,
+        instream: Mapping[str, BytesIO],
+        path_filter: Optional[PathFilter],
+        cache: Optional[ParseCache] = None,
+        executor: Optional[ProcessPoolExecutor] = None,
+        workers: int = 1,
+        stage: str = "parse",
+    ) -> Iterator[Tuple[str, List[Leaf]]]:
+        '''
+        Parses the .xml files of a stream mapping, yielding the entry name and the pruned leaves of each file in order.
+        '''
+        function: Callable[[BytesIO], List[Leaf]] = partial(load_leaves, concat_symbol=self.concat_symbol, path_filter=path_filter)
+        if self.metrics != None and executor == None:
+            function = partial(_measured_load_leaves, concat_symbol=self.concat_symbol, path_filter=path_filter, metrics=self.metrics)
+        params = ["leaves", LEAVES_FORMAT_VERSION, self.concat_symbol, "" if path_filter == None else path_filter.signature()]
+        return self._iter_parsed(instream, function, params, _encode_leaves, _decode_leaves, cache, executor, workers, stage)
+
+
+    def _iter_parsed(
+        self,
+        instream: Mapping[str, BytesIO],
+        function: Callable[[BytesIO], Parsed],
+        params: List[str],
+        encode: Callable[[Parsed], bytes],
+        decode: Callable[[bytes], Parsed],
+        cache: Optional[ParseCache] = None,
+        executor: Optional[ProcessPoolExecutor] = None,
+        workers: int = 1,
+        stage: str = "parse",
+    ) -> Iterator[Tuple[str, Parsed]]:
+        '''
+        Applies a parsing function to the .xml files of a stream mapping, yielding the entry name and the result for
+        each file in order. Without an executor the files are parsed one at a time, otherwise they are read and parsed
+        by the process pool (the function must be picklable) in chunks, with at most two chunks per worker in flight,
+        so that the memory does not grow with the number of files. If a cache is given the results are stored in it,
+        encoded, under a key built from the file content and the 'params' identifying the function. The streams are
+        read from the beginning so that the same mapping can be parsed more than once. The parsing of each file is
+        recorded by the metrics, if any, under the 'stage' name.
+        '''
+
+        filenames = list(instream)
+
+        if executor == None:
+            for filename in filenames:
+                stream = instream[filename]
+                with measure(self.metrics, stage, filename) as record:
+                    stream.seek(0)
+                    if cache == None:
+                        result = function(stream)
+                    else:
+                        data = stream.read()
+                        key = ParseCache.make_key(data, *params)
+                        payload = cache.get(key)
+                        if payload == None:
+                            result = function(BytesIO(data))
+                            cache.put(key, encode(result))
+                        else:
+                            result = decode(payload)
+                    record.nbytes = stream.tell()
+                yield _entry_name(filename), result
+            return
+
+        chunksize = max(1, min(MAX_CHUNK_SIZE, len(filenames)//(4*workers)))
+
+        # Yields the context of each chunk, i.e. the filenames, the cached results and the (index, cache key, size)
+        # of the files sent to the pool, with the contents of the files to parse
+        def read_chunks() -> Iterator[Tuple[Tuple[List[str], Dict[int, Parsed], List[Tuple[int, str, int]]], List[bytes]]]:
+            for start in range(0, len(filenames), chunksize):
+                chunk = filenames[start:start+chunksize]
+                results: Dict[int, Parsed] = {}
+                missing: List[Tuple[int, str, int]] = []
+                datas: List[bytes] = []
+
+                for idx, filename in enumerate(chunk):
+                    stream = instream[filename]
+                    stream.seek(0)
+                    data = stream.read()
+                    key = ""
+                    if cache != None:
+                        key = ParseCache.make_key(data, *params)
+                        payload = cache.get(key)
+                        if payload != None:
+                            results[idx] = decode(payload)
+                            continue
+                    missing.append((idx, key, len(data)))
+                    datas.append(data)
+
+                yield (chunk, results, missing), datas
+
+        for (chunk, results, missing), timed_results in _iter_pooled(executor, _apply_to_chunk, read_chunks(), workers, function):
+            for (idx, key, nbytes), (result, seconds) in zip(missing, timed_results):
+                results[idx] = result
+                if self.metrics != None:
+                    self.metrics.record(stage, chunk[idx], seconds, nbytes)
+                if cache != None:
+                    cache.put(key, encode(result))
+            for idx, filename in enumerate(chunk):
+                yield _entry_name(filename), results.pop(idx)
+
+
+    def remove_entries(self, entry_names: Iterable[str]) -> None:
+        '''
+        Removes the selected entries from the dataset. The branch statistics, and therefore the inflation of the
+        tree, are updated accordingly.
 
             Parameters:
             -----------
-                starting_with (str): starting condition to select a subset of the first tag layer (default: "")
+                entry_names (Iterable[str]): Names of the entries to remove
         '''
-        for filename, stream in self.instream.items():
-          
-            entry_name = filename.split(".")[0]
+        for entry_name in list(entry_names):
+            self._drop_entry(entry_name)
 
-            xml_data = objectify.parse(stream)
-            tree_root = xml_data.getroot()
 
-            _stringlist_ = self.traverse_node(tree_root.getchildren())
-            
-            if starting_with == None or starting_with == "":
-                stringlist = _stringlist_
-            else:
-                stringlist = [item for item in _stringlist_ if item.startswith(starting_with)]
+    def filter_branches(self, starting_with: str = "", path_filter: Optional[PathFilter] = None) -> None:
+        '''
+        Removes from the loaded dataset the branches not satisfying a starting condition, as done by the 'starting_with'
+        argument of 'load', or rejected by a path filter. The branch statistics are updated accordingly.
+
+            Parameters:
+            -----------
+                starting_with (str): starting condition on the branches, with the tags joined by the separator (e.g.
+                    'FatturaElettronicaBody#@#Dati'), the last tag can be incomplete (default: "")
+                path_filter (Optional[PathFilter]): Filter of the branches to keep (default: None)
+        '''
+        path_filter = build_path_filter(starting_with, path_filter=path_filter, separator=self.separator)
+        if path_filter == None:
+            return
+
+        for entry_name, leaves in list(self.leaves.items()):
+            self._store_entry(entry_name, [leaf for leaf in leaves if path_filter.accepts(leaf[0])])
+
+
+    def _store_entry(self, entry_name: str, leaves: List[Leaf]) -> None:
+
+        if entry_name in self.leaves:
+            self._drop_entry(entry_name)
+
+        self.leaves[entry_name] = leaves
+        self.statistics.add([path for path, _ in leaves])
+
 
-            stringlist = self.prune_equivalent_nodes(stringlist)
+    def _drop_entry(self, entry_name: str) -> None:
+        self.statistics.remove([path for path, _ in self.leaves.pop(entry_name)])
 
-            self.dataset[entry_name] = stringlist
+
+    def pad_path(self, path: Tuple[str, ...]) -> Tuple[str, ...]:
+        '''
+        Returns a branch padded with the filler up to the maximum branch length if the tree has been inflated,
+        the branch itself otherwise. The padding is never stored in the dataset.
+
+            Parameters:
+            -----------
+                path (Tuple[str, ...]): The tags of the branch
+
+            Returns:
+            --------
+                path (Tuple[str, ...]): The padded tags of the branch
+        '''
+        if self.filler == None or len(path) >= self.statistics.max_depth:
+            return path
+        return path + (self.filler,)*(self.statistics.max_depth-len(path))
 
 
     def get_branch_limits(self) -> Tuple[int, int]:
         '''
-        Evaluate the minimum and maximum branch lengths of the loaded dataset
+        Evaluate the minimum and maximum branch lengths of the loaded dataset. The limits are obtained from the
+        branch statistics updated during the loading, without scanning the dataset.
 
             Returns:
             --------
                 lmin, lmax (Tuple[int, int]): The minimum and maximum branch lengths 
         '''
 
-        lmin, lmax = -1, -1
-        for stringlist in self.dataset.values():
-            for string in stringlist:
-                nlayers = string.count(self.separator)
-                lmin = nlayers if lmin==-1 else min(lmin, nlayers)
-                lmax = nlayers if lmax==-1 else max(lmax, nlayers)
+        if self.statistics.nleaves == 0:
+            return -1, -1
+
+        if self.filler != None:
+            return self.statistics.max_depth, self.statistics.max_depth
         
-        return lmin, lmax
+        return self.statistics.min_depth, self.statistics.max_depth
     
 
     def inflate_tree(self, filler: str = " ") -> None:
         '''
-        Selectively inflate with a 'filler' the .xml tree dataset to obtain branches of equal length.
+        Selectively inflate with a 'filler' the .xml tree dataset to obtain branches of equal length. The inflation
+        is virtual: the filler is recorded and applied, up to the current maximum branch length, only when the
+        branches are converted (see 'pad_path'), so that the branches added after the inflation are inflated too.
 
             Parameters:
             -----------
                 filler (str): Element to fill the gap between node fields (default: ' ')
-            
-            Returns:
-            --------
-                strings (list[str]): The inflated string decomposition of the .xml file  
         '''
 
         if self.separator in filler:
             raise ValueError
-        
-        _, lmax = self.get_branch_limits()
 
-        inflated_dataset = {}
-        
-        for entry_name, stringlist in self.dataset.items():
+        if self.filler != None:
+            return
 
-            inflated_stringlist = []
+        self.filler = filler
 
-            for string in stringlist:
 
-                fields = string.split(self.separator)
+    def save_state(self, path: str) -> None:
+        '''
+        Saves the loaded dataset, and the information needed to update it, to a .json file (compressed if the path
+        ends with '.gz'). The state can be restored with 'XML_converter.from_state'.
 
-                if len(fields) == lmax+1:
-                    inflated_stringlist.append(string)
-                else:
-                    current = self.separator.join(fields[0:-1])
-                    current += self.separator
-                    current += self.separator.join([filler for _ in range(lmax-len(fields)+1)])
-                    current += self.separator + fields[-1]
-                    inflated_stringlist.append(current)
-            
-            inflated_dataset[entry_name] = inflated_stringlist
-        
-        self.dataset = inflated_dataset 
+            Parameters:
+            -----------
+                path (str): Path to the output file
+        '''
+
+        state = {
+            "separator": self.separator,
+            "concat_symbol": self.concat_symbol,
+            "filler": self.filler,
+            "entries": {
+                entry_name : [[list(path), value] for path, value in leaves]
+                for entry_name, leaves in self.leaves.items()
+            },
+        }
+
+        opener: Any = gzip.open if str(path).endswith(".gz") else open
+        with opener(path, 'wt', encoding='utf-8') as file:
+            json.dump(state, file)
+
+
+    @classmethod
+    def from_state(cls, path: str, instream: Optional[Mapping[str, BytesIO]] = None) -> "XML_converter":
+        '''
+        Creates a converter from a state saved by 'save_state'. New files can then be loaded with 'add_streams'.
+
+            Parameters:
+            -----------
+                path (str): Path to the state file
+                instream (Optional[Mapping[str, BytesIO]]): Streams to be used by 'load' (default: None)
+
+            Returns:
+            --------
+                converter (XML_converter): The converter containing the restored dataset
+        '''
+
+        opener: Any = gzip.open if str(path).endswith(".gz") else open
+        with opener(path, 'rt', encoding='utf-8') as file:
+            state = json.load(file)
+
+        converter = cls.__new__(cls)
+        converter.instream = {} if instream == None else instream
+        converter.separator = state["separator"]
+        converter.concat_symbol = state["concat_symbol"]
+        converter.metrics = None
+        converter._reset()
+
+        converter.filler = state["filler"]
+
+        for entry_name, leaves in state["entries"].items():
+            converter._store_entry(entry_name, [(tuple(path), value) for path, value in leaves])
+
+        return converter
 
 
     def get_pandas_dataset(self, offset: int = 0) -> DataFrame:
         '''
         Convert the loaded dataset into a pandas.DataFrame object. An offset from the .xml tree root can
-        be specified in the generation of the header.
+        be specified in the generation of the header. The columns, ordered by first occurrence, are collected over
+        the whole dataset and filled in a single pass before building the DataFrame. If the tree has been inflated
+        the filler is applied while building the header.
 
             Parameters:
             --------
@@ -237,32 +1143,195 @@ class XML_converter():
                 dataframe (pandas.DataFrame): pandas dataframe containing the loaded dataset
         '''
 
-        lmin, lmax = self.get_branch_limits()
-        lmin -= offset
-    
-        dataframe_by_lines = []
+        with measure(self.metrics, "build_dataframe"):
+            rows = list(self.leaves.values())
+            paths = dict.fromkeys([path for leaves in rows for path, _ in leaves])
+            positions, header = _build_header(paths, offset, self.filler, _count_collisions(rows, offset, self.filler))
 
-        for name in self.dataset:
+            return _build_dataframe(rows, list(self.leaves), positions, header)
 
-            data = []
-            header: List[List[str]] = [[] for _ in range(lmin+1)]
 
-            for string in self.dataset[name]:
+    def scan_schema(
+        self,
+        starting_with: str = "",
+        workers: int = 1,
+        cache: Optional[ParseCache] = None,
+        select: Optional[Iterable[Tuple[str, ...]]] = None,
+        path_filter: Optional[PathFilter] = None,
+    ) -> List[Tuple[str, ...]]:
+        '''
+        Collects the distinct branches of the .xml files contained in the instream, in order of first occurrence,
+        without storing the leaves. The result can be used as the fixed schema of 'iter_pandas_datasets'. The
+        loading options are the same of 'load'.
 
-                sstring = string.split(self.separator)
+            Returns:
+            --------
+                schema (List[Tuple[str, ...]]): The distinct branches of the files
+        '''
 
-                for i in range(lmin):
-                    header[i].append(sstring[offset + i])
+        path_filter = build_path_filter(starting_with, select, path_filter, self.separator)
+        return self._scan_schema(path_filter, workers, cache, 0)[0]
 
-                header[lmin].append(' - '.join(sstring[lmin+offset:-1]))
-                data.append(sstring[-1])
-            
-            if lmin+offset == lmax:
-                del header[-1]
-        
-            df = DataFrame([data], index=[name], columns=header)
-            dataframe_by_lines.append(df)
-        
-        dataframe = concat(dataframe_by_lines)
 
-        return dataframe
+    def _scan_schema(
+        self, path_filter: Optional[PathFilter], workers: int, cache: Optional[ParseCache], offset: int
+    ) -> Tuple[List[Tuple[str, ...]], Dict[Tuple[str, ...], int]]:
+        '''
+        Collects the distinct branches of the files and the branches of a single file sharing a header signature
+        with the given offset (see '_count_collisions').
+        '''
+
+        paths: Dict[Tuple[str, ...], None] = {}
+        collisions: Dict[Tuple[str, ...], int] = {}
+
+        if workers == 1:
+            for _, leaves in self._iter_entries(self.instream, path_filter, cache, stage="scan_schema"):
+                paths.update(dict.fromkeys([path for path, _ in leaves]))
+                _count_collisions([leaves], offset, self.filler, collisions)
+            return list(paths), collisions
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for _, leaves in self._iter_entries(self.instream, path_filter, cache, executor, workers, "scan_schema"):
+                paths.update(dict.fromkeys([path for path, _ in leaves]))
+                _count_collisions([leaves], offset, self.filler, collisions)
+        return list(paths), collisions
+
+
+    def iter_pandas_datasets(
+        self,
+        batch_size: int = 1000,
+        offset: int = 0,
+        schema: Optional[Iterable[Tuple[str, ...]]] = None,
+        starting_with: str = "",
+        workers: int = 1,
+        cache: Optional[ParseCache] = None,
+        select: Optional[Iterable[Tuple[str, ...]]] = None,
+        path_filter: Optional[PathFilter] = None,
+    ) -> Iterator[DataFrame]:
+        '''
+        Parses the .xml files contained in the instream in batches, yielding a pandas.DataFrame for each batch of
+        files. The loaded dataset is not modified and only one batch at a time is kept in memory. All the batches
+        share the same columns, built from a schema of branches: branches outside the schema are ignored and
+        columns without data are filled with NaN. If no schema is given it is collected by a first pass over the
+        files (see 'scan_schema'), in this case the concatenation of the batches is equivalent to the dataframe
+        obtained by 'load' and 'get_pandas_dataset'. The filler of an inflated tree is applied to the header.
+
+            Parameters:
+            -----------
+                batch_size (int): number of files in each batch (default: 1000)
+                offset (int): number of tree layer to remove from the header creation (default: 0)
+                schema (Optional[Iterable[Tuple[str, ...]]]): The branches associated to the columns, in order, as
+                    tuples of tags starting from the first layer below the root (see 'invoices_modifier.get_lookup_table_paths'
+                    for the branches of a lookup table). The branches of a given schema with the same signature share
+                    one column (default: None)
+                starting_with, workers, cache, select, path_filter: The loading options, see 'load'
+
+            Yields:
+            -------
+                dataframe (pandas.DataFrame): pandas dataframe containing a batch of files
+        '''
+
+        if type(batch_size) != int or batch_size < 1:
+            raise ValueError
+
+        if type(workers) != int or workers < 1:
+            raise ValueError
+
+        path_filter = build_path_filter(starting_with, select, path_filter, self.separator)
+
+        collisions: Optional[Dict[Tuple[str, ...], int]] = None
+        if schema == None:
+            schema, collisions = self._scan_schema(path_filter, workers, cache, offset)
+
+        positions, header = _build_header(dict.fromkeys([tuple(path) for path in schema]), offset, self.filler, collisions)
+
+        filenames = list(self.instream)
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+        try:
+            for start in range(0, len(filenames), batch_size):
+                batch = {filename: self.instream[filename] for filename in filenames[start:start+batch_size]}
+                entries = list(self._iter_entries(batch, path_filter, cache, executor, workers))
+                with measure(self.metrics, "build_dataframe"):
+                    dataframe = _build_dataframe([leaves for _, leaves in entries], [name for name, _ in entries], positions, header)
+                yield dataframe
+        finally:
+            if executor != None:
+                executor.shutdown()
+
+
+    def load_normalized(
+        self,
+        record_tags: Iterable[str] = DEFAULT_RECORD_TAGS,
+        offset: int = 0,
+        starting_with: str = "",
+        workers: int = 1,
+        cache: Optional[ParseCache] = None,
+        select: Optional[Iterable[Tuple[str, ...]]] = None,
+        path_filter: Optional[PathFilter] = None,
+    ) -> Tuple[DataFrame, Dict[str, DataFrame]]:
+        '''
+        Parses the .xml files contained in the instream into normalized tables: a header table, with one row per
+        file, and a line-item table for each record tag, with one row per record (e.g. per 'DettaglioLinee' element)
+        indexed by the entry name and the record number. The values of different records are never joined (see
+        'parse_records'). The loaded dataset is not modified. The header of the line-item tables is built from the
+        branches relative to the record element. The filler of an inflated tree is applied to all the headers.
+
+            Parameters:
+            -----------
+                record_tags (Iterable[str]): The tags of the record elements (default: DEFAULT_RECORD_TAGS)
+                offset (int): number of tree layer to remove from the header table creation (default: 0)
+                starting_with, workers, cache, select, path_filter: The loading options, see 'load'
+
+            Returns:
+            --------
+                header (pandas.DataFrame): The table of the fields outside the records, one row per file
+                items (Dict[str, pandas.DataFrame]): The line-item table of each record tag found in the files
+        '''
+
+        if type(workers) != int or workers < 1:
+            raise ValueError
+
+        record_tags = tuple(record_tags)
+        path_filter = build_path_filter(starting_with, select, path_filter, self.separator)
+
+        function = partial(parse_records, record_tags=record_tags, concat_symbol=self.concat_symbol, path_filter=path_filter)
+        params = ["records", LEAVES_FORMAT_VERSION, repr(record_tags), self.concat_symbol, "" if path_filter == None else path_filter.signature()]
+
+        entry_names: List[str] = []
+        entries: List[List[Leaf]] = []
+
+        # Entry name, record number and leaves of the records of each tag
+        record_names: Dict[str, List[str]] = {}
+        record_numbers: Dict[str, List[int]] = {}
+        record_rows: Dict[str, List[List[Leaf]]] = {}
+
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            parsed = self._iter_parsed(
+                self.instream, function, params, _encode_records, _decode_records, cache, executor, workers, "parse_records"
+            )
+            for entry_name, (leaves, entry_records) in parsed:
+                entry_names.append(entry_name)
+                entries.append(leaves)
+                for tag, rows in entry_records.items():
+                    record_names.setdefault(tag, []).extend([entry_name]*len(rows))
+                    record_numbers.setdefault(tag, []).extend(range(1, len(rows)+1))
+                    record_rows.setdefault(tag, []).extend(rows)
+        finally:
+            if executor != None:
+                executor.shutdown()
+
+        with measure(self.metrics, "build_dataframe"):
+            paths = dict.fromkeys([path for leaves in entries for path, _ in leaves])
+            positions, header = _build_header(paths, offset, self.filler, _count_collisions(entries, offset, self.filler))
+            header_table = _build_dataframe(entries, entry_names, positions, header)
+
+            tables = {}
+            for tag, rows in record_rows.items():
+                paths = dict.fromkeys([path for leaves in rows for path, _ in leaves])
+                positions, header = _build_header(paths, 0, self.filler)
+                index = MultiIndex.from_arrays([record_names[tag], record_numbers[tag]], names=["file", "record"])
+                tables[tag] = _build_dataframe(rows, index, positions, header)
+
+        return header_table, tables
@@ -0,0 +1,48 @@
+import pytest
+import datetime
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.serialization import pkcs7
+
+
+START = datetime.datetime(2022, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+# Generates a certificate issued by the given issuer (self-signed if None), with the given additional (extension,
+# critical) pairs, returns the certificate and its key
+def _make_certificate(name="Supplier", issuer=None, ca=False, days=3650, key=None, path_length=None, extensions=()):
+    key = key if key != None else ec.generate_private_key(ec.SECP256R1())
+    subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, name)])
+    issuer_certificate, issuer_key = issuer if issuer != None else (None, key)
+    builder = (
+        x509.CertificateBuilder().subject_name(subject).public_key(key.public_key())
+        .issuer_name(issuer_certificate.subject if issuer_certificate != None else subject)
+        .serial_number(x509.random_serial_number()).not_valid_before(START).not_valid_after(START + datetime.timedelta(days=days))
+        .add_extension(x509.BasicConstraints(ca=ca, path_length=path_length), critical=True)
+        .add_extension(x509.SubjectKeyIdentifier.from_public_key(key.public_key()), critical=False)
+    )
+    for extension, critical in extensions:
+        builder = builder.add_extension(extension, critical=critical)
+    return builder.sign(issuer_key, hashes.SHA256()), key
+
+
+# Signs the content with the signer (a new self-signed certificate if None), including the given additional
+# certificates, returning the DER .p7m file
+def _sign(content, signer=None, certificates=(), options=()):
+    certificate, key = signer if signer != None else _make_certificate()
+    builder = pkcs7.PKCS7SignatureBuilder().set_data(content).add_signer(certificate, key, hashes.SHA256())
+    for additional in certificates:
+        builder = builder.add_certificate(additional)
+    return builder.sign(serialization.Encoding.DER, [pkcs7.PKCS7Options.Binary] + list(options))
+
+
+@pytest.fixture(scope="session")
+def make_certificate():
+    return _make_certificate
+
+
+@pytest.fixture(scope="session")
+def sign():
+    return _sign
@@ -0,0 +1,74 @@
+import pytest
+from ges_xml_converter.asn1_reader import read_header, skip_element, iter_octet_string, iter_signed_content, extract_signed_content
+
+
+# Builds a DER element with definite length
+def der(tag, content):
+    length = len(content)
+    if length < 0x80:
+        return bytes([tag, length]) + content
+    size = (length.bit_length() + 7)//8
+    return bytes([tag, 0x80 | size]) + length.to_bytes(size, "big") + content
+
+
+# Builds a BER element with indefinite length
+def ber(tag, content):
+    return bytes([tag, 0x80]) + content + b"\x00\x00"
+
+
+# Builds a signed file wrapping the given eContent element
+def signed_data(econtent, wrap=der):
+    encap = wrap(0x30, der(0x06, b"\x2a\x86\x48\x86\xf7\x0d\x01\x07\x01") + wrap(0xa0, econtent))
+    signed = wrap(0x30, der(0x02, b"\x01") + der(0x31, b"") + encap + der(0x31, b""))
+    return wrap(0x30, der(0x06, b"\x2a\x86\x48\x86\xf7\x0d\x01\x07\x02") + wrap(0xa0, signed))
+
+
+# Test the decoding of the short, long and indefinite lengths
+def test_read_header():
+    data = memoryview(der(0x04, b"a"*200) + ber(0x30, der(0x04, b"b")))
+    assert read_header(data, 0) == (0x04, 3, 203)
+    assert read_header(data, 203) == (0x30, 205, None)
+    assert skip_element(data, 203) == len(data)
+
+    with pytest.raises(ValueError):
+        read_header(memoryview(b"\x04\x05abc"), 0)
+
+    with pytest.raises(ValueError):
+        read_header(memoryview(b"\x04\x80abc"), 0)
+
+
+# Test that the chunks of constructed OCTET STRING are yielded in order
+def test_iter_octet_string():
+    data = memoryview(ber(0x24, der(0x04, b"ab") + der(0x24, der(0x04, b"cd") + der(0x04, b"")) + der(0x04, b"ef")))
+    assert [bytes(chunk) for chunk in iter_octet_string(data, 0)] == [b"ab", b"cd", b"", b"ef"]
+
+
+# Test the extraction of the signed content from DER and BER encoded files
+def test_extract_signed_content():
+    content = b"<a>" + b"x"*1000 + b"</a>"
+
+    assert extract_signed_content(signed_data(der(0x04, content))) == content
+    assert extract_signed_content(signed_data(der(0x04, content), wrap=ber)) == content
+
+    chunks = ber(0x24, b"".join([der(0x04, content[i:i+100]) for i in range(0, len(content), 100)]))
+    assert extract_signed_content(signed_data(chunks, wrap=ber)) == content
+    assert len(list(iter_signed_content(signed_data(chunks)))) == 11
+
+
+# Test that invalid and detached signed files raise a ValueError
+def test_extract_signed_content_exceptions():
+    with pytest.raises(ValueError):
+        extract_signed_content(b"<a>x</a>")
+
+    with pytest.raises(ValueError):
+        extract_signed_content(signed_data(der(0x04, b"<a>x</a>"))[:-20])
+
+    encap = der(0x30, der(0x06, b"\x2a\x86\x48\x86\xf7\x0d\x01\x07\x01"))
+    detached = der(0x30, der(0x06, b"\x2a\x86\x48\x86\xf7\x0d\x01\x07\x02") + der(0xa0, der(0x30, der(0x02, b"\x01") + der(0x31, b"") + encap)))
+    with pytest.raises(ValueError):
+        extract_signed_content(detached)
+
+    data = bytearray(signed_data(der(0x04, b"<a>x</a>")))
+    data[12] = 0x01
+    with pytest.raises(ValueError):
+        extract_signed_content(bytes(data))
@@ -1,9 +1,10 @@
-import pytest, pathlib
+import pytest, pathlib, tarfile, zipfile
 from io import BytesIO
 from os.path import isdir
 from random import choice
 from string import ascii_letters
-from ges_xml_converter.bytesIO_utils import path_to_BytesIO
+from ges_xml_converter.bytesIO_utils import path_to_BytesIO, path_to_lazy_BytesIO, walk_to_lazy_BytesIO, FileStreamMapping
+from ges_xml_converter.xml_parser import XML_converter
 
 
 def random_string(length):
@@ -91,3 +92,103 @@ def test_conversion_multiple_with_extension(generate_random_textfiles):
         assert result[filename].read() == expected.read()
 
 
+
+
+#Test the lazy conversion of a multiple files given the path to the folder
+def test_lazy_conversion_multiple(generate_random_textfiles):
+
+    folder, data = generate_random_textfiles
+    result = path_to_lazy_BytesIO(folder, extension=".txt")
+
+    assert isinstance(result, FileStreamMapping)
+    assert len(result) == len(data)
+
+    for filename, content in data.items():
+
+        expected = BytesIO(content.encode('utf-8'))
+        assert result[filename].read() == expected.read()
+
+    with pytest.raises(KeyError):
+        result["missing.txt"]
+
+    # The membership is checked without reading the file
+    result = FileStreamMapping({"deleted.txt": str(folder / "deleted.txt")})
+    assert "deleted.txt" in result
+    assert "missing.txt" not in result
+
+
+#Test the lazy mapping as a drop-in replacement of the BytesIO dictionary in XML_converter
+def test_lazy_conversion_with_xml_converter(tmp_path):
+
+    (tmp_path / "myfile.xml").write_text("<a><b><c>First</c></b><e>Third</e></a>")
+    parser = XML_converter(path_to_lazy_BytesIO(tmp_path, extension=".xml"), separator="|", concat_symbol="&")
+    parser.load()
+
+    assert parser.dataset == {"myfile": ['b|c|First', 'e|Third']}
+
+
+@pytest.fixture(scope="session")
+def generate_nested_folder(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("nested_folder")
+    (folder / "2022" / "01").mkdir(parents=True)
+    (folder / "2022" / "01" / "first.xml").write_bytes(b"<a><b>First</b></a>")
+    (folder / "2022" / "01" / "first.txt").write_bytes(b"Ignored")
+    (folder / "2022" / "second.xml").write_bytes(b"<a><b>Second</b></a>")
+
+    with zipfile.ZipFile(folder / "bundle.zip", "w") as archive:
+        archive.writestr("inner/third.xml", b"<a><b>Third</b></a>")
+        archive.writestr("inner/third.txt", b"Ignored")
+
+    with tarfile.open(folder / "2022" / "bundle.tar.gz", "w:gz") as archive:
+        info = tarfile.TarInfo("fourth.xml")
+        info.size = len(b"<a><b>Fourth</b></a>")
+        archive.addfile(info, BytesIO(b"<a><b>Fourth</b></a>"))
+
+    return folder
+
+
+#Test the recursive walk of a folder containing archives with include globs
+def test_walk_with_archives(generate_nested_folder):
+
+    with walk_to_lazy_BytesIO(generate_nested_folder, include=["*.xml"]) as result:
+
+        assert list(result) == ["2022/01/first.xml", "2022/bundle.tar.gz/fourth.xml", "2022/second.xml", "bundle.zip/inner/third.xml"]
+        assert result["bundle.zip/inner/third.xml"].read() == b"<a><b>Third</b></a>"
+        assert result["2022/bundle.tar.gz/fourth.xml"].read() == b"<a><b>Fourth</b></a>"
+        assert result["2022/01/first.xml"].read() == b"<a><b>First</b></a>"
+
+
+#Test that the symbolic links to folders are not followed
+def test_walk_with_folder_symlinks(tmp_path):
+    (tmp_path / "2022").mkdir()
+    (tmp_path / "2022" / "first.xml").write_bytes(b"<a><b>First</b></a>")
+    (tmp_path / "2022" / "loop").symlink_to(tmp_path, target_is_directory=True)
+    (tmp_path / "copy").symlink_to(tmp_path / "2022", target_is_directory=True)
+
+    assert list(walk_to_lazy_BytesIO(str(tmp_path))) == ["2022/first.xml"]
+
+
+#Test the recursive walk of a folder with exclude globs and without archives
+def test_walk_with_exclude(generate_nested_folder):
+
+    result = walk_to_lazy_BytesIO(generate_nested_folder, exclude=["*.txt", "2022/01/*"], archives=False, max_workers=1)
+
+    assert list(result) == ["2022/bundle.tar.gz", "2022/second.xml", "bundle.zip"]
+
+    result = walk_to_lazy_BytesIO(generate_nested_folder, include=["*.xml"], exclude=["*.zip"])
+
+    assert "bundle.zip/inner/third.xml" not in result
+
+
+#Test the recursive walk output as input of XML_converter
+def test_walk_with_xml_converter(generate_nested_folder):
+
+    parser = XML_converter(walk_to_lazy_BytesIO(generate_nested_folder, include=["*.xml"]), separator="|", concat_symbol="&")
+    parser.load()
+
+    assert parser.dataset == {
+        "2022/01/first": ["b|First"],
+        "2022/bundle.tar.gz/fourth": ["b|Fourth"],
+        "2022/second": ["b|Second"],
+        "bundle.zip/inner/third": ["b|Third"],
+    }
@@ -0,0 +1,87 @@
+import pytest
+from io import BytesIO
+from math import nan
+from pandas import DataFrame, read_csv
+from ges_xml_converter.xml_parser import XML_converter
+from ges_xml_converter.export import export, flatten_columns, write_csv, write_parquet, write_arrow
+
+
+def get_batches():
+    first = DataFrame([["x", "1"], ["y", nan]], index=["f1", "f2"], columns=[["A", "A"], ["B", "C"]])
+    second = DataFrame([["z"]], index=["f3"], columns=[["A"], ["B"]])
+    return [first, second]
+
+
+# Test the flattening of MultiIndex columns
+def test_flatten_columns():
+    batch = get_batches()[0]
+    assert flatten_columns(batch.columns) == ["A|B", "A|C"]
+    assert flatten_columns(batch.columns, separator="/") == ["A/B", "A/C"]
+
+
+# Test the streaming of batches to a .csv file, missing columns are filled
+def test_write_csv(tmp_path):
+
+    destination = str(tmp_path / "data.csv.gz")
+    assert export(get_batches(), destination) == 3
+
+    result = read_csv(destination, dtype=str)
+    assert list(result.columns) == ["file", "A|B", "A|C"]
+    assert list(result["file"]) == ["f1", "f2", "f3"]
+    assert list(result["A|B"]) == ["x", "y", "z"]
+    assert result["A|C"].isna().tolist() == [False, True, True]
+
+    buffer = BytesIO()
+    assert write_csv(get_batches()[0], buffer) == 2
+    assert buffer.getvalue().decode('utf-8').splitlines()[0] == "file,A|B,A|C"
+
+
+# Test that batches with columns outside the schema of the first batch are rejected
+def test_write_csv_exceptions(tmp_path):
+
+    batches = get_batches()[::-1]
+    with pytest.raises(ValueError):
+        write_csv(batches, str(tmp_path / "data.csv"))
+
+    with pytest.raises(ValueError):
+        export(batches, str(tmp_path / "data.xlsx"))
+
+
+# Test the dictionary encoded Parquet and Arrow exports
+def test_write_parquet_and_arrow(tmp_path):
+
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    destination = str(tmp_path / "data.parquet")
+    assert write_parquet(get_batches(), destination) == 3
+
+    table = pq.read_table(destination)
+    assert table.column_names == ["file", "A|B", "A|C"]
+    assert table.column("A|B").to_pylist() == ["x", "y", "z"]
+    assert table.column("A|C").to_pylist() == ["1", None, None]
+    assert pa.types.is_dictionary(table.schema.field("A|B").type)
+    assert pq.ParquetFile(destination).num_row_groups == 2
+
+    destination = str(tmp_path / "data.arrow")
+    assert write_arrow(get_batches(), destination, dictionary=False) == 3
+
+    table = pa.ipc.open_file(destination).read_all()
+    assert table.column("file").to_pylist() == ["f1", "f2", "f3"]
+    assert not pa.types.is_dictionary(table.schema.field("A|B").type)
+
+
+# Test the export of the XML_converter output
+def test_export_converter_output(tmp_path):
+
+    xml_mockup = "<a><b><c>First</c></b><d>Second</d></a>"
+    parser = XML_converter({"myfile.xml": BytesIO(xml_mockup.encode('utf-8'))}, separator="|", concat_symbol="&")
+    parser.load()
+    parser.inflate_tree(filler="-")
+
+    destination = str(tmp_path / "data.csv")
+    export(parser.get_pandas_dataset(), destination)
+
+    result = read_csv(destination, dtype=str)
+    assert list(result.columns) == ["file", "b|c", "d|-"]
+    assert list(result.iloc[0]) == ["myfile", "First", "Second"]
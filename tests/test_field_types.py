@@ -0,0 +1,85 @@
+import pytest
+from decimal import Decimal
+from math import nan
+from pandas import DataFrame, Series, Timestamp, isna
+from ges_xml_converter.field_types import get_field_type, get_lookup_table_types, infer_column_types, convert_values, convert_types, explode_fields
+
+
+def get_dataframe():
+    columns = [["B", "B", "B", "B", "B"], ["ImportoTotaleDocumento", "Data", "NumeroLinea", "Descrizione", "PrezzoTotale"]]
+    data = [["12.50", "2022-01-31", "1|2", "a|b", "2.0|3.5"], ["None", nan, "3", "c", nan]]
+    return DataFrame(data, index=["file1", "file2"], columns=columns)
+
+
+# Test the types derived from the FatturaPA field names
+def test_get_field_type():
+    assert get_field_type("ImportoTotaleDocumento") == "float"
+    assert get_field_type("AliquotaIVA") == "float"
+    assert get_field_type("Quantita") == "float"
+    assert get_field_type("NumeroLinea") == "int"
+    assert get_field_type("DataScadenzaPagamento") == "date"
+    assert get_field_type("DataOraConsegna") == "datetime"
+    assert get_field_type("DatiGenerali") == "str"
+    assert get_field_type("Descrizione") == "str"
+
+
+# Test the types of the lookup table labels and of the dataframe columns
+def test_infer_column_types():
+
+    types = get_lookup_table_types()
+    assert types["Ft_totale_doc"] == "float"
+    assert types["Ft_dt"] == "date"
+    assert "Ft_linee_descr" not in types
+
+    columns = [("A", "Data - -"), ("A", "B - Quantita"), ("A", "Descrizione"), "Ft_linee_prezzo_tot"]
+    assert infer_column_types(columns, filler="-") == {
+        ("A", "Data - -"): "date", ("A", "B - Quantita"): "float", "Ft_linee_prezzo_tot": "float"
+    }
+
+
+# Test the vectorized conversion of the values
+def test_convert_values():
+
+    values = Series(["1", "2.50", "None", nan])
+
+    assert convert_values(values, "float").tolist()[:2] == [1.0, 2.5]
+    assert convert_values(values, "float").isna().tolist() == [False, False, True, True]
+    assert str(convert_values(Series(["1", "None"]), "int").dtype) == "Int64"
+    assert convert_values(values, "decimal")[1] == Decimal("2.50")
+    assert convert_values(Series(["2022-01-31", "None"]), "date")[0] == Timestamp("2022-01-31")
+    assert isna(convert_values(Series(["2022-01-31", "None"]), "date")[1])
+
+    with pytest.raises(ValueError):
+        convert_values(values, "unknown")
+
+
+# Test the conversion of a dataframe with multi-valued cells
+def test_convert_types():
+
+    df = get_dataframe()
+    result = convert_types(df)
+
+    assert df.loc["file1", ("B", "ImportoTotaleDocumento")] == "12.50"
+    assert result.loc["file1", ("B", "ImportoTotaleDocumento")] == 12.5
+    assert isna(result.loc["file2", ("B", "ImportoTotaleDocumento")])
+    assert result.loc["file1", ("B", "Data")] == Timestamp("2022-01-31")
+    assert result.loc["file1", ("B", "NumeroLinea")] == [1, 2]
+    assert result.loc["file2", ("B", "NumeroLinea")] == [3]
+    assert result.loc["file1", ("B", "PrezzoTotale")] == [2.0, 3.5]
+    assert isna(result.loc["file2", ("B", "PrezzoTotale")])
+    assert result.loc["file1", ("B", "Descrizione")] == "a|b"
+
+    result = convert_types(df, types={("B", "PrezzoTotale"): "decimal"}, split_strings=True)
+    assert result.loc["file1", ("B", "PrezzoTotale")] == [Decimal("2.0"), Decimal("3.5")]
+    assert result.loc["file1", ("B", "Descrizione")] == ["a", "b"]
+    assert result.loc["file1", ("B", "NumeroLinea")] == ["1", "2"]
+
+
+# Test the explosion of the list columns
+def test_explode_fields():
+
+    result = explode_fields(convert_types(get_dataframe()), [("B", "NumeroLinea"), ("B", "PrezzoTotale")])
+
+    assert list(result.index) == ["file1", "file1", "file2"]
+    assert list(result[("B", "NumeroLinea")]) == [1, 2, 3]
+    assert list(result[("B", "ImportoTotaleDocumento")])[:2] == [12.5, 12.5]
@@ -0,0 +1,166 @@
+import pytest
+import tracemalloc
+from io import BytesIO
+from pandas import read_csv
+from ges_xml_converter.instrumentation import Metrics, measure, timed_call
+from ges_xml_converter.bytesIO_utils import path_to_lazy_BytesIO
+from ges_xml_converter.p7m_converter import group_convert_p7m_to_xml
+from ges_xml_converter.xml_parser import XML_converter
+from ges_xml_converter.pipeline import run_pipeline
+
+
+xml_mockups = {
+    "file1.xml": "<a><b><c>First</c></b><d>Second</d></a>",
+    "file2.xml": "<a><d>Third</d><e>Fourth</e></a>",
+    "file3.xml": "<a><b><c>Fifth</c><c>Sixth</c></b></a>",
+}
+
+
+def make_instream():
+    return {key: BytesIO(value.encode("utf-8")) for key, value in xml_mockups.items()}
+
+
+# Test the disabled instrumentation
+def test_measure_disabled():
+    with measure(None, "parse", "file1.xml") as record:
+        record.nbytes = 10
+    assert record.stage == ""
+    assert record.filename == None
+    assert XML_converter(make_instream()).metrics == None
+
+
+# Test the nesting of the stages
+def test_measure_nested():
+    metrics = Metrics()
+    with measure(metrics, "parse", "file1.xml", 100):
+        with measure(metrics, "prune") as record:
+            record.nbytes = 10
+
+    prune, parse = metrics.records
+    assert (parse.stage, parse.filename, parse.nbytes, parse.depth) == ("parse", "file1.xml", 100, 0)
+    assert (prune.stage, prune.filename, prune.nbytes, prune.depth) == ("prune", "file1.xml", 10, 1)
+    assert parse.seconds >= prune.seconds
+    assert parse.peak == None
+
+    # Failing stages are recorded too
+    with pytest.raises(ValueError):
+        with measure(metrics, "parse", "file2.xml"):
+            raise ValueError
+    assert metrics.records[-1].filename == "file2.xml"
+    assert metrics.records[-1].depth == 0
+
+
+# Test the tracing of the peak allocation
+def test_measure_trace_memory():
+    metrics = Metrics(trace_memory=True)
+    with measure(metrics, "parse", "file1.xml"):
+        with measure(metrics, "prune"):
+            data = bytearray(2**20)
+        del data
+        with measure(metrics, "build"):
+            pass
+
+    build, parse, prune = sorted(metrics.records, key=lambda record: record.stage)
+    assert prune.peak >= 2**20
+    assert parse.peak >= prune.peak
+    assert build.peak < 2**20
+    assert tracemalloc.is_tracing() == False
+
+
+# Test the summaries
+def test_summaries(tmp_path):
+    metrics = Metrics()
+    metrics.record("read", "file1.xml", 0.1, 100)
+    metrics.record("parse", "file1.xml", 0.2, 100)
+    metrics.record("read", "file2.xml", 0.1, 5000)
+    metrics.record("parse", "file2.xml", 3.0, 5000)
+    metrics.record("build_dataframe", None, 0.5)
+
+    summary = metrics.summary()
+    assert list(summary.index) == ["read", "parse", "build_dataframe"]
+    assert summary.loc["read", "calls"] == 2
+    assert summary.loc["parse", "seconds"] == pytest.approx(3.2)
+    assert summary.loc["parse", "bytes"] == 5100
+
+    files = metrics.file_summary()
+    assert list(files.index) == ["file2.xml", "file1.xml"]
+    assert list(files.columns) == ["read", "parse", "seconds", "bytes", "peak"]
+    assert files.loc["file2.xml", "seconds"] == pytest.approx(3.1)
+    assert files.loc["file1.xml", "bytes"] == 100
+
+    destination = str(tmp_path / "metrics.csv")
+    assert metrics.export(destination) == 2
+    assert list(read_csv(destination)["file"]) == ["file2.xml", "file1.xml"]
+
+    metrics.clear()
+    assert metrics.records == []
+
+
+# Test the timing of the worker functions
+def test_timed_call():
+    result, seconds = timed_call(sorted, [3, 1, 2])
+    assert result == [1, 2, 3]
+    assert seconds >= 0
+
+
+# Test the reading and conversion stages of the .p7m files
+def test_group_convert_metrics(tmp_path, sign):
+    for filename, content in xml_mockups.items():
+        (tmp_path / (filename + ".p7m")).write_bytes(sign(content.encode("utf-8")))
+    (tmp_path / "broken.xml.p7m").write_bytes(b"broken")
+
+    for workers in [1, 2]:
+        metrics = Metrics()
+        instream = path_to_lazy_BytesIO(str(tmp_path), ".p7m", metrics=metrics)
+        outstream = group_convert_p7m_to_xml(instream, workers=workers, metrics=metrics)
+        assert len(outstream) == 3
+
+        summary = metrics.file_summary()
+        assert sorted(summary.index) == sorted(instream)
+        assert list(summary.columns[:2]) == ["read", "p7m_to_xml"]
+        assert summary.loc["broken.xml.p7m", "bytes"] == 6
+
+
+# Test the stages of the XML_converter class
+def test_xml_converter_metrics():
+    metrics = Metrics()
+    converter = XML_converter(make_instream(), metrics=metrics)
+    converter.load()
+    df = converter.get_pandas_dataset()
+
+    summary = metrics.summary()
+    assert list(summary.index) == ["prune", "parse", "build_dataframe"]
+    assert summary.loc["parse", "calls"] == 3
+    assert summary.loc["parse", "bytes"] == sum([len(value) for value in xml_mockups.values()])
+
+    files = metrics.file_summary()
+    assert sorted(files.index) == sorted(xml_mockups)
+    assert (files["seconds"] == files["parse"]).all()
+
+    # Same results without metrics
+    reference = XML_converter(make_instream())
+    reference.load()
+    assert df.equals(reference.get_pandas_dataset())
+
+    metrics.clear()
+    batches = list(XML_converter(make_instream(), metrics=metrics).iter_pandas_datasets(batch_size=2, workers=2))
+    summary = metrics.summary()
+    assert summary.loc["scan_schema", "calls"] == 3
+    assert summary.loc["parse", "calls"] == 3
+    assert summary.loc["build_dataframe", "calls"] == len(batches)
+
+
+# Test the stages of the pipeline
+def test_pipeline_metrics(sign):
+    instream = make_instream()
+    instream["file4.xml.p7m"] = BytesIO(sign(b"<a><d>Seventh</d></a>"))
+
+    metrics = Metrics()
+    assert run_pipeline(instream, lambda batch: None, batch_size=2, metrics=metrics) == 4
+
+    summary = metrics.summary()
+    assert summary.loc["read", "calls"] == 4
+    assert summary.loc["p7m_to_xml", "calls"] == 1
+    assert summary.loc["parse", "calls"] == 4
+    assert summary.loc["build_dataframe", "calls"] == 2
+    assert list(metrics.file_summary().index).count("file4.xml.p7m") == 1
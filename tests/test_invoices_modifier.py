@@ -1,6 +1,9 @@
 from io import BytesIO
-from pandas import DataFrame
-from ges_xml_converter.invoices_modifier import modify_header, get_default_lookup_table, convert_to_lookup_table, DEFAULT_LOOKUP_TABLE
+from concurrent.futures import ThreadPoolExecutor
+from numpy import shares_memory
+from pandas import DataFrame, MultiIndex
+from ges_xml_converter.invoices_modifier import HeaderMapping, modify_header, get_default_lookup_table, convert_to_lookup_table
+from ges_xml_converter.invoices_modifier import get_lookup_table_paths, get_header_mapping, DEFAULT_LOOKUP_TABLE
 
 # Test modify with DEFAULT_LOOKUP_TABLE
 def test_modify_header_default():
@@ -64,3 +67,65 @@ def test_lookup_table_functions_by_crosscheck():
     assert type(result) == dict
 
     assert result == DEFAULT_LOOKUP_TABLE
+
+
+# Test the conversion of the lookup table keys into branches
+def test_get_lookup_table_paths():
+
+    result = get_lookup_table_paths({"A|B|C": "custom_label"}, roots=["X", "Y"])
+
+    assert result == {("X", "A", "B", "C"), ("Y", "A", "B", "C")}
+    assert ("FatturaElettronicaHeader", "DatiTrasmissione", "IdTrasmittente", "IdPaese") in get_lookup_table_paths()
+
+
+# Test modify with a lookup table containing a glob pattern
+def test_modify_header_with_pattern():
+
+    my_lookup_table = {"A|*": "any_label", "A|B": "custom_label"}
+    df = DataFrame(["first", "second"], index=["test_index", "other_index"], columns=["x"]).T
+    df.columns = [["A", "A"], ["B", "C"]]
+
+    result, new_labels = modify_header(df, lookup_table=my_lookup_table)
+
+    assert list(result.columns) == ["custom_label", "any_label"]
+    assert new_labels == {}
+
+
+# Test the reuse of the compiled header mapping and the in place renaming
+def test_header_mapping_reuse():
+
+    my_lookup_table = {"A|B": "custom_label"}
+    mapping = get_header_mapping(my_lookup_table, filler="#")
+
+    assert get_header_mapping(dict(my_lookup_table), filler="#") is mapping
+    assert get_header_mapping(my_lookup_table, filler=" ") is not mapping
+
+    for _ in range(2):
+        df = DataFrame([[1, 2, 3]], index=["test_index"], columns=[["A", "A", "X"], ["B", "C", "Y"], ["#", "#", "Z"]])
+        data = df.values
+
+        result, new_labels = modify_header(df, filler="#", lookup_table=my_lookup_table)
+
+        assert result is df
+        assert shares_memory(result.values, data)
+        assert list(result.columns) == ["custom_label", "unk_1", "unk_2"]
+        assert new_labels == {"A|C": "unk_1", "X|Y|Z": "unk_2"}
+    
+    assert len(mapping.signatures) == 3
+
+
+# Test the mapping shared between threads and the limit of the known signatures
+def test_header_mapping_threads():
+
+    mapping = HeaderMapping({"A|B": "custom_label"}, filler="#", max_signatures=50)
+
+    def map_batch(i):
+        columns = MultiIndex.from_tuples([("A", "B")] + [("X{}".format(i), "Y{}".format(j)) for j in range(10)])
+        header, _ = mapping.map_columns(columns)
+        return header
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        headers = list(executor.map(map_batch, range(200)))
+
+    assert all([header == ["custom_label"] + ["unk_{}".format(j+1) for j in range(10)] for header in headers])
+    assert len(mapping.signatures) <= 50
@@ -0,0 +1,170 @@
+import pytest
+from io import BytesIO
+from collections.abc import Mapping
+from base64 import b64encode
+from lxml import etree
+from ges_xml_converter.p7m_converter import group_convert_p7m_to_xml, sniff_p7m_format, normalize_xml_encoding, _to_der
+from ges_xml_converter.p7m_converter import p7m_to_xml, get_p7m_backend, P7M_BACKENDS, p7m_to_xml_verified
+from ges_xml_converter.signature import TrustStore
+from ges_xml_converter.xml_parser import XML_converter, MAX_CHUNK_SIZE
+
+
+# Test if exceptions are correctly raised by the group conversion function
+def test_group_convert_exceptions():
+    with pytest.raises(ValueError):
+        group_convert_p7m_to_xml({})
+
+    with pytest.raises(ValueError):
+        group_convert_p7m_to_xml({"test.xml.p7m": BytesIO(b"test")}, workers=0)
+
+
+# Test that the exceptions raised by the worker processes are delivered to the handler of the caller, in order
+def test_group_convert_exception_handler_with_workers():
+
+    handled = []
+    def handler(exception, filename):
+        handled.append(filename)
+
+    instream = {"file_{}.xml.p7m".format(i): BytesIO(b"invalid") for i in range(6)}
+    outstream = group_convert_p7m_to_xml(instream, exception_handler=handler, workers=2)
+
+    assert outstream == {}
+    assert handled == list(instream)
+
+
+# Test the detection of the .p7m format from the first bytes
+def test_sniff_p7m_format():
+    assert sniff_p7m_format(b"\x30\x80\x06\x09") == "der"
+    assert sniff_p7m_format(b"MIAGCSqGSIb3DQEHAqCA") == "base64"
+    assert sniff_p7m_format(b"-----BEGIN PKCS7-----\nMIAG") == "base64"
+
+
+# Test the decoding of base64 .p7m files, with and without PEM armor
+def test_to_der():
+    der = b"\x30\x03\x02\x01\x01"
+    assert _to_der(der) is der
+    assert _to_der(b64encode(der)) == der
+    assert _to_der(b"-----BEGIN PKCS7-----\n" + b64encode(der) + b"\n-----END PKCS7-----\n") == der
+
+
+# Test that only the files declaring a non UTF-8 encoding are converted
+def test_normalize_xml_encoding():
+
+    xml_data = '<?xml version="1.0"?><a>è</a>'.encode('utf-8')
+    assert normalize_xml_encoding(xml_data) is xml_data
+
+    xml_data = '<?xml version="1.0" encoding="UTF-8"?><a>è</a>'.encode('utf-8')
+    assert normalize_xml_encoding(xml_data) is xml_data
+
+    xml_data = "<?xml version='1.0' encoding='ISO-8859-1'?><a>è</a>".encode('latin-1')
+    result = normalize_xml_encoding(xml_data)
+    assert result == "<?xml version='1.0' encoding='UTF-8'?><a>è</a>".encode('utf-8')
+    assert etree.fromstring(result).text == "è"
+
+    xml_data = '<?xml version="1.0" encoding="UTF-16"?><a>è</a>'.encode('utf-16')
+    assert normalize_xml_encoding(xml_data) == '<?xml version="1.0" encoding="UTF-8"?><a>è</a>'.encode('utf-8')
+
+
+# Test that the files that are not valid UTF-8, without declaration or declaring UTF-8, are read as windows-1252
+def test_normalize_xml_encoding_fallback(sign):
+    xml_data = "<a>Però €</a>".encode('windows-1252')
+    assert normalize_xml_encoding(xml_data) == "<a>Però €</a>".encode('utf-8')
+
+    xml_data = '<?xml version="1.0" encoding="utf-8"?><a>è</a>'.encode('windows-1252')
+    assert normalize_xml_encoding(xml_data) == '<?xml version="1.0" encoding="UTF-8"?><a>è</a>'.encode('utf-8')
+
+    xml_data = "<a>Però</a>".encode('utf-8')*10**5
+    assert normalize_xml_encoding(xml_data) is xml_data
+
+    signed = sign("<a><b>Però</b></a>".encode('windows-1252'))
+    parser = XML_converter(group_convert_p7m_to_xml({"file.xml.p7m": BytesIO(signed)}))
+    parser.load()
+    assert parser.leaves == {"file": [(("b",), "Però")]}
+
+
+# Test the conversion of DER and base64 signed files with the default backend
+def test_p7m_to_xml(sign):
+    xml_data = '<?xml version="1.0" encoding="UTF-8"?><a>è</a>'.encode('utf-8')
+    p7m_data = sign(xml_data)
+
+    assert p7m_to_xml(BytesIO(p7m_data)).read() == xml_data
+    assert p7m_to_xml(BytesIO(b64encode(p7m_data))).read() == xml_data
+    assert p7m_to_xml(BytesIO(p7m_data), backend=lambda der: b"<b/>").read() == b"<b/>"
+
+
+# Test the selection of the unwrapping backends
+def test_get_p7m_backend():
+    assert get_p7m_backend("asn1") == P7M_BACKENDS["asn1"]
+    assert get_p7m_backend(len) == len
+
+    with pytest.raises(ValueError):
+        get_p7m_backend("unknown")
+
+    with pytest.raises(ValueError):
+        group_convert_p7m_to_xml({"test.xml.p7m": BytesIO(b"test")}, backend="unknown")
+
+
+# Test the group conversion of signed files, with and without workers
+def test_group_convert_p7m_to_xml(sign):
+    instream = {"file_{}.xml.p7m".format(i): "<a>{}</a>".format(i).encode('utf-8') for i in range(4)}
+    instream = {filename: sign(content) for filename, content in instream.items()}
+
+    for workers in [1, 2]:
+        outstream = group_convert_p7m_to_xml({k: BytesIO(v) for k, v in instream.items()}, workers=workers)
+        assert {k: v.read() for k, v in outstream.items()} == {"file_{}.xml".format(i): "<a>{}</a>".format(i).encode('utf-8') for i in range(4)}
+
+
+# Test that with workers the signed files are read and converted in bounded chunks, not all up front
+def test_group_convert_p7m_to_xml_bounded_with_workers(sign):
+
+    p7m_data = sign(b"<a>content</a>")
+
+    class CountingMapping(Mapping):
+        def __init__(self, n):
+            self.filenames = ["file{:04d}.xml.p7m".format(i) for i in range(n)]
+            self.reads = 0
+        def __getitem__(self, filename):
+            self.reads += 1
+            return BytesIO(p7m_data if filename != "file0000.xml.p7m" else b"invalid")
+        def __iter__(self):
+            return iter(self.filenames)
+        def __len__(self):
+            return len(self.filenames)
+
+    instream = CountingMapping(1000)
+    reads = []
+    def handler(exception, filename):
+        reads.append(instream.reads)
+
+    outstream = group_convert_p7m_to_xml(instream, exception_handler=handler, workers=2)
+
+    assert reads[0] <= 5*MAX_CHUNK_SIZE
+    assert instream.reads == 1000
+    assert len(outstream) == 999
+
+
+# Test that the verification status is reported alongside the decoded files
+def test_group_convert_p7m_to_xml_verification(sign, make_certificate):
+    signer = make_certificate()
+    trust_store = TrustStore([signer[0]])
+
+    instream = {"file_{}.xml.p7m".format(i): sign("<a>{}</a>".format(i).encode('utf-8'), signer) for i in range(4)}
+    instream["untrusted.xml.p7m"] = sign(b"<a>x</a>")
+    instream["invalid.xml.p7m"] = b"invalid"
+
+    stream, status = p7m_to_xml_verified(BytesIO(instream["file_0.xml.p7m"]), trust_store)
+    assert stream.read() == b"<a>0</a>"
+    assert status.valid == True
+
+    for workers in [1, 2]:
+        statuses, exceptions = {}, []
+        outstream = group_convert_p7m_to_xml(
+            {k: BytesIO(v) for k, v in instream.items()},
+            workers=workers,
+            trust_store=trust_store,
+            exception_handler=lambda exception, filename: exceptions.append(filename),
+            verification_handler=lambda status, filename: statuses.update({filename: status.status}),
+        )
+        assert list(outstream) == ["file_{}.xml".format(i) for i in range(4)] + ["untrusted.xml"]
+        assert statuses == {**{"file_{}.xml.p7m".format(i): "valid" for i in range(4)}, "untrusted.xml.p7m": "untrusted"}
+        assert exceptions == ["invalid.xml.p7m"]
@@ -0,0 +1,81 @@
+import os
+from io import BytesIO
+from ges_xml_converter.parse_cache import ParseCache
+from ges_xml_converter.xml_parser import XML_converter, LEAVES_FORMAT_VERSION
+from ges_xml_converter.asn1_reader import extract_signed_content
+from ges_xml_converter.p7m_converter import NORMALIZATION_VERSION, group_convert_p7m_to_xml
+
+
+# Test the storage and retrieval of the cache entries
+def test_put_and_get(tmp_path):
+    cache = ParseCache(tmp_path / "cache")
+
+    key = ParseCache.make_key(b"data", "param")
+    assert key != ParseCache.make_key(b"data", "other")
+    assert cache.get(key) == None
+
+    cache.put(key, b"payload")
+    assert cache.get(key) == b"payload"
+
+    assert ParseCache(tmp_path / "cache").get(key) == b"payload"
+
+
+# Test the eviction of the least recently used entries
+def test_lru_eviction(tmp_path):
+    cache = ParseCache(tmp_path / "cache", max_size=100)
+
+    keys = [ParseCache.make_key(str(i).encode('utf-8')) for i in range(4)]
+    for idx, key in enumerate(keys[:3]):
+        cache.put(key, b"x"*30)
+        os.utime(cache._path(key), (idx, idx))
+
+    assert cache.get(keys[0]) == b"x"*30
+    cache.put(keys[3], b"x"*30)
+
+    assert cache.get(keys[1]) == None
+    for key in [keys[0], keys[2], keys[3]]:
+        assert cache.get(key) == b"x"*30
+
+
+# Test that the XML_converter loading uses the cached leaves
+def test_xml_converter_with_cache(tmp_path):
+    cache = ParseCache(tmp_path / "cache")
+    xml_mockup = "<a><b><c>First</c><c>Second</c></b></a>".encode('utf-8')
+
+    parser = XML_converter({"myfile.xml": BytesIO(xml_mockup)}, separator="|", concat_symbol="&")
+    parser.load(cache=cache)
+    assert parser.dataset == {"myfile": ['b|c|First&Second']}
+
+    key = ParseCache.make_key(xml_mockup, "leaves", LEAVES_FORMAT_VERSION, "&", "")
+    cache.put(key, b'[[["b","c"],"Cached"]]')
+
+    for workers in [1, 2]:
+        parser = XML_converter({"myfile.xml": BytesIO(xml_mockup)}, separator="|", concat_symbol="&")
+        parser.load(workers=workers, cache=cache)
+        assert parser.dataset == {"myfile": ['b|c|Cached']}
+
+    # The entries written without the format version are not used
+    cache = ParseCache(tmp_path / "unversioned")
+    cache.put(ParseCache.make_key(xml_mockup, "leaves", "&", ""), b'[[["b","c"],"Stale"]]')
+    parser = XML_converter({"myfile.xml": BytesIO(xml_mockup)}, separator="|", concat_symbol="&")
+    parser.load(cache=cache)
+    assert parser.dataset == {"myfile": ['b|c|First&Second']}
+
+
+# Test that the p7m conversion uses the cached .xml files
+def test_p7m_conversion_with_cache(tmp_path):
+    cache = ParseCache(tmp_path / "cache")
+    cache.put(ParseCache.make_key(b"signed", "p7m", "asn1", NORMALIZATION_VERSION), b"<a>Cached</a>")
+
+    for workers in [1, 2]:
+        outstream = group_convert_p7m_to_xml({"myfile.xml.p7m": BytesIO(b"signed")}, workers=workers, cache=cache)
+        assert outstream["myfile.xml"].read() == b"<a>Cached</a>"
+
+    # The entries of a backend are not used by the others
+    errors = []
+    outstream = group_convert_p7m_to_xml(
+        {"myfile.xml.p7m": BytesIO(b"signed")}, cache=cache, backend=extract_signed_content,
+        exception_handler=lambda exception, filename: errors.append(filename),
+    )
+    assert outstream == {}
+    assert errors == ["myfile.xml.p7m"]
@@ -0,0 +1,72 @@
+from ges_xml_converter.path_index import PathIndex, PathFilter, escape_tag
+
+
+# Test the lookup of exact and wildcard branches
+def test_path_index_get():
+
+    index = PathIndex({("A", "B"): "exact", ("A", "*"): "pattern", ("C",): "short"})
+
+    assert len(index) == 3
+    assert index.get(("A", "B")) == "exact"
+    assert index.get(("A", "D")) == "pattern"
+    assert index.get(("A",)) == None
+    assert index.get(("A", "B", "C"), "missing") == "missing"
+    assert ("C",) in index
+    assert ("D",) not in index
+
+
+# Test the incremental walk of the index
+def test_path_index_step():
+
+    index = PathIndex([("A", "B*"), ("A", "Bar")])
+
+    nodes = index.step((index.root,), "A")
+    assert len(nodes) == 1
+    assert len(index.step(nodes, "Bar")) == 2
+    assert index.step(nodes, "Foo") == ()
+
+
+# Test the include and exclude prefixes of a path filter
+def test_path_filter_accepts():
+
+    path_filter = PathFilter(include=[("A",), ("B", "C")], exclude=[("A", "D")])
+
+    assert path_filter.accepts(("A", "B", "C"))
+    assert path_filter.accepts(("B", "C", "E"))
+    assert not path_filter.accepts(("B", "E"))
+    assert not path_filter.accepts(("A", "D", "E"))
+    assert not path_filter.accepts(("B",))
+    assert PathFilter().accepts(("X", "Y"))
+
+
+# Test the subtree rejection during a walk
+def test_path_filter_step():
+
+    path_filter = PathFilter(include=[("A", "B")])
+
+    state = path_filter.start()
+    assert path_filter.step(state, "X") == None
+
+    state = path_filter.step(state, "A")
+    assert state != None and not PathFilter.is_accepted(state)
+
+    state = path_filter.step(state, "B")
+    assert PathFilter.is_accepted(state)
+
+
+# Test the filter equivalent to a starting condition, also with special characters
+def test_path_filter_from_starting_with():
+
+    path_filter = PathFilter.from_starting_with("Fattura")
+    assert path_filter.accepts(("FatturaElettronicaBody", "X"))
+    assert not path_filter.accepts(("Other", "X"))
+
+    assert escape_tag("a*b?") == "a[*]b[?]"
+    assert PathFilter.from_starting_with("a*").accepts(("a*b",))
+    assert not PathFilter.from_starting_with("a*").accepts(("ab",))
+
+    path_filter = PathFilter.from_starting_with("FatturaElettronicaBody#@#Dati")
+    assert path_filter.accepts(("FatturaElettronicaBody", "DatiGenerali", "X"))
+    assert not path_filter.accepts(("FatturaElettronicaBody", "Allegati", "X"))
+    assert not path_filter.accepts(("FatturaElettronicaBodyX", "DatiGenerali", "X"))
+    assert PathFilter.from_starting_with("b|c", separator="|").accepts(("b", "cc"))
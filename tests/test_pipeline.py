@@ -0,0 +1,124 @@
+import pytest
+import asyncio
+import tarfile
+import zipfile
+from io import BytesIO
+from pandas import concat
+from ges_xml_converter.bytesIO_utils import walk_to_lazy_BytesIO
+from ges_xml_converter.xml_parser import XML_converter
+from ges_xml_converter.pipeline import aiter_pandas_datasets, run_pipeline
+
+
+xml_mockups = {
+    "file1.xml": "<a><b><c>First</c></b><d>Second</d></a>",
+    "file2.xml": "<a><d>Third</d><e>Fourth</e></a>",
+    "file3.xml": "<a><b><c>Fifth</c><c>Sixth</c></b></a>",
+}
+
+
+def collect(instream, **kwargs):
+    async def main():
+        return [batch async for batch in aiter_pandas_datasets(instream, **kwargs)]
+    return asyncio.run(main())
+
+
+# Test that the pipeline gives the same dataframe of the XML_converter class, with .xml and .xml.p7m files
+def test_aiter_pandas_datasets(sign):
+
+    parser = XML_converter({k: BytesIO(v.encode('utf-8')) for k, v in xml_mockups.items()}, separator="|", concat_symbol="&")
+    parser.inflate_tree(filler="-")
+    parser.load()
+    expected = parser.get_pandas_dataset()
+    schema = parser.scan_schema()
+
+    instream = {
+        "file1.xml": BytesIO(xml_mockups["file1.xml"].encode('utf-8')),
+        "file2.xml.p7m": BytesIO(sign(xml_mockups["file2.xml"].encode('utf-8'))),
+        "file3.xml.p7m": BytesIO(sign(xml_mockups["file3.xml"].encode('utf-8'))),
+    }
+
+    for workers in [1, 2]:
+        batches = collect(instream, batch_size=2, schema=schema, concat_symbol="&", filler="-", workers=workers, queue_size=1)
+        assert [list(batch.index) for batch in batches] == [["file1", "file2"], ["file3"]]
+        result = concat(batches)
+        assert list(result.columns) == list(expected.columns)
+        assert result.fillna("").values.tolist() == expected.fillna("").values.tolist()
+
+    batches = collect(instream, batch_size=2, concat_symbol="&")
+    assert list(batches[1].columns) == [("b", "c")]
+
+
+# Test that the failed files are delivered to the exception handler and skipped
+def test_aiter_pandas_datasets_exceptions():
+
+    handled = []
+    instream = {
+        "file1.xml": BytesIO(xml_mockups["file1.xml"].encode('utf-8')),
+        "file2.xml.p7m": BytesIO(b"invalid"),
+        "file3.xml": BytesIO(b"<a><b>"),
+    }
+
+    batches = collect(instream, exception_handler=lambda exception, filename: handled.append(filename))
+    assert handled == ["file2.xml.p7m", "file3.xml"]
+    assert list(concat(batches).index) == ["file1"]
+
+    with pytest.raises(ValueError):
+        collect(instream, batch_size=0)
+
+    with pytest.raises(ValueError):
+        collect(instream, queue_size=0)
+
+
+# Test that a slow sink stops the reading of the files (backpressure)
+def test_run_pipeline_backpressure():
+
+    class CountingStream(BytesIO):
+        reads = 0
+        def read(self, *args):
+            CountingStream.reads += 1
+            return super().read(*args)
+
+    instream = {"file{}.xml".format(i): CountingStream("<a><b>{}</b></a>".format(i).encode('utf-8')) for i in range(200)}
+    reads = []
+
+    async def sink(batch):
+        reads.append(CountingStream.reads)
+        await asyncio.sleep(0.01)
+
+    nrows = run_pipeline(instream, sink, batch_size=1, queue_size=2)
+    assert nrows == 200
+    assert max([reads[i] - i for i in range(len(reads))]) <= 10
+
+    frames = []
+    assert run_pipeline(instream, frames.append, batch_size=50) == 200
+    assert len(frames) == 4
+
+
+# Test the pipeline on the members of several archives, read from the same lazy mapping
+def test_run_pipeline_archives(tmp_path):
+    for name in ["first.tar.gz", "second.zip", "third.tar.gz"]:
+        contents = {"{}{:03d}.xml".format(name[0], i): "<a><b>{}</b></a>".format(i).encode("utf-8") for i in range(40)}
+        if name.endswith(".zip"):
+            with zipfile.ZipFile(tmp_path / name, "w") as archive:
+                for member, content in contents.items():
+                    archive.writestr(member, content)
+        else:
+            # Members stored out of order, read in archive order
+            with tarfile.open(tmp_path / name, "w:gz") as archive:
+                for member, content in reversed(list(contents.items())):
+                    info = tarfile.TarInfo(member)
+                    info.size = len(content)
+                    archive.addfile(info, BytesIO(content))
+
+    errors = []
+    batches = []
+    with walk_to_lazy_BytesIO(str(tmp_path)) as instream:
+        assert list(instream)[:40] == ["first.tar.gz/f{:03d}.xml".format(i) for i in reversed(range(40))]
+        nrows = run_pipeline(
+            instream, batches.append, batch_size=7, queue_size=32, exception_handler=lambda exception, filename: errors.append(filename)
+        )
+
+    assert errors == []
+    assert nrows == 120
+    ordered = [str(i) for i in range(40)]
+    assert concat(batches)[("b",)].tolist() == ordered[::-1] + ordered + ordered[::-1]
@@ -0,0 +1,259 @@
+import pytest
+import datetime
+from cryptography import x509
+from cryptography.x509.oid import ExtendedKeyUsageOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.serialization import pkcs7
+from ges_xml_converter.asn1_reader import get_content, get_element, iter_children, split_signed_data
+from ges_xml_converter.signature import TrustStore, SignatureStatus, verify_signed_data
+
+
+@pytest.fixture(scope="module")
+def pki(make_certificate):
+    root = make_certificate("Root CA", ca=True)
+    intermediate = make_certificate("Intermediate CA", issuer=root, ca=True)
+    signer = make_certificate("Supplier", issuer=intermediate)
+    return root, intermediate, signer
+
+
+# Test the verification of a file signed through an intermediate certificate
+def test_verify_signed_data(pki, sign, make_certificate):
+    root, intermediate, signer = pki
+    trust_store = TrustStore([root[0]])
+
+    status = verify_signed_data(sign(b"<a>x</a>", signer, [intermediate[0]]), trust_store)
+    assert status.valid == True
+    assert status.signer == "CN=Supplier"
+    assert status.signing_time != None
+
+    status = verify_signed_data(sign(b"<a>x</a>", signer), TrustStore([root[0]]))
+    assert status.status == "untrusted"
+
+    status = verify_signed_data(sign(b"<a>x</a>", signer, [intermediate[0]]), TrustStore([make_certificate("Other CA", ca=True)[0]]))
+    assert status.status == "untrusted"
+
+    assert verify_signed_data(sign(b"<a>x</a>", root), trust_store).valid == True
+
+
+# Test that the chain of each signer certificate is built only once
+def test_trust_store_cache(pki, sign):
+    root, intermediate, signer = pki
+    trust_store = TrustStore([root[0]])
+
+    for i in range(5):
+        assert verify_signed_data(sign("<a>{}</a>".format(i).encode('utf-8'), signer, [intermediate[0]]), trust_store).valid == True
+
+    assert trust_store.misses == 1
+    assert trust_store.hits == 4
+
+    for i in range(2):
+        assert verify_signed_data(sign(b"<a>x</a>", signer), trust_store).valid == True
+    assert trust_store.misses == 1
+
+
+# Test that tampered content and signatures are detected
+def test_verify_invalid_signature(pki, sign):
+    root, intermediate, signer = pki
+    trust_store = TrustStore([root[0]])
+
+    der_data = sign(b"<a>amount 100</a>", signer, [intermediate[0]])
+    status = verify_signed_data(der_data.replace(b"amount 100", b"amount 900"), trust_store)
+    assert status.status == "invalid"
+    assert status.signer == "CN=Supplier"
+
+    der_data = sign(b"<a>x</a>", signer, [intermediate[0]], [pkcs7.PKCS7Options.NoAttributes])
+    assert verify_signed_data(der_data, trust_store).valid == True
+    assert verify_signed_data(der_data.replace(b"<a>x</a>", b"<a>y</a>"), trust_store).status == "invalid"
+
+    assert verify_signed_data(b"\x30\x03\x02\x01\x01", trust_store).status == "error"
+
+
+# Test the verification of RSA signatures without signed attributes
+def test_verify_rsa_signature(pki, sign, make_certificate):
+    root = pki[0]
+    signer = make_certificate("RSA Supplier", issuer=root, key=rsa.generate_private_key(public_exponent=65537, key_size=2048))
+    trust_store = TrustStore([root[0]])
+
+    assert verify_signed_data(sign(b"<a>x</a>", signer), trust_store).valid == True
+    assert verify_signed_data(sign(b"<a>x</a>", signer, options=[pkcs7.PKCS7Options.NoAttributes]), trust_store).valid == True
+
+
+# Test that the chain must be valid at the signing time
+def test_verify_expired_certificate(pki, sign, make_certificate):
+    root = pki[0]
+    signer = make_certificate("Expired Supplier", issuer=root, days=10)
+    trust_store = TrustStore([root[0]])
+
+    status = verify_signed_data(sign(b"<a>x</a>", signer), trust_store)
+    assert status.status == "expired"
+
+    der_data = sign(b"<a>x</a>", signer, options=[pkcs7.PKCS7Options.NoAttributes])
+    assert verify_signed_data(der_data, trust_store).status == "expired"
+    assert verify_signed_data(der_data, trust_store, signer[0].not_valid_before_utc + datetime.timedelta(days=1)).valid == True
+
+
+# Generates a key usage extension with only the given usages
+def key_usage(**usages):
+    names = [
+        "digital_signature", "content_commitment", "key_encipherment", "data_encipherment", "key_agreement",
+        "key_cert_sign", "crl_sign", "encipher_only", "decipher_only",
+    ]
+    return x509.KeyUsage(**{name: usages.get(name, False) for name in names})
+
+
+# Test that the key usages of the chain are enforced
+def test_verify_key_usage(pki, sign, make_certificate):
+    root, intermediate, _ = pki
+    trust_store = TrustStore([root[0]])
+
+    signer = make_certificate("Encryption Supplier", issuer=intermediate, extensions=[(key_usage(key_encipherment=True), True)])
+    status = verify_signed_data(sign(b"<a>x</a>", signer, [intermediate[0]]), trust_store)
+    assert status.status == "untrusted"
+    assert "digital signatures" in status.message
+
+    signer = make_certificate("Qualified Supplier", issuer=intermediate, extensions=[(key_usage(content_commitment=True), True)])
+    assert verify_signed_data(sign(b"<a>x</a>", signer, [intermediate[0]]), trust_store).valid == True
+
+    issuer = make_certificate("Signing CA", issuer=root, ca=True, extensions=[(key_usage(digital_signature=True, crl_sign=True), True)])
+    signer = make_certificate("Supplier", issuer=issuer)
+    assert verify_signed_data(sign(b"<a>x</a>", signer, [issuer[0]]), trust_store).status == "untrusted"
+
+    issuer = make_certificate("Issuing CA", issuer=root, ca=True, extensions=[(key_usage(key_cert_sign=True), True)])
+    signer = make_certificate("Supplier", issuer=issuer)
+    assert verify_signed_data(sign(b"<a>x</a>", signer, [issuer[0]]), trust_store).valid == True
+
+
+# Test that the extended key usages of the signer certificate are enforced
+def test_verify_extended_key_usage(pki, sign, make_certificate):
+    root, intermediate, _ = pki
+    trust_store = TrustStore([root[0]])
+
+    server = x509.ExtendedKeyUsage([ExtendedKeyUsageOID.SERVER_AUTH])
+    signer = make_certificate("Web Server", issuer=intermediate, extensions=[(server, False)])
+    status = verify_signed_data(sign(b"<a>x</a>", signer, [intermediate[0]]), trust_store)
+    assert status.status == "untrusted"
+    assert "signing" in status.message
+
+    email = x509.ExtendedKeyUsage([ExtendedKeyUsageOID.SERVER_AUTH, ExtendedKeyUsageOID.EMAIL_PROTECTION])
+    signer = make_certificate("Mail Supplier", issuer=intermediate, extensions=[(email, False)])
+    assert verify_signed_data(sign(b"<a>x</a>", signer, [intermediate[0]]), trust_store).valid == True
+
+    with pytest.raises(ValueError):
+        trust_store.verify_certificate(trust_store.load_certificate(signer[0].public_bytes(serialization.Encoding.DER)), purpose="other")
+
+
+# Test that the path length constraints are enforced
+def test_verify_path_length(sign, make_certificate):
+    root = make_certificate("Root CA", ca=True, path_length=0)
+    intermediate = make_certificate("Intermediate CA", issuer=root, ca=True)
+    trust_store = TrustStore([root[0]])
+
+    signer = make_certificate("Supplier", issuer=intermediate)
+    assert verify_signed_data(sign(b"<a>x</a>", signer, [intermediate[0]]), trust_store).status == "untrusted"
+    assert verify_signed_data(sign(b"<a>x</a>", make_certificate("Supplier", issuer=root)), trust_store).valid == True
+
+    root = make_certificate("Root CA", ca=True)
+    intermediate = make_certificate("Intermediate CA", issuer=root, ca=True, path_length=0)
+    issuer = make_certificate("Issuing CA", issuer=intermediate, ca=True)
+    signer = make_certificate("Supplier", issuer=issuer)
+    trust_store = TrustStore([root[0]])
+    assert verify_signed_data(sign(b"<a>x</a>", signer, [intermediate[0], issuer[0]]), trust_store).status == "untrusted"
+    assert verify_signed_data(sign(b"<a>x</a>", make_certificate("Supplier", issuer=intermediate), [intermediate[0]]), trust_store).valid == True
+
+
+# Test that the certificates with unknown critical extensions are rejected
+def test_verify_unknown_critical_extension(pki, sign, make_certificate):
+    root, intermediate, _ = pki
+    trust_store = TrustStore([root[0]])
+    unknown = x509.UnrecognizedExtension(x509.ObjectIdentifier("1.3.6.1.4.1.99999.1"), b"\x05\x00")
+
+    signer = make_certificate("Supplier", issuer=intermediate, extensions=[(unknown, True)])
+    status = verify_signed_data(sign(b"<a>x</a>", signer, [intermediate[0]]), trust_store)
+    assert status.status == "untrusted"
+    assert "critical extension" in status.message
+
+    signer = make_certificate("Supplier", issuer=intermediate, extensions=[(unknown, False)])
+    assert verify_signed_data(sign(b"<a>x</a>", signer, [intermediate[0]]), trust_store).valid == True
+
+    issuer = make_certificate("Issuing CA", issuer=root, ca=True, extensions=[(unknown, True)])
+    signer = make_certificate("Supplier", issuer=issuer)
+    assert verify_signed_data(sign(b"<a>x</a>", signer, [issuer[0]]), trust_store).status == "untrusted"
+
+
+# Encodes a DER element with a definite length
+def der(tag, content):
+    if len(content) < 0x80:
+        return bytes([tag, len(content)]) + content
+    length = len(content).to_bytes((len(content).bit_length() + 7)//8, "big")
+    return bytes([tag, 0x80 | len(length)]) + length + content
+
+
+# Adds to the single signer of a signed file an RFC 3161 timestamp token of its signature, signed by the given
+# timestamping authority and certifying the given time
+def add_timestamp(sign, der_data, tsa, time, imprint=None):
+    data = memoryview(der_data)
+    signer_info = split_signed_data(data)[1][0]
+    children = list(iter_children(signer_info, 0))
+    signature = bytes(get_content(signer_info, children[5]))
+
+    digest = hashes.Hash(hashes.SHA256())
+    digest.update(signature)
+    imprint = imprint if imprint != None else digest.finalize()
+    tst_info = der(0x30, b"".join([
+        der(0x02, b"\x01"), der(0x06, b"\x2a\x03"),
+        der(0x30, der(0x30, der(0x06, b"\x60\x86\x48\x01\x65\x03\x04\x02\x01")) + der(0x04, imprint)),
+        der(0x02, b"\x01"), der(0x18, time.strftime("%Y%m%d%H%M%SZ").encode("ascii")),
+    ]))
+    token = sign(tst_info, tsa)
+    attribute = der(0x30, der(0x06, b"\x2a\x86\x48\x86\xf7\x0d\x01\x09\x10\x02\x0e") + der(0x31, token))
+    signer_info = der(0x30, bytes(get_content(signer_info, 0)) + der(0xa1, attribute))
+
+    # ContentInfo -> [0] -> SignedData, whose last element is the set of the SignerInfo
+    oid, explicit = list(iter_children(data, 0))
+    signed_data = next(iter_children(data, explicit))
+    fields = [bytes(get_element(data, child)) for child in iter_children(data, signed_data)][:-1]
+    signed_data = der(0x30, b"".join(fields) + der(0x31, signer_info))
+    return der(0x30, bytes(get_element(data, oid)) + der(0xa0, signed_data))
+
+
+# Test that the certificate chain is verified at the time certified by a trusted timestamp token, not at the
+# signing time declared by the signer
+def test_verify_timestamp(pki, sign, make_certificate):
+    root, intermediate, _ = pki
+    trust_store = TrustStore([root[0]])
+    signer = make_certificate("Expired Supplier", issuer=intermediate, days=10)
+    usage = x509.ExtendedKeyUsage([ExtendedKeyUsageOID.TIME_STAMPING])
+    tsa = make_certificate("Timestamping Authority", issuer=root, extensions=[(usage, True)])
+    signed_at = signer[0].not_valid_before_utc + datetime.timedelta(days=1)
+
+    der_data = sign(b"<a>x</a>", signer, [intermediate[0]])
+    status = verify_signed_data(der_data, trust_store)
+    assert status.status == "expired"
+    assert status.timestamp == None
+    assert verify_signed_data(der_data, trust_store, signed_at).valid == True
+
+    status = verify_signed_data(add_timestamp(sign, der_data, tsa, signed_at), trust_store)
+    assert status.valid == True
+    assert status.timestamp == signed_at
+
+    assert verify_signed_data(add_timestamp(sign, der_data, tsa, signed_at + datetime.timedelta(days=30)), trust_store).status == "expired"
+    assert verify_signed_data(add_timestamp(sign, der_data, tsa, signed_at, bytes(32)), trust_store).status == "expired"
+    assert verify_signed_data(add_timestamp(sign, der_data, make_certificate("Supplier", issuer=root), signed_at), trust_store).status == "expired"
+
+    untrusted = make_certificate("Other Authority", extensions=[(usage, True)])
+    assert verify_signed_data(add_timestamp(sign, der_data, untrusted, signed_at), trust_store).status == "expired"
+
+
+# Test the loading of the trust anchors from PEM and DER files
+def test_trust_store_from_path(pki, tmp_path):
+    root, intermediate, _ = pki
+    (tmp_path / "bundle.pem").write_bytes(root[0].public_bytes(serialization.Encoding.PEM) + intermediate[0].public_bytes(serialization.Encoding.PEM))
+    (tmp_path / "root.der").write_bytes(root[0].public_bytes(serialization.Encoding.DER))
+    (tmp_path / "notes.txt").write_bytes(b"not a certificate")
+
+    trust_store = TrustStore.from_path(str(tmp_path))
+    assert len(trust_store.anchors) == 3
+
+    with pytest.raises(ValueError):
+        SignatureStatus("unknown")
@@ -1,8 +1,12 @@
 import pytest
 from io import BytesIO
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from math import nan
 from lxml import objectify
-from pandas import DataFrame
-from ges_xml_converter.xml_parser import XML_converter
+from pandas import DataFrame, concat
+from ges_xml_converter.xml_parser import XML_converter, MAX_CHUNK_SIZE, SeparatorError, find_separator, iterparse_leaves, load_leaves, parse_records
+from ges_xml_converter.path_index import PathFilter
 
 
 # Test if exceptions are correctly raised by the constructor
@@ -16,13 +20,29 @@ def test_constructor_exceptions():
         XML_converter(dummy, separator="|", concat_symbol="|")
 
 
-# Test for separator detection in input stream
+# Test that the separator is searched in the input stream only if the validation is requested
 def test_separator_validity():
-    instream = {"1": BytesIO("A|B".encode('utf-8'))}
+    instream = {"1": BytesIO("<a>A#B</a>".encode('utf-8'))}
+    XML_converter(instream, separator="#")
+
+    with pytest.raises(SeparatorError):
+        XML_converter(instream, separator="#", validate=True)
+
+    # The separator cannot be equal to the concat symbol, '|' by default
     with pytest.raises(ValueError):
         XML_converter(instream, separator="|")
 
 
+# Test that the separator is allowed in the node values since the leaves are stored as tuples
+def test_separator_in_values():
+    instream = {"myfile.xml": BytesIO("<a><b>A#@#B</b></a>".encode('utf-8'))}
+    parser = XML_converter(instream)
+    parser.load()
+
+    assert parser.leaves == {"myfile": [(('b',), 'A#@#B')]}
+
+
+
 # Test for valid XML tree parsing
 def test_traverse_tree_function():
 
@@ -34,10 +54,31 @@ def test_traverse_tree_function():
 
     output = parser.traverse_node(tree_root.getchildren())
 
-    assert output == ['b|c|First', 'b|d|Second', 'e|Third']
+    assert output == [(('b', 'c'), 'First'), (('b', 'd'), 'Second'), (('e',), 'Third')]
 
     
 
+# Test the streaming linearization of the XML tree
+def test_iterparse_leaves_function():
+
+    xml_mockup="<a><!-- comment --><b><c>First</c><d>Second</d></b><e>Third</e><f/></a>"
+    output = list(iterparse_leaves(BytesIO(xml_mockup.encode('utf-8'))))
+
+    assert output == [(('b', 'c'), 'First'), (('b', 'd'), 'Second'), (('e',), 'Third'), (('f',), 'None')]
+
+
+# Test the loading of a tree deeper than the recursion limit
+def test_load_function_deep_tree():
+
+    depth = 1500
+    xml_mockup = "<a>" + "<b>"*depth + "Deep" + "</b>"*depth + "</a>"
+    parser = XML_converter({"myfile.xml": BytesIO(xml_mockup.encode('utf-8'))}, separator="|", concat_symbol="&")
+    parser.load()
+
+    assert parser.leaves == {"myfile": [(('b',)*depth, 'Deep')]}
+
+
+
 # Test working of load function
 def test_load_function():
     
@@ -58,6 +99,41 @@ def test_load_function_with_condition():
     assert parser.dataset == {'myfile': ['b|c|First', 'b|d|Second']}
 
 
+# Test the starting condition spanning more than one tag layer
+def test_load_function_with_multilevel_condition():
+
+    xml_mockup="<a><b><c>First</c><cc>Second</cc><d>Third</d></b><e><c>Fourth</c></e></a>"
+    parser = XML_converter({"myfile.xml": BytesIO(xml_mockup.encode('utf-8'))}, separator="|", concat_symbol="&")
+    parser.load(starting_with="b|c")
+    assert parser.dataset == {'myfile': ['b|c|First', 'b|cc|Second']}
+
+    parser = XML_converter({"myfile.xml": BytesIO(xml_mockup.encode('utf-8'))})
+    parser.load(starting_with="b#@#d", select=[("b", "c"), ("b", "d"), ("e", "c")])
+    assert parser.leaves == {'myfile': [(('b', 'd'), 'Third')]}
+
+
+# Test that the loading with a pool of processes gives the same dataset of the serial loading
+def test_load_function_with_workers():
+
+    instream = {}
+    for i in range(8):
+        xml_mockup="<a><b><c>First{0}</c><c>Second{0}</c></b><e>Third{0}</e></a>".format(i)
+        instream["file_{}.xml".format(i)] = xml_mockup.encode('utf-8')
+
+    serial = XML_converter({key: BytesIO(data) for key, data in instream.items()}, separator="|", concat_symbol="&")
+    serial.load(starting_with="b")
+
+    parallel = XML_converter({key: BytesIO(data) for key, data in instream.items()}, separator="|", concat_symbol="&")
+    parallel.load(starting_with="b", workers=2)
+
+    assert list(parallel.leaves) == list(serial.leaves)
+    assert parallel.leaves == serial.leaves
+
+    with pytest.raises(ValueError):
+        parallel.load(workers=0)
+
+
+
 # Test get_branch_limits function
 def test_get_branch_limits_function():
     
@@ -81,6 +157,16 @@ def test_prune_equivalent_nodes_function():
 
 
 
+# Test prune_equivalent_nodes function ordering with interleaved branches
+def test_prune_equivalent_nodes_ordering():
+
+    parser = XML_converter({"myfile.xml": BytesIO("<a/>".encode('utf-8'))}, separator="|", concat_symbol="&")
+    leaves = [(('b', 'c'), '1'), (('b', 'd'), '2'), (('e',), '3'), (('b', 'c'), '4'), (('b', 'd'), '5'), (('b', 'c'), '6')]
+
+    assert parser.prune_equivalent_nodes(leaves) == [(('b', 'c'), '1&4&6'), (('b', 'd'), '2&5'), (('e',), '3')]
+
+
+
 # Test inflate_tree function
 def test_infate_tree_function():
     xml_mockup="<a><b><c>First</c><d>Second</d></b><e>Third</e></a>"
@@ -138,5 +224,325 @@ def test_get_pandas_dataset_function_with_offset():
     result = parser.get_pandas_dataset(offset=1)
 
     expected = DataFrame([["First", "Second", "Third"]], index=["myfile"], columns=[["c", "d", " "]])
-    
+
     assert result.equals(expected)
+
+
+# Test get_pandas_dataset function with an offset giving the same signature to different branches
+def test_get_pandas_dataset_function_with_colliding_offset():
+    instream = {
+        "seller.xml": BytesIO("<a><s><x>Seller</x></s></a>".encode('utf-8')),
+        "buyer.xml": BytesIO("<a><b><x>Buyer</x></b></a>".encode('utf-8')),
+    }
+    parser = XML_converter(instream)
+    parser.load()
+
+    expected = DataFrame([["Seller"], ["Buyer"]], index=["seller", "buyer"], columns=[["x"]])
+    assert parser.get_pandas_dataset(offset=1).equals(expected)
+
+    # Branches of the same file sharing the signature keep separate columns
+    instream = {
+        "first.xml": BytesIO("<a><s><x><n>Seller</n></x></s><b><x><n>Buyer</n></x></b></a>".encode('utf-8')),
+        "second.xml": BytesIO("<a><b><x><n>Buyer2</n></x></b></a>".encode('utf-8')),
+    }
+    parser = XML_converter(instream)
+    parser.load()
+
+    result = parser.get_pandas_dataset(offset=2)
+    assert list(result.columns) == [("n",), ("n",)]
+    assert result.iloc[0].tolist() == ["Seller", "Buyer"]
+    assert result.iloc[1].tolist()[0] == "Buyer2"
+    assert result.isna().iloc[1].tolist() == [False, True]
+
+    batches = list(XML_converter(instream).iter_pandas_datasets(batch_size=1, offset=2))
+    assert list(concat(batches).columns) == list(result.columns)
+    assert concat(batches).fillna("").values.tolist() == result.fillna("").values.tolist()
+
+
+# Test get_pandas_dataset function with files having different branches
+def test_get_pandas_dataset_function_multiple_files():
+    instream = {
+        "first.xml": BytesIO("<a><b><c>First</c></b><e>Third</e></a>".encode('utf-8')),
+        "second.xml": BytesIO("<a><b><d>Second</d></b><e>Fourth</e></a>".encode('utf-8')),
+    }
+    parser = XML_converter(instream, separator="|", concat_symbol="&")
+    parser.load()
+    parser.inflate_tree()
+
+    result = parser.get_pandas_dataset()
+
+    expected = DataFrame(
+        [["First", "Third", nan], [nan, "Fourth", "Second"]], index=["first", "second"], columns=[["b", "e", "b"], ["c", " ", "d"]]
+    )
+
+    assert result.equals(expected)
+
+
+# Test the incremental addition and removal of entries compared with a full loading
+def test_add_streams_and_remove_entries():
+    documents = {
+        "first.xml": "<a><b><c>First</c></b><e>Third</e></a>",
+        "second.xml": "<a><b><d><k>Second</k></d></b></a>",
+    }
+
+    full = XML_converter({key: BytesIO(data.encode('utf-8')) for key, data in documents.items()}, separator="|", concat_symbol="&")
+    full.load()
+    full.inflate_tree(filler="@")
+
+    parser = XML_converter({"first.xml": BytesIO(documents["first.xml"].encode('utf-8'))}, separator="|", concat_symbol="&")
+    parser.load()
+    parser.inflate_tree(filler="@")
+    assert parser.get_branch_limits() == (2, 2)
+
+    parser.add_streams({"second.xml": BytesIO(documents["second.xml"].encode('utf-8'))})
+    assert parser.get_branch_limits() == (3, 3)
+    assert parser.dataset == full.dataset
+
+    parser.remove_entries(["second"])
+    assert parser.get_branch_limits() == (2, 2)
+    assert parser.dataset == {"first": ['b|c|First', 'e|@|Third']}
+
+
+# Test the saving and restoring of the converter state
+def test_save_and_restore_state(tmp_path):
+    xml_mockup="<a><b><c>First</c><d>Second</d></b><e>Third</e></a>"
+    parser = XML_converter({"myfile.xml": BytesIO(xml_mockup.encode('utf-8'))}, separator="|", concat_symbol="&")
+    parser.load()
+
+    parser.save_state(tmp_path / "state.json.gz")
+    restored = XML_converter.from_state(tmp_path / "state.json.gz")
+
+    assert restored.leaves == parser.leaves
+    assert restored.get_branch_limits() == parser.get_branch_limits()
+
+    restored.add_streams({"other.xml": BytesIO("<a><f>Fourth</f></a>".encode('utf-8'))})
+    restored.inflate_tree()
+
+    assert restored.get_branch_limits() == (2, 2)
+    assert restored.dataset["other"] == ['f| |Fourth']
+
+
+# Test the branch statistics collected during the loading and updated by filtering
+def test_branch_statistics():
+    instream = {
+        "first.xml": BytesIO("<a><b><c>First</c><d>Second</d></b><e>Third</e></a>".encode('utf-8')),
+        "second.xml": BytesIO("<a><b><c>Fourth</c></b><f><g><h>Fifth</h></g></f></a>".encode('utf-8')),
+    }
+    parser = XML_converter(instream, separator="|", concat_symbol="&")
+    parser.load()
+
+    statistics = parser.statistics
+    assert (statistics.min_depth, statistics.max_depth) == (1, 3)
+    assert statistics.depth_histogram == {1: 1, 2: 3, 3: 1}
+    assert statistics.path_counts[('b', 'c')] == 2
+    assert statistics.distinct_paths == 4
+    assert statistics.nleaves == 5
+
+    parser.filter_branches(starting_with="b")
+    assert parser.get_branch_limits() == (2, 2)
+    assert statistics.depth_histogram == {2: 3}
+    assert statistics.distinct_paths == 2
+    assert parser.dataset == {"first": ['b|c|First', 'b|d|Second'], "second": ['b|c|Fourth']}
+
+    parser.remove_entries(["first"])
+    assert statistics.path_counts == {('b', 'c'): 1}
+
+
+# Test that the inflation is applied only to the views of the dataset
+def test_inflate_tree_is_virtual():
+    xml_mockup="<a><b><c>First</c></b><e>Third</e></a>"
+    parser = XML_converter({"myfile.xml": BytesIO(xml_mockup.encode('utf-8'))}, separator="|", concat_symbol="&")
+    parser.load()
+    parser.inflate_tree(filler="@")
+
+    assert parser.leaves == {"myfile": [(('b', 'c'), 'First'), (('e',), 'Third')]}
+    assert parser.pad_path(('e',)) == ('e', '@')
+    assert parser.dataset == {"myfile": ['b|c|First', 'e|@|Third']}
+
+
+# Test the loading of a selected set of branches
+def test_load_function_with_selection():
+
+    xml_mockup="<a><b><c>First</c><d>Second</d><c>Third</c></b><e><f>Fourth</f></e><g>Fifth</g></a>"
+    select = [("b", "c"), ("e", "f", "h"), ("g",)]
+
+    for workers in [1, 2]:
+        parser = XML_converter({"myfile.xml": BytesIO(xml_mockup.encode('utf-8'))}, separator="|", concat_symbol="&")
+        parser.load(select=select, workers=workers)
+
+        assert parser.dataset == {"myfile": ['b|c|First&Third', 'g|Fifth']}
+
+
+# Test the loading with a path filter with wildcards and excluded branches
+def test_load_function_with_path_filter():
+
+    xml_mockup="<a><b><c>First</c><d>Second</d></b><bb><c>Third</c></bb><e><c>Fourth</c></e></a>"
+    path_filter = PathFilter(include=[("b*",), ("e", "c")], exclude=[("*", "d")])
+
+    for workers in [1, 2]:
+        parser = XML_converter({"myfile.xml": BytesIO(xml_mockup.encode('utf-8'))}, separator="|", concat_symbol="&")
+        parser.load(path_filter=path_filter, workers=workers)
+
+        assert parser.dataset == {"myfile": ['b|c|First', 'bb|c|Third', 'e|c|Fourth']}
+
+    parser.filter_branches(path_filter=PathFilter(exclude=[("e",)]))
+    assert parser.dataset == {"myfile": ['b|c|First', 'bb|c|Third']}
+
+    with pytest.raises(ValueError):
+        parser.load(starting_with="b", path_filter=path_filter)
+
+
+# Test the batch iterator with a schema collected by a first pass
+def test_iter_pandas_datasets():
+
+    xml_mockups = {
+        "file1.xml": "<a><b><c>First</c></b><d>Second</d></a>",
+        "file2.xml": "<a><d>Third</d><e>Fourth</e></a>",
+        "file3.xml": "<a><b><c>Fifth</c><c>Sixth</c></b></a>",
+    }
+
+    for workers in [1, 2]:
+        parser = XML_converter({k: BytesIO(v.encode('utf-8')) for k, v in xml_mockups.items()}, separator="|", concat_symbol="&")
+        parser.inflate_tree(filler="-")
+
+        batches = list(parser.iter_pandas_datasets(batch_size=2, workers=workers))
+        assert parser.leaves == {}
+        assert [list(batch.index) for batch in batches] == [["file1", "file2"], ["file3"]]
+        assert all([list(batch.columns) == [("b", "c"), ("d", "-"), ("e", "-")] for batch in batches])
+
+        parser.load()
+        expected = parser.get_pandas_dataset()
+        assert list(batches[0].loc["file2"].fillna("")) == list(expected.loc["file2"].fillna(""))
+        assert list(batches[1].loc["file3"].fillna("")) == list(expected.loc["file3"].fillna(""))
+        assert batches[1].loc["file3", ("b", "c")] == "Fifth&Sixth"
+
+
+# Test that the pooled schema scan reads only a bounded number of files ahead of the consumer
+def test_scan_schema_bounded_with_workers():
+
+    class CountingMapping(Mapping):
+        def __init__(self, n):
+            self.filenames = ["file{:04d}.xml".format(i) for i in range(n)]
+            self.reads = 0
+        def __getitem__(self, filename):
+            self.reads += 1
+            return BytesIO("<a><b>{}</b></a>".format(filename).encode('utf-8'))
+        def __iter__(self):
+            return iter(self.filenames)
+        def __len__(self):
+            return len(self.filenames)
+
+    instream = CountingMapping(1000)
+    parser = XML_converter(instream)
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        entries = parser._iter_entries(instream, None, executor=executor, workers=2)
+        assert next(entries) == ("file0000", [(("b",), "file0000.xml")])
+        assert instream.reads <= 5*MAX_CHUNK_SIZE
+        assert len(list(entries)) == 999
+    assert instream.reads == 1000
+
+    assert len(parser.scan_schema(workers=2)) == 1
+
+
+# Test the batch iterator with a fixed schema
+def test_iter_pandas_datasets_with_schema():
+
+    xml_mockups = {
+        "file1.xml": "<a><b><c>First</c></b><d>Second</d></a>",
+        "file2.xml": "<a><d>Third</d><e>Fourth</e></a>",
+    }
+
+    parser = XML_converter({k: BytesIO(v.encode('utf-8')) for k, v in xml_mockups.items()}, separator="|", concat_symbol="&")
+    schema = [("d",), ("f",)]
+
+    batches = list(parser.iter_pandas_datasets(batch_size=1, schema=schema))
+    assert len(batches) == 2
+    assert list(batches[0].columns) == [("d",), ("f",)]
+    assert list(batches[1].columns) == [("d",), ("f",)]
+    assert batches[1].loc["file2", ("d",)] == "Third"
+    assert batches[1].isna().loc["file2", ("f",)]
+
+    with pytest.raises(ValueError):
+        next(parser.iter_pandas_datasets(batch_size=0))
+
+
+# Test that the records parser extracts the same leaves of the streaming parser
+def test_parse_records_leaves():
+
+    xml_mockup = "<a><!-- c --><b>t</b><c><d/><d>&amp;</d><d><![CDATA[<x>]]></d></c><e><f>1</f></e></a>"
+
+    leaves, records = parse_records(BytesIO(xml_mockup.encode('utf-8')), [], "&")
+    assert leaves == load_leaves(BytesIO(xml_mockup.encode('utf-8')), "&")
+    assert records == {}
+
+    leaves, records = parse_records(BytesIO(xml_mockup.encode('utf-8')), ["d", "e"], "&", PathFilter(exclude=[("b",)]))
+    assert leaves == []
+    assert records == {"e": [[(("f",), "1")]]}
+
+
+# Test the normalized output with header and line-item tables
+def test_load_normalized():
+
+    xml_mockups = {
+        "file1.xml": "<a><h><n>A</n></h><b><L><N>1</N><D>X</D><C>c1</C><C>c2</C></L><L><N>2</N></L><R><I>5</I></R></b></a>",
+        "file2.xml": "<a><h><n>B</n></h><b><L><N>1</N><D>Y</D></L></b></a>",
+    }
+
+    for workers in [1, 2]:
+        parser = XML_converter({k: BytesIO(v.encode('utf-8')) for k, v in xml_mockups.items()}, separator="|", concat_symbol="&")
+        header, tables = parser.load_normalized(record_tags=["L", "R"], workers=workers)
+
+        assert parser.leaves == {}
+        assert list(header.index) == ["file1", "file2"]
+        assert list(header.columns) == [("h", "n")]
+        assert list(header[("h", "n")]) == ["A", "B"]
+
+        lines = tables["L"]
+        assert list(lines.index) == [("file1", 1), ("file1", 2), ("file2", 1)]
+        assert list(lines.index.names) == ["file", "record"]
+        assert list(lines.columns) == [("N",), ("D",), ("C",)]
+        assert list(lines[("N",)]) == ["1", "2", "1"]
+        assert list(lines[("D",)].fillna("")) == ["X", "", "Y"]
+        assert lines.loc[("file1", 1), ("C",)] == "c1&c2"
+
+        assert list(tables["R"].index) == [("file1", 1)]
+
+
+# Test the search of the separator in the raw bytes, also across the chunk boundaries
+def test_find_separator():
+
+    padding = "x"*1020
+    streams = {
+        "file1.xml": BytesIO("<a><b>x#@#y</b><c>{}#@##@#</c></a>".format(padding).encode('utf-8')),
+        "file2.xml": BytesIO("<a><b>xy</b></a>".encode('utf-8')),
+        "file3.xml": BytesIO('<?xml version="1.0" encoding="ISO-8859-1"?><a>{}§</a>'.format(padding).encode('latin-1')),
+    }
+
+    for chunk_size in [1, 2, 5, 2**20]:
+        assert find_separator(streams, "#@#", chunk_size=chunk_size) == {"file1.xml": [7, 1038, 1041]}
+        assert find_separator(streams, "§", chunk_size=chunk_size) == {"file3.xml": [1066]}
+
+    assert streams["file1.xml"].tell() == 0
+
+
+# Test the opt-in validation of the separator in the constructor
+def test_constructor_validation():
+
+    streams = {
+        "file1.xml": BytesIO(b"<a><b>x|y</b></a>"),
+        "file2.xml": BytesIO(b"<a><b>xy</b></a>"),
+        "file3.xml": BytesIO(b"<a>|</a>"),
+    }
+
+    XML_converter(streams, separator="|", concat_symbol="&")
+
+    with pytest.raises(SeparatorError) as error:
+        XML_converter(streams, separator="|", concat_symbol="&", validate=True)
+
+    assert error.value.occurrences == {"file1.xml": [7], "file3.xml": [3]}
+    assert "file3.xml: byte offsets 3" in str(error.value)
+
+    parser = XML_converter(streams, separator="#", concat_symbol="&", validate=True)
+    parser.load()
+    assert parser.dataset["file1"] == ["b#x|y"]